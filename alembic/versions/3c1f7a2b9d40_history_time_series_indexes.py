@@ -0,0 +1,50 @@
+"""history time-series indexes
+
+Revision ID: 3c1f7a2b9d40
+Revises: 08e15ed6c6b8
+Create Date: 2026-10-17 09:12:41.208315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f7a2b9d40'
+down_revision: Union[str, None] = '08e15ed6c6b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BTREE_INDEXES = [
+    ('ix_count_history_run_id_timestamp', 'count_history', ['run_id', 'timestamp']),
+    ('ix_count_history_tag_id_timestamp', 'count_history', ['tag_id', 'timestamp']),
+    ('ix_state_history_line_id_start_datetime', 'state_history', ['line_id', 'start_datetime']),
+    ('ix_state_history_run_id_start_datetime', 'state_history', ['run_id', 'start_datetime']),
+]
+
+BRIN_INDEXES = [
+    ('ix_count_history_timestamp_brin', 'count_history', ['timestamp']),
+    ('ix_state_history_start_datetime_brin', 'state_history', ['start_datetime']),
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build without blocking ingestion on large tables
+        with op.get_context().autocommit_block():
+            for name, table, columns in BTREE_INDEXES:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+            for name, table, columns in BRIN_INDEXES:
+                op.create_index(name, table, columns, unique=False,
+                                postgresql_using='brin', postgresql_concurrently=True)
+    else:
+        for name, table, columns in BTREE_INDEXES + BRIN_INDEXES:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(BTREE_INDEXES + BRIN_INDEXES):
+        op.drop_index(name, table_name=table)
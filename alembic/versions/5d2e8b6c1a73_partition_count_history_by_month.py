@@ -0,0 +1,122 @@
+"""partition count_history by month
+
+Revision ID: 5d2e8b6c1a73
+Revises: 3c1f7a2b9d40
+Create Date: 2026-10-17 11:47:03.915227
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e8b6c1a73'
+down_revision: Union[str, None] = '3c1f7a2b9d40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MONTHS_AHEAD = 3
+
+INDEXES = [
+    'ix_count_history_id',
+    'ix_count_history_run_id_timestamp',
+    'ix_count_history_tag_id_timestamp',
+    'ix_count_history_timestamp_brin',
+]
+
+
+def _month_start(day: date, offset: int = 0) -> date:
+    index = day.year * 12 + (day.month - 1) + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_indexes() -> None:
+    op.create_index('ix_count_history_id', 'count_history', ['id'], unique=False)
+    op.create_index('ix_count_history_run_id_timestamp', 'count_history', ['run_id', 'timestamp'], unique=False)
+    op.create_index('ix_count_history_tag_id_timestamp', 'count_history', ['tag_id', 'timestamp'], unique=False)
+    op.create_index('ix_count_history_timestamp_brin', 'count_history', ['timestamp'], unique=False,
+                    postgresql_using='brin')
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # Declarative partitioning is PostgreSQL-only; other backends keep the plain table
+        return
+
+    # Move the existing heap aside and keep its id sequence for the new table
+    op.execute("ALTER TABLE count_history RENAME TO count_history_unpartitioned")
+    op.execute("ALTER TABLE count_history_unpartitioned RENAME CONSTRAINT count_history_pkey "
+               "TO count_history_unpartitioned_pkey")
+    op.execute("ALTER SEQUENCE count_history_id_seq OWNED BY NONE")
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    # The partition key must be part of the primary key
+    op.execute("""
+        CREATE TABLE count_history (
+            id integer NOT NULL DEFAULT nextval('count_history_id_seq'),
+            timestamp timestamp without time zone NOT NULL,
+            count integer NOT NULL,
+            tag_id integer NOT NULL REFERENCES count_tag (id),
+            count_type_id integer NOT NULL REFERENCES count_type (id),
+            run_id integer REFERENCES run (id),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("ALTER SEQUENCE count_history_id_seq OWNED BY count_history.id")
+
+    # One partition per month from the oldest row until MONTHS_AHEAD months from now
+    oldest = bind.execute(sa.text("SELECT min(timestamp) FROM count_history_unpartitioned")).scalar()
+    today = datetime.utcnow().date()
+    month = _month_start((oldest or datetime.utcnow()).date())
+    last = _month_start(today, MONTHS_AHEAD)
+    while month <= last:
+        following = _month_start(month, 1)
+        op.execute(
+            f"CREATE TABLE count_history_y{month.year:04d}m{month.month:02d} PARTITION OF count_history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+    op.execute("CREATE TABLE count_history_default PARTITION OF count_history DEFAULT")
+
+    op.execute(
+        "INSERT INTO count_history (id, timestamp, count, tag_id, count_type_id, run_id) "
+        "SELECT id, timestamp, count, tag_id, count_type_id, run_id FROM count_history_unpartitioned"
+    )
+    op.execute("DROP TABLE count_history_unpartitioned")
+    _create_indexes()
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("ALTER TABLE count_history RENAME TO count_history_partitioned")
+    op.execute("ALTER SEQUENCE count_history_id_seq OWNED BY NONE")
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute("ALTER TABLE count_history_partitioned RENAME CONSTRAINT count_history_pkey "
+               "TO count_history_partitioned_pkey")
+
+    op.execute("""
+        CREATE TABLE count_history (
+            id integer NOT NULL DEFAULT nextval('count_history_id_seq') PRIMARY KEY,
+            timestamp timestamp without time zone NOT NULL,
+            count integer NOT NULL,
+            tag_id integer NOT NULL REFERENCES count_tag (id),
+            count_type_id integer NOT NULL REFERENCES count_type (id),
+            run_id integer REFERENCES run (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE count_history_id_seq OWNED BY count_history.id")
+    op.execute(
+        "INSERT INTO count_history (id, timestamp, count, tag_id, count_type_id, run_id) "
+        "SELECT id, timestamp, count, tag_id, count_type_id, run_id FROM count_history_partitioned"
+    )
+    op.execute("DROP TABLE count_history_partitioned")
+    _create_indexes()
@@ -0,0 +1,50 @@
+"""count rollups
+
+Revision ID: 7a4c9e1f2b58
+Revises: 5d2e8b6c1a73
+Create Date: 2026-10-17 14:03:26.551904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4c9e1f2b58'
+down_revision: Union[str, None] = '5d2e8b6c1a73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('count_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('resolution', sa.String(length=10), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('line_id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('count_type_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('events', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['count_type_id'], ['count_type.id'], ),
+    sa.ForeignKeyConstraint(['line_id'], ['line.id'], ),
+    sa.ForeignKeyConstraint(['run_id'], ['run.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('resolution', 'line_id', 'bucket_start', 'run_id', 'count_type_id', name='uq_count_rollup_bucket')
+    )
+    op.create_index(op.f('ix_count_rollup_id'), 'count_rollup', ['id'], unique=False)
+    watermark = op.create_table('count_rollup_watermark',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('last_count_history_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(watermark, [{'id': 1, 'last_count_history_id': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('count_rollup_watermark')
+    op.drop_index(op.f('ix_count_rollup_id'), table_name='count_rollup')
+    op.drop_table('count_rollup')
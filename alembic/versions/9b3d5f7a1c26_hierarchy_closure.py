@@ -0,0 +1,66 @@
+"""hierarchy closure
+
+Revision ID: 9b3d5f7a1c26
+Revises: 7a4c9e1f2b58
+Create Date: 2026-10-17 15:12:48.207311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3d5f7a1c26'
+down_revision: Union[str, None] = '7a4c9e1f2b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (level, table, parent foreign key) from the top of the hierarchy down
+LEVELS = [
+    ('enterprise', 'enterprise', None),
+    ('site', 'site', 'enterprise_id'),
+    ('area', 'area', 'site_id'),
+    ('line', 'line', 'area_id'),
+    ('cell', 'cell', 'line_id'),
+]
+
+
+def upgrade() -> None:
+    op.create_table('hierarchy_closure',
+    sa.Column('ancestor_level', sa.String(length=16), nullable=False),
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_level', sa.String(length=16), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('ancestor_level', 'ancestor_id', 'descendant_level', 'descendant_id')
+    )
+    op.create_index('ix_hierarchy_closure_descendant', 'hierarchy_closure', ['descendant_level', 'descendant_id'], unique=False)
+
+    # Backfill: one INSERT ... SELECT per (ancestor level, descendant level) pair,
+    # walking up the parent keys from the descendant table
+    for start, (ancestor_level, _, _) in enumerate(LEVELS):
+        for end in range(start, len(LEVELS)):
+            descendant_level, descendant_table, _ = LEVELS[end]
+            joins = []
+            ancestor_column = 'd.id'
+            alias = 'd'
+            for step in range(end, start, -1):
+                _, table, parent_fk = LEVELS[step]
+                if step != end:
+                    joins.append(f'JOIN {table} p{step} ON p{step}.id = {ancestor_column}')
+                    alias = f'p{step}'
+                ancestor_column = f'{alias}.{parent_fk}'
+            op.execute(
+                "INSERT INTO hierarchy_closure "
+                "(ancestor_level, ancestor_id, descendant_level, descendant_id, depth) "
+                f"SELECT '{ancestor_level}', {ancestor_column}, '{descendant_level}', d.id, {end - start} "
+                f"FROM {descendant_table} d {' '.join(joins)} "
+                f"WHERE {ancestor_column} IS NOT NULL"
+            )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_hierarchy_closure_descendant', table_name='hierarchy_closure')
+    op.drop_table('hierarchy_closure')
@@ -0,0 +1,50 @@
+"""schedule no overlap
+
+Revision ID: c4e8a2d6f913
+Revises: 9b3d5f7a1c26
+Create Date: 2026-10-17 21:04:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2d6f913'
+down_revision: Union[str, None] = '9b3d5f7a1c26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # Exclusion constraints are PostgreSQL-only; elsewhere the API's schedule index is the only check
+        return
+
+    overlapping = bind.execute(sa.text("""
+        SELECT a.id, b.id FROM schedule a
+        JOIN schedule b ON a.line_id = b.line_id AND a.id < b.id
+        AND tsrange(a.schedule_start_datetime, a.schedule_finish_datetime, '[)')
+            && tsrange(b.schedule_start_datetime, b.schedule_finish_datetime, '[)')
+        LIMIT 20
+    """)).all()
+    if overlapping:
+        pairs = ', '.join(f'{a}/{b}' for a, b in overlapping)
+        raise RuntimeError(f'Resolve overlapping schedules before upgrading (schedule ids {pairs})')
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    op.execute("""
+        ALTER TABLE schedule ADD CONSTRAINT schedule_line_no_overlap EXCLUDE USING gist (
+            line_id WITH =,
+            tsrange(schedule_start_datetime, schedule_finish_datetime, '[)') WITH &&
+        )
+    """)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("ALTER TABLE schedule DROP CONSTRAINT IF EXISTS schedule_line_no_overlap")
@@ -0,0 +1,33 @@
+"""open run lookup
+
+Revision ID: e7b1c3f5a924
+Revises: c4e8a2d6f913
+Create Date: 2026-10-17 23:18:06.742913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b1c3f5a924'
+down_revision: Union[str, None] = 'c4e8a2d6f913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('count_tag') as batch_op:
+        batch_op.add_column(sa.Column('line_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_count_tag_line_id', 'line', ['line_id'], ['id'])
+    op.create_index('ix_run_open', 'run', ['closed', 'schedule_id'], unique=False,
+                    postgresql_where=sa.text('closed = false'), sqlite_where=sa.text('closed = 0'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_run_open', table_name='run')
+    with op.batch_alter_table('count_tag') as batch_op:
+        batch_op.drop_constraint('fk_count_tag_line_id', type_='foreignkey')
+        batch_op.drop_column('line_id')
@@ -0,0 +1,86 @@
+"""
+Concurrent load test comparing threadpool (sync `def`) and async handlers.
+
+`GET /line/` still runs in FastAPI's threadpool on the sync engine, while
+`GET /schedule-run/run` and `POST /oee/count-history/` run on the event loop
+with the async engine. Both read paths are single-table keyset pages, so the
+difference in latency under concurrency is the cost of the threadpool.
+
+Usage:
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.async_load --requests 2000 --concurrency 64
+
+Pass --base-url to drive a running server (e.g. uvicorn main:app --workers 1)
+instead of the in-process app; point it at PostgreSQL to measure the production path.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmarks.count_ingestion import make_events, seed_references
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def drive(client, requests, concurrency):
+    """Issue the (method, url, json) requests with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(method, url, payload):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, json=payload)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(*request) for request in requests))
+    return time.perf_counter() - started, latencies, errors
+
+def report(label, elapsed, latencies, errors):
+    print(
+        f"{label:<24} {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+        f"p95 {percentile(latencies, 0.95) * 1000:7.1f} ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms  "
+        f"errors {errors}"
+    )
+
+async def run(args):
+    tag_id, type_id, run_id = seed_references()
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    async with client:
+        scenarios = [
+            ("threadpool GET /line/", [("GET", "/line/?limit=50", None)] * args.requests),
+            ("async GET /run", [("GET", "/schedule-run/run?limit=50", None)] * args.requests),
+            ("async POST count", [
+                ("POST", "/oee/count-history/", event)
+                for event in make_events(args.requests, tag_id, type_id, run_id)
+            ]),
+        ]
+        for label, requests in scenarios:
+            report(label, *await drive(client, requests, args.concurrency))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--base-url", default=None, help="Drive a running server instead of the in-process app")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
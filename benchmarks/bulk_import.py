@@ -0,0 +1,89 @@
+"""
+Onboarding time of a generated plant: one bulk import versus per-node POSTs.
+
+Both variants create the same Site -> Area -> Line -> Cell tree under a fresh
+enterprise; the per-node variant goes through the existing create endpoints
+one request at a time, exactly as a client script would.
+
+Usage:
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.bulk_import --sites 5 --areas 10 --lines 10 --cells 9
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from database.engine import Base, engine
+from main import app
+
+def make_plant(label, sites, areas, lines, cells):
+    return {
+        "sites": [
+            {
+                "name": f"{label} Site {s}",
+                "areas": [
+                    {
+                        "name": f"Area {a}",
+                        "lines": [
+                            {"name": f"Line {l}", "cells": [{"name": f"Cell {c}"} for c in range(cells)]}
+                            for l in range(lines)
+                        ],
+                    }
+                    for a in range(areas)
+                ],
+            }
+            for s in range(sites)
+        ]
+    }
+
+def create_enterprise(client, label):
+    response = client.post("/enterprise/", json={"name": f"Bench {label} {datetime.utcnow().timestamp()}"})
+    return response.json()["id"]
+
+def per_node(client, plant):
+    enterprise_id = create_enterprise(client, "per-node")
+    for site in plant["sites"]:
+        site_id = client.post("/site/", json={"name": site["name"], "enterprise_id": enterprise_id}).json()["id"]
+        for area in site["areas"]:
+            area_id = client.post("/area/", json={"name": area["name"], "site_id": site_id}).json()["id"]
+            for line in area["lines"]:
+                line_id = client.post("/line/", json={"name": line["name"], "area_id": area_id}).json()["id"]
+                for cell in line["cells"]:
+                    client.post("/cell/", json={"name": cell["name"], "line_id": line_id})
+
+def bulk(client, plant):
+    enterprise_id = create_enterprise(client, "bulk")
+    response = client.post(f"/import/enterprise/{enterprise_id}/plant", json=plant)
+    response.raise_for_status()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sites", type=int, default=5)
+    parser.add_argument("--areas", type=int, default=10)
+    parser.add_argument("--lines", type=int, default=10)
+    parser.add_argument("--cells", type=int, default=9)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    client = TestClient(app)
+    nodes = args.sites * (1 + args.areas * (1 + args.lines * (1 + args.cells)))
+
+    # Site names are unique across enterprises, so each variant gets its own prefix
+    label = datetime.utcnow().timestamp()
+    started = time.perf_counter()
+    per_node(client, make_plant(f"{label} per-node", args.sites, args.areas, args.lines, args.cells))
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    bulk(client, make_plant(f"{label} bulk", args.sites, args.areas, args.lines, args.cells))
+    batch = time.perf_counter() - started
+
+    print(f"nodes:     {nodes}")
+    print(f"per-node:  {single:8.2f}s ({nodes / single:10.1f} nodes/s)")
+    print(f"bulk:      {batch:8.2f}s ({nodes / batch:10.1f} nodes/s)")
+    print(f"speed-up:  {single / batch:8.1f}x")
+
+if __name__ == "__main__":
+    main()
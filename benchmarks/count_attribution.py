@@ -0,0 +1,74 @@
+"""
+Cost of attributing counts to the open run of their line.
+
+Compares looking the open run up with a query per event (Run joined to
+Schedule, as gateways had to do before posting) with the in-memory map of
+utils.open_runs, then posts the same events end to end by ids and by
+tag_path alone.
+
+Usage:
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.count_attribution --lookups 20000 --events 1000
+"""
+
+import argparse
+import time
+
+from fastapi.testclient import TestClient
+
+from benchmarks.count_ingestion import make_events, seed_references
+from database.engine import SessionLocal
+from database.models.oee import CountTag
+from main import app
+from utils.open_runs import open_run_index
+
+def lookups(line_id, n):
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        for _ in range(n):
+            open_run_index._load(db, line_id)
+        per_query = time.perf_counter() - started
+
+        open_run_index.forget()
+        started = time.perf_counter()
+        for _ in range(n):
+            open_run_index.run_for_line(db, line_id)
+        mapped = time.perf_counter() - started
+    finally:
+        db.close()
+    print(f"query per event: {per_query / n * 1e6:8.1f} us/lookup")
+    print(f"open-run map:    {mapped / n * 1e6:8.1f} us/lookup")
+
+def post(client, events, label):
+    started = time.perf_counter()
+    for event in events:
+        response = client.post("/oee/count-history/", json=event)
+        assert response.status_code == 201, response.text
+    elapsed = time.perf_counter() - started
+    print(f"POST by {label:<9}: {elapsed / len(events) * 1e6:8.1f} us/request")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--events", type=int, default=1000)
+    args = parser.parse_args()
+
+    tag_id, type_id, run_id = seed_references()
+    db = SessionLocal()
+    try:
+        tag = db.get(CountTag, tag_id)
+        line_id, tag_path = tag.line_id, tag.tag_path
+    finally:
+        db.close()
+
+    lookups(line_id, args.lookups)
+
+    client = TestClient(app)
+    post(client, make_events(args.events, tag_id, type_id, run_id), "ids")
+    post(client, [
+        {"count": event["count"], "timestamp": event["timestamp"], "tag_path": tag_path}
+        for event in make_events(args.events, tag_id, type_id, run_id)
+    ], "tag_path")
+
+if __name__ == "__main__":
+    main()
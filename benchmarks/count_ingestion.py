@@ -0,0 +1,108 @@
+"""
+Throughput comparison between single-row and batch CountHistory ingestion.
+
+Usage:
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.count_ingestion --events 2000
+
+Point DATABASE_URL at a scratch PostgreSQL database to measure the production path.
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from database.engine import Base, SessionLocal, engine
+from database.models.enterprise import Enterprise, Site, Area, Line
+from database.models.oee import CountType, CountTag
+from database.models.schedule_run import Schedule, Run, RunMetrics
+from main import app
+
+def seed_references():
+    """Create the minimal hierarchy needed to post counts and return (tag_id, type_id, run_id)."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        enterprise = Enterprise(name=f"Bench Enterprise {now.timestamp()}", timestamp=now)
+        db.add(enterprise)
+        db.flush()
+        site = Site(name=f"Bench Site {now.timestamp()}", enterprise_id=enterprise.id, timestamp=now)
+        db.add(site)
+        db.flush()
+        area = Area(name="Bench Area", site_id=site.id, timestamp=now)
+        db.add(area)
+        db.flush()
+        line = Line(name="Bench Line", area_id=area.id, timestamp=now)
+        db.add(line)
+        db.flush()
+        count_type = CountType(count_type=f"Good {now.timestamp()}")
+        db.add(count_type)
+        db.flush()
+        tag = CountTag(tag_path=f"Bench/{now.timestamp()}/Good", parent_id=count_type.id, line_id=line.id)
+        schedule = Schedule(
+            line_id=line.id, schedule_type="Production", timestamp=now,
+            schedule_start_datetime=now, schedule_finish_datetime=now + timedelta(hours=8)
+        )
+        db.add_all([tag, schedule])
+        db.flush()
+        run = Run(schedule_id=schedule.id, run_start_datetime=now, closed=False)
+        db.add(run)
+        db.flush()
+        # Mirror POST /schedule-run/run, which always creates the zeroed metrics row
+        db.add(RunMetrics(
+            run_id=run.id,
+            good_count=0, waste_count=0, total_count=0,
+            availability=0.0, performance=0.0, quality=0.0, oee=0.0,
+            unplanned_downtime=0.0, planned_downtime=0.0, total_time=0.0
+        ))
+        db.commit()
+        return tag.id, count_type.id, run.id
+    finally:
+        db.close()
+
+def make_events(n, tag_id, type_id, run_id):
+    start = datetime.utcnow()
+    return [
+        {
+            "count": 1,
+            "timestamp": (start + timedelta(seconds=i)).isoformat(),
+            "tag_id": tag_id,
+            "count_type_id": type_id,
+            "run_id": run_id,
+        }
+        for i in range(n)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    events = make_events(args.events, *seed_references())
+
+    started = time.perf_counter()
+    for event in events:
+        client.post("/oee/count-history/", json=event)
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for offset in range(0, len(events), args.batch_size):
+        chunk = events[offset:offset + args.batch_size]
+        client.post(
+            "/oee/count-history/batch",
+            content="\n".join(json.dumps(event) for event in chunk),
+            headers={"content-type": "application/x-ndjson"},
+        )
+    batch = time.perf_counter() - started
+
+    print(f"single-row: {args.events / single:10.1f} events/s ({single:.2f}s)")
+    print(f"batch({args.batch_size}): {args.events / batch:10.1f} events/s ({batch:.2f}s)")
+    print(f"speed-up:   {single / batch:10.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Latency of GET /downtime/analytics over a year of StateHistory.
+
+Seeds a fresh enterprise with `--lines` lines and `--events-per-day` downtime
+events per line per day for `--days` days, then times the endpoint for the
+whole enterprise and for a single line.
+
+Usage:
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.downtime_analytics --lines 100 --days 365 --events-per-day 10
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from database.engine import Base, SessionLocal, engine
+from database.models.downtime import StateHistory, StateReason
+from database.models.enterprise import Enterprise, Site, Area, Line
+from main import app
+from utils.hierarchy_closure import add_node
+
+def seed(lines, days, events_per_day, start):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        label = now.timestamp()
+        enterprise = Enterprise(name=f"Bench Enterprise {label}", timestamp=now)
+        db.add(enterprise)
+        db.flush()
+        site = Site(name=f"Bench Site {label}", enterprise_id=enterprise.id, timestamp=now)
+        db.add(site)
+        db.flush()
+        area = Area(name="Bench Area", site_id=site.id, timestamp=now)
+        db.add(area)
+        db.flush()
+        line_rows = [Line(name=f"Bench Line {i}", area_id=area.id, timestamp=now) for i in range(lines)]
+        db.add_all(line_rows)
+        db.flush()
+        add_node(db, "enterprise", enterprise.id)
+        add_node(db, "site", site.id, enterprise.id)
+        add_node(db, "area", area.id, site.id)
+        for line in line_rows:
+            add_node(db, "line", line.id, area.id)
+
+        planned = StateReason(reason_name="Planned", reason_code=f"BP{label}", record_downtime=True, planned_downtime=True)
+        db.add(planned)
+        db.flush()
+        reasons = [planned] + [
+            StateReason(reason_name=f"Failure {i}", reason_code=f"BF{i}-{label}", record_downtime=True, planned_downtime=False)
+            for i in range(20)
+        ]
+        # A sub-reason that inherits the planned flag
+        reasons.append(StateReason(reason_name="Changeover", reason_code=f"BC{label}", record_downtime=True, parent_id=planned.id))
+        db.add_all(reasons[1:])
+        db.flush()
+
+        rng = random.Random(0)
+        spacing = 86400.0 / events_per_day
+        rows = []
+        for line in line_rows:
+            for n in range(days * events_per_day):
+                started = start + timedelta(seconds=n * spacing + rng.uniform(0, spacing / 2))
+                reason = rng.choice(reasons)
+                rows.append({
+                    "start_datetime": started,
+                    "end_datetime": started + timedelta(seconds=rng.uniform(60, spacing / 2)),
+                    "state_reason_id": reason.id,
+                    "reason_name": reason.reason_name,
+                    "reason_code": reason.reason_code,
+                    "line_id": line.id,
+                })
+            if len(rows) >= 50000:
+                db.execute(insert(StateHistory), rows)
+                rows = []
+        if rows:
+            db.execute(insert(StateHistory), rows)
+        db.commit()
+        return enterprise.id, line_rows[0].id
+    finally:
+        db.close()
+
+def timed(client, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get("/downtime/analytics", params=params)
+        timings.append(time.perf_counter() - started)
+        response.raise_for_status()
+    return min(timings), response.json()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--events-per-day", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    end = datetime.utcnow().replace(microsecond=0)
+    start = end - timedelta(days=args.days)
+    enterprise_id, line_id = seed(args.lines, args.days, args.events_per_day, start)
+    window = {"start": start.isoformat(), "end": end.isoformat()}
+
+    client = TestClient(app)
+    elapsed, body = timed(client, dict(window, enterprise_id=enterprise_id), args.repeat)
+    print(f"rows:        {args.lines * args.days * args.events_per_day}")
+    print(f"enterprise:  {elapsed * 1000:8.1f} ms ({body['events']} events, {len(body['lines'])} lines)")
+    elapsed, body = timed(client, dict(window, line_id=line_id), args.repeat)
+    print(f"single line: {elapsed * 1000:8.1f} ms ({body['events']} events)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Cost of the create_count_history log call when INFO is disabled.
+
+Compares the former eager style (f-string details built by the caller and
+the helper) with the deferred helpers in utils.logging_utils, first in
+isolation with timeit and then end to end through POST /oee/count-history/
+with the mes logger at WARNING and at INFO.
+
+Usage:
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.logging_overhead --calls 200000 --events 1000
+"""
+
+import argparse
+import logging
+import time
+import timeit
+
+from fastapi.testclient import TestClient
+
+from benchmarks.count_ingestion import make_events, seed_references
+from main import app
+from utils.logging_config import logger
+from utils.logging_utils import log_endpoint_access
+
+def eager_log_endpoint_access(entity_type, action, details=None, success=True):
+    """The helper as it was before deferred formatting."""
+    details = f" - {details}" if details else ""
+    if success:
+        logger.info(f"{entity_type} {action} successfully{details}")
+    else:
+        logger.warning(f"Failed to {action} {entity_type}{details}")
+
+def micro(calls):
+    count, tag_path, count_type = 17, "Plant/Line1/Infeed/Good", "Good"
+    eager = timeit.timeit(
+        lambda: eager_log_endpoint_access(
+            "CountHistory", "created", f"count={count}, tag='{tag_path}', type='{count_type}'"
+        ),
+        number=calls
+    )
+    lazy = timeit.timeit(
+        lambda: log_endpoint_access(
+            "CountHistory", "created", "count=%s, tag='%s', type='%s'", count, tag_path, count_type
+        ),
+        number=calls
+    )
+    print(f"eager helper: {eager / calls * 1e9:8.1f} ns/call")
+    print(f"lazy helper:  {lazy / calls * 1e9:8.1f} ns/call")
+
+def end_to_end(events, level):
+    logger.setLevel(level)
+    client = TestClient(app)
+    started = time.perf_counter()
+    for event in events:
+        client.post("/oee/count-history/", json=event)
+    elapsed = time.perf_counter() - started
+    print(f"POST /oee/count-history/ at {logging.getLevelName(level):<7}: "
+          f"{elapsed / len(events) * 1e6:8.1f} us/request")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--events", type=int, default=1000)
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    micro(args.calls)
+
+    references = seed_references()
+    end_to_end(make_events(args.events, *references), logging.WARNING)
+    end_to_end(make_events(args.events, *references), logging.INFO)
+
+if __name__ == "__main__":
+    main()
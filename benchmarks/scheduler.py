@@ -0,0 +1,127 @@
+"""
+Finite-capacity scheduler on a synthetic order book.
+
+First times the pure engine (utils.scheduler.schedule_orders) for every
+objective on in-memory orders, then seeds the same book as WorkOrders and
+times POST /schedule-run/schedule/auto end to end, including the bulk insert
+of the Schedule rows.
+
+Usage:
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.scheduler --orders 10000 --lines 200 --products 50
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from database.engine import Base, SessionLocal, engine
+from database.models.enterprise import Enterprise, Site, Area, Line
+from database.models.workorder import ProductCode, ProductCodeLine, WorkOrder
+from main import app
+from utils.scheduler import OBJECTIVES, Order, plan_summary, schedule_orders
+
+def make_book(orders, lines, products, start, seed=0):
+    """(product -> eligible line indexes, [(product, release offset, hours, due slack)])."""
+    rng = random.Random(seed)
+    eligible = {product: rng.sample(range(lines), rng.randint(1, min(8, lines))) for product in range(products)}
+    book = []
+    for _ in range(orders):
+        hours = rng.uniform(1, 12)
+        release = rng.uniform(0, 24 * 30)
+        book.append((rng.randrange(products), release, hours, rng.uniform(0, 24 * 10)))
+    return eligible, book
+
+def engine_only(eligible, book, start):
+    orders = [
+        Order(
+            id=position,
+            release=start + timedelta(hours=release),
+            due=start + timedelta(hours=release + hours + slack),
+            duration=timedelta(hours=hours),
+            lines=tuple(eligible[product]),
+            sequence=position,
+        )
+        for position, (product, release, hours, slack) in enumerate(book)
+    ]
+    for objective in OBJECTIVES:
+        started = time.perf_counter()
+        assignments, _ = schedule_orders(orders, {}, start, objective)
+        elapsed = time.perf_counter() - started
+        summary = plan_summary(assignments)
+        print(f"engine {objective:<4}: {elapsed * 1000:8.1f} ms, late {summary['late']:5d}, "
+              f"tardiness {summary['total_tardiness_minutes'] / 60:10.1f} h")
+
+def seed(eligible, book, lines, start):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        label = now.timestamp()
+        enterprise = Enterprise(name=f"Bench Enterprise {label}", timestamp=now)
+        db.add(enterprise)
+        db.flush()
+        site = Site(name=f"Bench Site {label}", enterprise_id=enterprise.id, timestamp=now)
+        db.add(site)
+        db.flush()
+        area = Area(name="Bench Area", site_id=site.id, timestamp=now)
+        db.add(area)
+        db.flush()
+        line_rows = [Line(name=f"Bench Line {i}", area_id=area.id, timestamp=now) for i in range(lines)]
+        product_rows = [ProductCode(product_code=f"BENCH-{label}-{p}") for p in eligible]
+        db.add_all(line_rows + product_rows)
+        db.flush()
+        db.add_all([
+            ProductCodeLine(product_code_id=product_rows[product].id, line_id=line_rows[index].id)
+            for product, indexes in eligible.items() for index in indexes
+        ])
+        db.execute(insert(WorkOrder), [
+            {
+                "order_number": f"BENCH-{label}-{position}",
+                "description": "Synthetic order",
+                "line_id": line_rows[eligible[product][0]].id,
+                "product_code_id": product_rows[product].id,
+                "planned_start": start + timedelta(hours=release),
+                "planned_end": start + timedelta(hours=release + hours),
+                "target_quantity": 1000,
+                "status": "Planned",
+                "created_at": now,
+                "updated_at": now,
+            }
+            for position, (product, release, hours, slack) in enumerate(book)
+        ])
+        db.commit()
+        return [line.id for line in line_rows]
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--objective", default="edd", choices=sorted(OBJECTIVES))
+    args = parser.parse_args()
+
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+    eligible, book = make_book(args.orders, args.lines, args.products, start)
+    engine_only(eligible, book, start)
+
+    line_ids = seed(eligible, book, args.lines, start)
+    client = TestClient(app)
+    started = time.perf_counter()
+    response = client.post(
+        "/schedule-run/schedule/auto",
+        json={"objective": args.objective, "start": start.isoformat(), "line_ids": line_ids},
+    )
+    elapsed = time.perf_counter() - started
+    response.raise_for_status()
+    body = response.json()
+    print(f"endpoint {args.objective}: {elapsed:8.2f} s for {body['scheduled']} orders "
+          f"({len(body['unscheduled'])} unscheduled, {body['late']} late)")
+
+if __name__ == "__main__":
+    main()
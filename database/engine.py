@@ -1,14 +1,68 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from config import settings
+from database.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool
+from utils.query_logging import install_query_logging
 
 DATABASE_URL = settings.DATABASE_URL
 
+def async_database_url(url: str) -> str:
+    """
+    Map a sync database URL onto its async driver (asyncpg / aiosqlite).
+    """
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    if dialect == "postgresql":
+        return f"postgresql+asyncpg{sep}{rest}"
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or async_database_url(DATABASE_URL)
+
+def engine_options(url: str, is_async: bool = False, **overrides) -> dict:
+    """
+    Pool and connection keyword arguments for create_engine/create_async_engine,
+    taken from Settings unless overridden (pool_size, max_overflow, ...).
+    """
+    parsed = make_url(url)
+    options = {"echo": settings.SQL_ECHO}
+    # In-memory SQLite lives in a single connection, so it keeps SQLAlchemy's default pool
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return options
+
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    options.update(overrides)
+
+    statement_timeout = options.pop("statement_timeout_ms", settings.DB_STATEMENT_TIMEOUT_MS)
+    if statement_timeout and parsed.get_backend_name() == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(statement_timeout)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
 # Create database engine
-engine = create_engine(DATABASE_URL, echo=True)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+install_query_logging(engine)
 
 # Create session factory
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# Async engine and session factory used by the request handlers; sessions do not
+# expire on commit so returned objects can be serialized without another round trip
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+install_query_logging(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 # Declare the base class for models
 Base = declarative_base()
@@ -5,8 +5,8 @@ Downtime tracking tables:
 Splitting these helps track reasons and logs separately.
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy.orm import relationship, synonym
 from database.engine import Base
 
 class StateReason(Base):
@@ -21,10 +21,18 @@ class StateReason(Base):
 
     # Hierarchical parent-child downtime reasons
     parent_id = Column(Integer, ForeignKey('state_reason.id'), nullable=True)
+    # Name the API has always used for the parent reason
+    sub_reason_of = synonym("parent_id")
     sub_reasons = relationship("StateReason", backref="parent", remote_side=[id])
 
 class StateHistory(Base):
     __tablename__ = 'state_history'
+    __table_args__ = (
+        # Time-series access paths: per line, per run, and whole-table time ranges
+        Index('ix_state_history_line_id_start_datetime', 'line_id', 'start_datetime'),
+        Index('ix_state_history_run_id_start_datetime', 'run_id', 'start_datetime'),
+        Index('ix_state_history_start_datetime_brin', 'start_datetime', postgresql_using='brin'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     start_datetime = Column(DateTime, nullable=False)
@@ -6,9 +6,13 @@ Defines the enterprise hierarchy (ISA-95 Levels):
 - Line
 - Cell
 Splitting these into separate tables ensures each level can scale independently.
+
+HierarchyClosure holds one row per (ancestor, descendant) pair across all
+levels, including each node paired with itself at depth 0, so "every line under
+site X" is a single primary-key range lookup instead of a chain of joins.
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database.engine import Base
 
@@ -79,3 +83,16 @@ class Cell(Base):
 
     line_id = Column(Integer, ForeignKey('line.id'))
     line = relationship("Line", back_populates="cells")
+
+class HierarchyClosure(Base):
+    __tablename__ = 'hierarchy_closure'
+    __table_args__ = (
+        Index('ix_hierarchy_closure_descendant', 'descendant_level', 'descendant_id'),
+    )
+
+    # Levels are 'enterprise', 'site', 'area', 'line' and 'cell'
+    ancestor_level = Column(String(16), primary_key=True)
+    ancestor_id = Column(Integer, primary_key=True)
+    descendant_level = Column(String(16), primary_key=True)
+    descendant_id = Column(Integer, primary_key=True)
+    depth = Column(Integer, nullable=False)
@@ -1,9 +1,11 @@
 """
-OEE-related tables (OEE, CountType, CountTag, CountHistory).
+OEE-related tables (OEE, CountType, CountTag, CountHistory, CountRollup).
 Splitting out 'CountHistory' into its own table helps manage large volumes (high-frequency data).
+On PostgreSQL, count_history is range-partitioned by month on timestamp (see utils/partitions.py).
+'CountRollup' holds per-minute/hour/shift sums of CountHistory so dashboards do not scan raw rows.
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database.engine import Base
 
@@ -38,6 +40,8 @@ class CountTag(Base):
     id = Column(Integer, primary_key=True, index=True)
     tag_path = Column(String(255), nullable=False, unique=True)
     parent_id = Column(Integer, nullable=True)  # optional if you have a parent-child tag structure
+    # Line the signal belongs to; counts posted without a run_id go to its open run
+    line_id = Column(Integer, ForeignKey('line.id'), nullable=True)
 
     # One-to-many: CountTag -> CountHistory
     count_histories = relationship("CountHistory", back_populates="count_tag")
@@ -45,6 +49,12 @@ class CountTag(Base):
 
 class CountHistory(Base):
     __tablename__ = 'count_history'
+    __table_args__ = (
+        # Time-series access paths: per run, per tag, and whole-table time ranges
+        Index('ix_count_history_run_id_timestamp', 'run_id', 'timestamp'),
+        Index('ix_count_history_tag_id_timestamp', 'tag_id', 'timestamp'),
+        Index('ix_count_history_timestamp_brin', 'timestamp', postgresql_using='brin'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, nullable=False)
@@ -59,3 +69,31 @@ class CountHistory(Base):
     # Relationships
     count_tag = relationship("CountTag", back_populates="count_histories")
     count_type_ref = relationship("CountType", back_populates="count_histories")
+
+
+class CountRollup(Base):
+    __tablename__ = 'count_rollup'
+    __table_args__ = (
+        UniqueConstraint('resolution', 'line_id', 'bucket_start', 'run_id', 'count_type_id',
+                         name='uq_count_rollup_bucket'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    resolution = Column(String(10), nullable=False)  # 'minute', 'hour' or 'shift'
+    bucket_start = Column(DateTime, nullable=False)
+
+    line_id = Column(Integer, ForeignKey('line.id'), nullable=False)
+    run_id = Column(Integer, ForeignKey('run.id'), nullable=False)
+    count_type_id = Column(Integer, ForeignKey('count_type.id'), nullable=False)
+
+    count = Column(Integer, nullable=False, default=0)
+    events = Column(Integer, nullable=False, default=0)
+
+
+class CountRollupWatermark(Base):
+    __tablename__ = 'count_rollup_watermark'
+
+    id = Column(Integer, primary_key=True)
+    # Highest CountHistory.id already folded into count_rollup
+    last_count_history_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
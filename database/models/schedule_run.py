@@ -5,12 +5,14 @@ We split Run into:
 - RunMetrics (detailed run metrics such as availability, performance, etc.)
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Index, text
 from sqlalchemy.orm import relationship
 from database.engine import Base
 
 class Schedule(Base):
     __tablename__ = 'schedule'
+    # On PostgreSQL the schedule_line_no_overlap exclusion constraint (btree_gist)
+    # rejects overlapping windows on the same line; see utils/schedule_index.py
 
     id = Column(Integer, primary_key=True, index=True)
     schedule_type = Column(String(50), nullable=True)
@@ -30,6 +32,11 @@ class Schedule(Base):
 
 class Run(Base):
     __tablename__ = 'run'
+    __table_args__ = (
+        # Open runs only; backs the line -> open run lookups of utils/open_runs.py
+        Index('ix_run_open', 'closed', 'schedule_id',
+              postgresql_where=text('closed = false'), sqlite_where=text('closed = 0')),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -0,0 +1,86 @@
+"""
+Connection pools that record how long requests wait for a connection.
+
+The stock QueuePool only exposes its current size and overflow. These
+subclasses also time every checkout from the queue so pool exhaustion shows up
+as wait time and timeouts in GET /system/db-pool instead of as unexplained
+request latency.
+"""
+
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+class PoolWaitStats:
+    """Thread-safe counters for connection checkouts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_avg": self.wait_seconds_total / attempts if attempts else 0.0,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
+
+class _InstrumentedMixin:
+    """Times QueuePool._do_get, which blocks while the pool is exhausted."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - started)
+        return record
+
+class InstrumentedQueuePool(_InstrumentedMixin, QueuePool):
+    """QueuePool for the sync engine."""
+
+class InstrumentedAsyncQueuePool(_InstrumentedMixin, AsyncAdaptedQueuePool):
+    """QueuePool for the async engine."""
+
+def pool_status(name: str, pool) -> dict:
+    """
+    Current occupancy and wait statistics of `pool`.
+    Pools that are not queue-based (e.g. in-memory SQLite) report occupancy only.
+    """
+    is_queue = isinstance(pool, QueuePool)
+    stats = pool.wait_stats.snapshot() if isinstance(pool, _InstrumentedMixin) else {}
+    return {
+        "name": name,
+        "pool_class": type(pool).__name__,
+        "size": pool.size() if is_queue else None,
+        "checked_in": pool.checkedin() if is_queue else None,
+        "checked_out": pool.checkedout() if is_queue else None,
+        "overflow": pool.overflow() if is_queue else None,
+        "max_overflow": pool._max_overflow if is_queue else None,
+        "timeout_seconds": pool.timeout() if is_queue else None,
+        **stats,
+    }
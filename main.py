@@ -1,8 +1,10 @@
 from fastapi import FastAPI
 from config import settings
 from utils.exception_handler import add_custom_exception_handlers
-from utils.logging_config import configure_logging
-from routers import enterprise, site, area, line, cell, oee, downtime, workorder, schedule_run
+from utils.logging_config import configure_logging, logger, stop_logging
+from utils.partitions import maintain_count_history_partitions
+from utils.count_rollup import count_rollup_worker
+from routers import enterprise, site, area, line, cell, oee, downtime, workorder, schedule_run, system, bulk_import
 
 def create_app() -> FastAPI:
     """
@@ -20,6 +22,30 @@ def create_app() -> FastAPI:
     # Add custom exception handlers
     add_custom_exception_handlers(app)
 
+    @app.on_event("startup")
+    def prepare_partitions():
+        """Make sure count_history partitions exist for the coming months."""
+        from database.engine import engine
+        try:
+            maintain_count_history_partitions(engine)
+        except Exception:
+            # Counts still land in the default partition; `python -m utils.partitions` can be rerun
+            logger.exception("count_history partition maintenance failed")
+
+    @app.on_event("startup")
+    def start_count_rollups():
+        """Fold new counts into the rollup tables in the background."""
+        count_rollup_worker.start()
+
+    @app.on_event("shutdown")
+    def stop_count_rollups():
+        count_rollup_worker.stop()
+
+    @app.on_event("shutdown")
+    def flush_logs():
+        """Write out queued log records before the process exits."""
+        stop_logging()
+
     # Include routers
     app.include_router(enterprise.router)
     app.include_router(site.router)
@@ -30,6 +56,8 @@ def create_app() -> FastAPI:
     app.include_router(downtime.router)
     app.include_router(workorder.router)
     app.include_router(schedule_run.router)
+    app.include_router(bulk_import.router)
+    app.include_router(system.router)
 
     return app
 
@@ -3,14 +3,17 @@ Router for handling Area-related operations in the MES system.
 Areas are organizational units within Sites, containing production Lines.
 """
 
-from typing import List
+from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from schemas.enterprise import AreaCreate, AreaUpdate, AreaOut
 from database.models.enterprise import Area, Site
 from utils.dependencies import get_db
+from utils.pagination import PageParams, paginate
+from utils.hierarchy_cache import hierarchy_tree_cache
+from utils.hierarchy_closure import add_node, enterprise_of, move_node, remove_node, under
 from utils.logging_utils import (
     log_endpoint_access,
     log_entity_not_found,
@@ -31,7 +34,7 @@ def create_area(area_in: AreaCreate, db: Session = Depends(get_db)):
     # Validate parent site exists
     site = db.query(Site).filter(Site.id == area_in.parent_id).first()
     if not site:
-        log_entity_not_found("Site", f"id={area_in.parent_id}")
+        log_entity_not_found("Site", "id=%s", area_in.parent_id)
         raise HTTPException(status_code=404, detail="Parent site not found")
 
     # Check for duplicate area name within the site
@@ -40,7 +43,7 @@ def create_area(area_in: AreaCreate, db: Session = Depends(get_db)):
         Area.site_id == area_in.parent_id
     ).first()
     if existing:
-        log_duplicate_entity("Area", f"name='{area_in.name}' in site_id={area_in.parent_id}")
+        log_duplicate_entity("Area", "name='%s' in site_id=%s", area_in.name, area_in.parent_id)
         raise HTTPException(status_code=400, detail="Area with this name already exists in the site")
 
     new_area = Area(
@@ -50,17 +53,32 @@ def create_area(area_in: AreaCreate, db: Session = Depends(get_db)):
         timestamp=datetime.utcnow()
     )
     db.add(new_area)
+    db.flush()
+    add_node(db, "area", new_area.id, new_area.site_id)
+    enterprise_id = enterprise_of(db, "area", new_area.id)
     db.commit()
+    hierarchy_tree_cache.invalidate(enterprise_id)
     db.refresh(new_area)
-    log_endpoint_access("Area", "created", f"name='{new_area.name}' in site='{site.name}'")
+    log_endpoint_access("Area", "created", "name='%s' in site='%s'", new_area.name, site.name)
     return new_area
 
 @router.get("/", response_model=List[AreaOut])
-def get_all_areas(db: Session = Depends(get_db)):
+def get_all_areas(
+    response: Response,
+    site_id: Optional[int] = None,
+    enterprise_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db)
+):
     """
-    Retrieve all areas.
+    Retrieve areas, one keyset page at a time, optionally filtered by site or enterprise.
     """
-    areas = db.query(Area).all()
+    query = db.query(Area)
+    if site_id is not None:
+        query = query.filter(Area.site_id == site_id)
+    if enterprise_id is not None:
+        query = query.filter(under(Area.id, "area", "enterprise", enterprise_id))
+    areas = paginate(query, Area.id, page, response)
     log_query_result("Area", len(areas))
     return areas
 
@@ -71,9 +89,9 @@ def get_area(area_id: int, db: Session = Depends(get_db)):
     """
     area = db.query(Area).filter(Area.id == area_id).first()
     if not area:
-        log_entity_not_found("Area", f"id={area_id}")
+        log_entity_not_found("Area", "id=%s", area_id)
         raise HTTPException(status_code=404, detail="Area not found")
-    log_endpoint_access("Area", "retrieved", f"name='{area.name}'")
+    log_endpoint_access("Area", "retrieved", "name='%s'", area.name)
     return area
 
 @router.put("/{area_id}", response_model=AreaOut)
@@ -83,26 +101,32 @@ def update_area(area_id: int, area_upd: AreaUpdate, db: Session = Depends(get_db
     """
     area = db.query(Area).filter(Area.id == area_id).first()
     if not area:
-        log_entity_not_found("Area", f"id={area_id}")
+        log_entity_not_found("Area", "id=%s", area_id)
         raise HTTPException(status_code=404, detail="Area not found")
 
     # If updating parent_id, validate new parent exists
     if area_upd.parent_id is not None:
         site = db.query(Site).filter(Site.id == area_upd.parent_id).first()
         if not site:
-            log_entity_not_found("Site", f"id={area_upd.parent_id}")
+            log_entity_not_found("Site", "id=%s", area_upd.parent_id)
             raise HTTPException(status_code=404, detail="New parent site not found")
 
     update_data = area_upd.dict(exclude_unset=True)
     if 'parent_id' in update_data:
         update_data['site_id'] = update_data.pop('parent_id')
 
+    moved = 'site_id' in update_data and update_data['site_id'] != area.site_id
     for field, value in update_data.items():
         setattr(area, field, value)
+    if moved:
+        move_node(db, "area", area.id, area.site_id)
+    enterprise_id = enterprise_of(db, "area", area.id)
     
     db.commit()
+    # A moved area may now belong to another enterprise
+    hierarchy_tree_cache.invalidate(None if moved else enterprise_id)
     db.refresh(area)
-    log_endpoint_access("Area", "updated", f"name='{area.name}'")
+    log_endpoint_access("Area", "updated", "name='%s'", area.name)
     return area
 
 @router.delete("/{area_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -112,11 +136,14 @@ def delete_area(area_id: int, db: Session = Depends(get_db)):
     """
     area = db.query(Area).filter(Area.id == area_id).first()
     if not area:
-        log_entity_not_found("Area", f"id={area_id}")
+        log_entity_not_found("Area", "id=%s", area_id)
         raise HTTPException(status_code=404, detail="Area not found")
     
     name = area.name  # Store name before deletion
+    enterprise_id = enterprise_of(db, "area", area.id)
+    remove_node(db, "area", area.id)
     db.delete(area)
     db.commit()
-    log_endpoint_access("Area", "deleted", f"name='{name}'")
+    hierarchy_tree_cache.invalidate(enterprise_id)
+    log_endpoint_access("Area", "deleted", "name='%s'", name)
     return None
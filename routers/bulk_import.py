@@ -0,0 +1,72 @@
+"""
+Router for bulk importing a plant definition (hierarchy and master data).
+One request replaces the hundreds of per-entity POSTs needed to onboard a plant.
+"""
+
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database.models.enterprise import Enterprise
+from schemas.bulk_import import PlantImport, PlantImportResult
+from utils.dependencies import get_async_db
+from utils.hierarchy_cache import hierarchy_tree_cache
+from utils.plant_import import PlantImportError, import_plant, parse_plant_csv, plant_size
+from utils.reason_tree import reason_tree_cache
+from utils.logging_utils import log_endpoint_access, log_entity_not_found
+
+router = APIRouter(
+    prefix="/import",
+    tags=["Import"]
+)
+
+def _parse_plant(body: bytes, content_type: str) -> PlantImport:
+    """Parse a JSON PlantImport document or the path-based CSV layout."""
+    try:
+        if "csv" in content_type:
+            return parse_plant_csv(body.decode("utf-8-sig"))
+        return PlantImport.parse_obj(json.loads(body or b"{}"))
+    except ValueError as exc:
+        if isinstance(exc, ValidationError):
+            raise HTTPException(status_code=422, detail=exc.errors())
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON or UTF-8 CSV")
+    except PlantImportError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors)
+
+@router.post("/enterprise/{enterprise_id}/plant", response_model=PlantImportResult)
+async def import_enterprise_plant(
+    enterprise_id: int,
+    request: Request,
+    dry_run: bool = Query(False, description="Only validate the plant definition"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Import sites, areas, lines, cells, count types/tags and state reasons in one transaction.
+    Accepts a JSON PlantImport document or CSV (text/csv); all problems are reported together.
+    """
+    plant = _parse_plant(await request.body(), request.headers.get("content-type", ""))
+    if plant_size(plant) > settings.IMPORT_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Import exceeds the maximum of {settings.IMPORT_MAX_ITEMS} items"
+        )
+    if not await db.get(Enterprise, enterprise_id):
+        log_entity_not_found("Enterprise", "id=%s", enterprise_id)
+        raise HTTPException(status_code=404, detail="Enterprise not found")
+
+    try:
+        result = await db.run_sync(import_plant, enterprise_id, plant, dry_run)
+    except PlantImportError as exc:
+        await db.rollback()
+        raise HTTPException(status_code=422, detail=exc.errors)
+    if not dry_run:
+        await db.commit()
+        hierarchy_tree_cache.invalidate(enterprise_id)
+        if result["created"]["state_reason"]:
+            reason_tree_cache.invalidate()
+    log_endpoint_access("Plant", "imported" if not dry_run else "validated",
+                        "enterprise_id=%s, created=%s", enterprise_id, result["created"])
+    return result
@@ -3,14 +3,17 @@ Router for handling Cell-related operations in the MES system.
 Cells are the smallest production units, contained within Lines.
 """
 
-from typing import List
+from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from schemas.enterprise import CellCreate, CellUpdate, CellOut
 from database.models.enterprise import Cell, Line
 from utils.dependencies import get_db
+from utils.pagination import PageParams, paginate
+from utils.hierarchy_cache import hierarchy_tree_cache
+from utils.hierarchy_closure import add_node, enterprise_of, move_node, remove_node, under
 from utils.logging_utils import (
     log_endpoint_access,
     log_entity_not_found,
@@ -31,7 +34,7 @@ def create_cell(cell_in: CellCreate, db: Session = Depends(get_db)):
     # Validate parent line exists
     line = db.query(Line).filter(Line.id == cell_in.parent_id).first()
     if not line:
-        log_entity_not_found("Line", f"id={cell_in.parent_id}")
+        log_entity_not_found("Line", "id=%s", cell_in.parent_id)
         raise HTTPException(status_code=404, detail="Parent line not found")
 
     # Check for duplicate cell name within the line
@@ -40,7 +43,7 @@ def create_cell(cell_in: CellCreate, db: Session = Depends(get_db)):
         Cell.line_id == cell_in.parent_id
     ).first()
     if existing:
-        log_duplicate_entity("Cell", f"name='{cell_in.name}' in line_id={cell_in.parent_id}")
+        log_duplicate_entity("Cell", "name='%s' in line_id=%s", cell_in.name, cell_in.parent_id)
         raise HTTPException(status_code=400, detail="Cell with this name already exists in the line")
 
     new_cell = Cell(
@@ -50,17 +53,35 @@ def create_cell(cell_in: CellCreate, db: Session = Depends(get_db)):
         timestamp=datetime.utcnow()
     )
     db.add(new_cell)
+    db.flush()
+    add_node(db, "cell", new_cell.id, new_cell.line_id)
+    enterprise_id = enterprise_of(db, "cell", new_cell.id)
     db.commit()
+    hierarchy_tree_cache.invalidate(enterprise_id)
     db.refresh(new_cell)
-    log_endpoint_access("Cell", "created", f"name='{new_cell.name}' in line='{line.name}'")
+    log_endpoint_access("Cell", "created", "name='%s' in line='%s'", new_cell.name, line.name)
     return new_cell
 
 @router.get("/", response_model=List[CellOut])
-def get_all_cells(db: Session = Depends(get_db)):
+def get_all_cells(
+    response: Response,
+    line_id: Optional[int] = None,
+    area_id: Optional[int] = None,
+    site_id: Optional[int] = None,
+    enterprise_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db)
+):
     """
-    Retrieve all cells.
+    Retrieve cells, one keyset page at a time, optionally filtered by line, area, site or enterprise.
     """
-    cells = db.query(Cell).all()
+    query = db.query(Cell)
+    if line_id is not None:
+        query = query.filter(Cell.line_id == line_id)
+    for ancestor_level, ancestor_id in (("area", area_id), ("site", site_id), ("enterprise", enterprise_id)):
+        if ancestor_id is not None:
+            query = query.filter(under(Cell.id, "cell", ancestor_level, ancestor_id))
+    cells = paginate(query, Cell.id, page, response)
     log_query_result("Cell", len(cells))
     return cells
 
@@ -71,9 +92,9 @@ def get_cell(cell_id: int, db: Session = Depends(get_db)):
     """
     cell = db.query(Cell).filter(Cell.id == cell_id).first()
     if not cell:
-        log_entity_not_found("Cell", f"id={cell_id}")
+        log_entity_not_found("Cell", "id=%s", cell_id)
         raise HTTPException(status_code=404, detail="Cell not found")
-    log_endpoint_access("Cell", "retrieved", f"name='{cell.name}'")
+    log_endpoint_access("Cell", "retrieved", "name='%s'", cell.name)
     return cell
 
 @router.put("/{cell_id}", response_model=CellOut)
@@ -83,26 +104,32 @@ def update_cell(cell_id: int, cell_upd: CellUpdate, db: Session = Depends(get_db
     """
     cell = db.query(Cell).filter(Cell.id == cell_id).first()
     if not cell:
-        log_entity_not_found("Cell", f"id={cell_id}")
+        log_entity_not_found("Cell", "id=%s", cell_id)
         raise HTTPException(status_code=404, detail="Cell not found")
 
     # If updating parent_id, validate new parent exists
     if cell_upd.parent_id is not None:
         line = db.query(Line).filter(Line.id == cell_upd.parent_id).first()
         if not line:
-            log_entity_not_found("Line", f"id={cell_upd.parent_id}")
+            log_entity_not_found("Line", "id=%s", cell_upd.parent_id)
             raise HTTPException(status_code=404, detail="New parent line not found")
 
     update_data = cell_upd.dict(exclude_unset=True)
     if 'parent_id' in update_data:
         update_data['line_id'] = update_data.pop('parent_id')
 
+    moved = 'line_id' in update_data and update_data['line_id'] != cell.line_id
     for field, value in update_data.items():
         setattr(cell, field, value)
+    if moved:
+        move_node(db, "cell", cell.id, cell.line_id)
+    enterprise_id = enterprise_of(db, "cell", cell.id)
     
     db.commit()
+    # A moved cell may now belong to another enterprise
+    hierarchy_tree_cache.invalidate(None if moved else enterprise_id)
     db.refresh(cell)
-    log_endpoint_access("Cell", "updated", f"name='{cell.name}'")
+    log_endpoint_access("Cell", "updated", "name='%s'", cell.name)
     return cell
 
 @router.delete("/{cell_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -112,11 +139,14 @@ def delete_cell(cell_id: int, db: Session = Depends(get_db)):
     """
     cell = db.query(Cell).filter(Cell.id == cell_id).first()
     if not cell:
-        log_entity_not_found("Cell", f"id={cell_id}")
+        log_entity_not_found("Cell", "id=%s", cell_id)
         raise HTTPException(status_code=404, detail="Cell not found")
     
     name = cell.name  # Store name before deletion
+    enterprise_id = enterprise_of(db, "cell", cell.id)
+    remove_node(db, "cell", cell.id)
     db.delete(cell)
     db.commit()
-    log_endpoint_access("Cell", "deleted", f"name='{name}'")
+    hierarchy_tree_cache.invalidate(enterprise_id)
+    log_endpoint_access("Cell", "deleted", "name='%s'", name)
     return None
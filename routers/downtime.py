@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from schemas.downtime import StateReasonCreate, StateReasonUpdate, StateReasonOut, StateHistoryCreate, StateHistoryOut
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from schemas.downtime import (
+    StateReasonCreate, StateReasonUpdate, StateReasonOut, StateReasonNode, StateHistoryCreate, StateHistoryOut,
+    LineStateChange, LineStateOut, DowntimeAnalytics
+)
 from database.models.downtime import StateReason, StateHistory
-from utils.dependencies import get_db
+from utils.dependencies import get_async_db
+from utils.downtime_analytics import downtime_analytics
+from utils.line_state import LineStateError, line_state_tracker
+from utils.pagination import PageParams, paginate_async
+from utils.export import export_response
+from utils.reason_tree import reason_tree_cache
+from utils.run_metrics import run_metrics_engine
 
 router = APIRouter(
     prefix="/downtime",
@@ -12,70 +23,220 @@ router = APIRouter(
 
 # StateReason CRUD
 @router.post("/state-reason/", response_model=StateReasonOut, status_code=status.HTTP_201_CREATED)
-def create_state_reason(state_reason_in: StateReasonCreate, db: Session = Depends(get_db)):
+async def create_state_reason(state_reason_in: StateReasonCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new StateReason.
     """
-    existing = db.query(StateReason).filter(StateReason.reason_code == state_reason_in.reason_code).first()
+    existing = (await db.execute(
+        select(StateReason).where(StateReason.reason_code == state_reason_in.reason_code)
+    )).scalars().first()
     if existing:
         raise HTTPException(status_code=400, detail="StateReason with this code already exists.")
-    new_state_reason = StateReason(**state_reason_in.dict())
+    if state_reason_in.sub_reason_of is not None and not await db.get(StateReason, state_reason_in.sub_reason_of):
+        raise HTTPException(status_code=400, detail="Parent StateReason not found.")
+    new_state_reason = StateReason(**state_reason_in.dict(by_alias=True))
     db.add(new_state_reason)
-    db.commit()
-    db.refresh(new_state_reason)
+    await db.commit()
+    await db.refresh(new_state_reason)
+    reason_tree_cache.invalidate()
     return new_state_reason
 
 @router.get("/state-reason/", response_model=List[StateReasonOut])
-def get_all_state_reasons(db: Session = Depends(get_db)):
+async def get_all_state_reasons(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_async_db)):
+    """
+    Retrieve StateReasons, one keyset page at a time.
+    """
+    return await paginate_async(db, select(StateReason), StateReason.id, page, response)
+
+@router.get("/state-reason/tree", response_model=List[StateReasonNode])
+async def get_state_reason_tree(db: AsyncSession = Depends(get_async_db)):
     """
-    Retrieve all StateReasons.
+    Retrieve the StateReason hierarchy with inherited planned/record flags, served from the cached index.
     """
-    return db.query(StateReason).all()
+    tree = await db.run_sync(reason_tree_cache.get)
+    return tree.as_tree()
 
 @router.put("/state-reason/{state_reason_id}", response_model=StateReasonOut)
-def update_state_reason(state_reason_id: int, state_reason_upd: StateReasonUpdate, db: Session = Depends(get_db)):
+async def update_state_reason(state_reason_id: int, state_reason_upd: StateReasonUpdate, db: AsyncSession = Depends(get_async_db)):
     """
     Update an existing StateReason.
     """
-    state_reason = db.query(StateReason).get(state_reason_id)
+    state_reason = await db.get(StateReason, state_reason_id)
     if not state_reason:
         raise HTTPException(status_code=404, detail="StateReason not found.")
-    for key, value in state_reason_upd.dict(exclude_unset=True).items():
+    changes = state_reason_upd.dict(exclude_unset=True, by_alias=True)
+    parent_id = changes.get("parent_id")
+    if parent_id is not None:
+        tree = await db.run_sync(reason_tree_cache.get)
+        if parent_id not in tree.reasons:
+            raise HTTPException(status_code=400, detail="Parent StateReason not found.")
+        if parent_id == state_reason_id or parent_id in tree.descendants(state_reason_id):
+            raise HTTPException(status_code=400, detail="A StateReason cannot be moved below itself.")
+    for key, value in changes.items():
         setattr(state_reason, key, value)
-    db.commit()
-    db.refresh(state_reason)
+    await db.commit()
+    await db.refresh(state_reason)
+    reason_tree_cache.invalidate()
     return state_reason
 
 @router.delete("/state-reason/{state_reason_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_state_reason(state_reason_id: int, db: Session = Depends(get_db)):
+async def delete_state_reason(state_reason_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a StateReason.
     """
-    state_reason = db.query(StateReason).get(state_reason_id)
+    state_reason = await db.get(StateReason, state_reason_id)
     if not state_reason:
         raise HTTPException(status_code=404, detail="StateReason not found.")
-    db.delete(state_reason)
-    db.commit()
+    await db.delete(state_reason)
+    await db.commit()
+    reason_tree_cache.invalidate()
 
 # StateHistory CRUD
 @router.post("/state-history/", response_model=StateHistoryOut, status_code=status.HTTP_201_CREATED)
-def create_state_history(state_history_in: StateHistoryCreate, db: Session = Depends(get_db)):
+async def create_state_history(state_history_in: StateHistoryCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Record a StateHistory entry.
     """
     # Ensure StateReason exists
-    state_reason = db.query(StateReason).filter(StateReason.id == state_history_in.state_reason_id).first()
+    state_reason = await db.get(StateReason, state_history_in.state_reason_id)
     if not state_reason:
         raise HTTPException(status_code=400, detail="Invalid StateReason.")
-    new_state_history = StateHistory(**state_history_in.dict())
+    new_state_history = StateHistory(
+        start_datetime=state_history_in.start_datetime,
+        end_datetime=state_history_in.end_datetime,
+        state_reason_id=state_reason.id,
+        reason_name=state_reason.reason_name,
+        reason_code=state_reason.reason_code,
+        line_id=state_history_in.line_id,
+        run_id=state_history_in.run_id
+    )
     db.add(new_state_history)
-    db.commit()
-    db.refresh(new_state_history)
+
+    # A closed downtime event is folded into the run's metrics straight away,
+    # with the flags inherited through the reason tree
+    if new_state_history.end_datetime and new_state_history.run_id:
+        tree = await db.run_sync(reason_tree_cache.get)
+        if state_reason.id in tree.reasons and tree.records_downtime(state_reason.id):
+            minutes = (new_state_history.end_datetime - new_state_history.start_datetime).total_seconds() / 60.0
+            await db.run_sync(
+                run_metrics_engine.record_downtime, new_state_history.run_id, max(minutes, 0.0),
+                planned=tree.is_planned(state_reason.id),
+                at=new_state_history.end_datetime
+            )
+    await db.commit()
+    await db.refresh(new_state_history)
+    if new_state_history.end_datetime is None:
+        # The line's open state now lives in this row
+        line_state_tracker.forget(new_state_history.line_id)
     return new_state_history
 
+@router.post("/line/{line_id}/state", response_model=LineStateOut)
+async def change_line_state(line_id: int, state_in: LineStateChange, db: AsyncSession = Depends(get_async_db)):
+    """
+    Move a line into a new state: the open StateHistory is closed and the next one
+    opened in the same transaction. Re-sending the current state changes nothing.
+    """
+    at = state_in.timestamp or datetime.utcnow()
+    async with line_state_tracker.lock(line_id):
+        try:
+            closed_id, opened = await db.run_sync(
+                line_state_tracker.transition, line_id, state_in.state_reason_id, state_in.run_id, at
+            )
+            await db.commit()
+        except LineStateError as exc:
+            await db.rollback()
+            line_state_tracker.forget(line_id)
+            raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+        except Exception:
+            await db.rollback()
+            line_state_tracker.forget(line_id)
+            raise
+        line_state_tracker.remember(line_id, opened)
+    return LineStateOut(
+        line_id=line_id,
+        state_history_id=opened.id,
+        state_reason_id=opened.state_reason_id,
+        run_id=opened.run_id,
+        start_datetime=opened.start_datetime,
+        closed_state_history_id=closed_id
+    )
+
+@router.get("/state-history/export")
+def export_state_histories(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    line_id: Optional[int] = None,
+    run_id: Optional[int] = None,
+    start: Optional[datetime] = Query(None, description="Only states starting at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only states starting before this time"),
+):
+    """
+    Stream StateHistories as NDJSON or CSV straight from a server-side cursor.
+    """
+    statement = select(
+        StateHistory.id, StateHistory.start_datetime, StateHistory.end_datetime,
+        StateHistory.state_reason_id, StateHistory.reason_name, StateHistory.reason_code,
+        StateHistory.line_id, StateHistory.run_id
+    )
+    if line_id is not None:
+        statement = statement.where(StateHistory.line_id == line_id)
+    if run_id is not None:
+        statement = statement.where(StateHistory.run_id == run_id)
+    if start is not None:
+        statement = statement.where(StateHistory.start_datetime >= start)
+    if end is not None:
+        statement = statement.where(StateHistory.start_datetime < end)
+    return export_response(statement.order_by(StateHistory.id), format, "state_history")
+
 @router.get("/state-history/", response_model=List[StateHistoryOut])
-def get_all_state_histories(db: Session = Depends(get_db)):
+async def get_all_state_histories(
+    response: Response,
+    line_id: Optional[int] = None,
+    run_id: Optional[int] = None,
+    state_reason_id: Optional[int] = None,
+    start: Optional[datetime] = Query(None, description="Only states starting at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only states starting before this time"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Retrieve StateHistories, one keyset page at a time, filtered by line, run, reason and time range.
+    """
+    statement = select(StateHistory)
+    if line_id is not None:
+        statement = statement.where(StateHistory.line_id == line_id)
+    if run_id is not None:
+        statement = statement.where(StateHistory.run_id == run_id)
+    if state_reason_id is not None:
+        statement = statement.where(StateHistory.state_reason_id == state_reason_id)
+    if start is not None:
+        statement = statement.where(StateHistory.start_datetime >= start)
+    if end is not None:
+        statement = statement.where(StateHistory.start_datetime < end)
+    return await paginate_async(db, statement, StateHistory.id, page, response)
+
+# Downtime analytics
+@router.get("/analytics", response_model=DowntimeAnalytics)
+async def get_downtime_analytics(
+    start: datetime,
+    end: datetime,
+    line_id: Optional[int] = None,
+    area_id: Optional[int] = None,
+    site_id: Optional[int] = None,
+    enterprise_id: Optional[int] = None,
+    top: int = Query(20, ge=1, le=1000, description="Number of reasons in the Pareto"),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Retrieve all StateHistories.
+    Downtime Pareto by reason, planned vs unplanned minutes, MTBF and MTTR per line
+    and overall, aggregated in the database over [start, end).
     """
-    return db.query(StateHistory).all()
+    # Do not count the future as run time
+    effective_end = min(end, datetime.utcnow())
+    if effective_end <= start:
+        raise HTTPException(status_code=400, detail="Window must end after it starts and not lie in the future")
+    ancestors = [
+        (level, node_id)
+        for level, node_id in (("area", area_id), ("site", site_id), ("enterprise", enterprise_id))
+        if node_id is not None
+    ]
+    return await db.run_sync(downtime_analytics, start, effective_end, line_id, ancestors, top)
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
-from schemas.enterprise import EnterpriseCreate, EnterpriseUpdate, EnterpriseOut
+from schemas.enterprise import EnterpriseCreate, EnterpriseUpdate, EnterpriseOut, EnterpriseTree
 from database.models.enterprise import Enterprise
 from utils.dependencies import get_db
+from utils.pagination import PageParams, paginate
+from utils.hierarchy_cache import hierarchy_tree_cache
+from utils.hierarchy_closure import add_node, remove_node
 from utils.logging_utils import (
     log_endpoint_access,
     log_entity_not_found,
@@ -26,7 +29,7 @@ def create_enterprise(
     """
     existing = db.query(Enterprise).filter(Enterprise.name == enterprise_in.name).first()
     if existing:
-        log_duplicate_entity("Enterprise", f"name='{enterprise_in.name}'")
+        log_duplicate_entity("Enterprise", "name='%s'", enterprise_in.name)
         raise HTTPException(status_code=400, detail="Enterprise already exists.")
 
     new_ent = Enterprise(
@@ -35,17 +38,21 @@ def create_enterprise(
         timestamp=datetime.utcnow()
     )
     db.add(new_ent)
+    db.flush()
+    add_node(db, "enterprise", new_ent.id)
     db.commit()
     db.refresh(new_ent)
-    log_endpoint_access("Enterprise", "created", f"name='{new_ent.name}'")
+    log_endpoint_access("Enterprise", "created", "name='%s'", new_ent.name)
     return new_ent
 
 @router.get("/", response_model=List[EnterpriseOut])
-def get_all_enterprises(db: Session = Depends(get_db)):
+def get_all_enterprises(
+    response: Response, page: PageParams = Depends(), db: Session = Depends(get_db)
+):
     """
-    Retrieve all enterprises.
+    Retrieve enterprises, one keyset page at a time.
     """
-    enterprises = db.query(Enterprise).all()
+    enterprises = paginate(db.query(Enterprise), Enterprise.id, page, response)
     log_query_result("Enterprise", len(enterprises))
     return enterprises
 
@@ -56,11 +63,23 @@ def get_enterprise(enterprise_id: int, db: Session = Depends(get_db)):
     """
     enterprise = db.query(Enterprise).filter(Enterprise.id == enterprise_id).first()
     if not enterprise:
-        log_entity_not_found("Enterprise", f"id={enterprise_id}")
+        log_entity_not_found("Enterprise", "id=%s", enterprise_id)
         raise HTTPException(status_code=404, detail="Enterprise not found")
-    log_endpoint_access("Enterprise", "retrieved", f"name='{enterprise.name}'")
+    log_endpoint_access("Enterprise", "retrieved", "name='%s'", enterprise.name)
     return enterprise
 
+@router.get("/{enterprise_id}/tree", response_model=EnterpriseTree)
+def get_enterprise_tree(enterprise_id: int, db: Session = Depends(get_db)):
+    """
+    Retrieve the full Site -> Area -> Line -> Cell tree of an enterprise.
+    """
+    tree = hierarchy_tree_cache.get(db, enterprise_id)
+    if tree is None:
+        log_entity_not_found("Enterprise", "id=%s", enterprise_id)
+        raise HTTPException(status_code=404, detail="Enterprise not found")
+    log_endpoint_access("Enterprise", "tree retrieved", "id=%s", enterprise_id)
+    return tree
+
 @router.put("/{enterprise_id}", response_model=EnterpriseOut)
 def update_enterprise(
     enterprise_id: int, enterprise_upd: EnterpriseUpdate, db: Session = Depends(get_db)
@@ -70,7 +89,7 @@ def update_enterprise(
     """
     enterprise = db.query(Enterprise).filter(Enterprise.id == enterprise_id).first()
     if not enterprise:
-        log_entity_not_found("Enterprise", f"id={enterprise_id}")
+        log_entity_not_found("Enterprise", "id=%s", enterprise_id)
         raise HTTPException(status_code=404, detail="Enterprise not found")
 
     for field, value in enterprise_upd.dict(exclude_unset=True).items():
@@ -78,7 +97,8 @@ def update_enterprise(
     
     db.commit()
     db.refresh(enterprise)
-    log_endpoint_access("Enterprise", "updated", f"name='{enterprise.name}'")
+    hierarchy_tree_cache.invalidate(enterprise_id)
+    log_endpoint_access("Enterprise", "updated", "name='%s'", enterprise.name)
     return enterprise
 
 @router.delete("/{enterprise_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -88,11 +108,13 @@ def delete_enterprise(enterprise_id: int, db: Session = Depends(get_db)):
     """
     enterprise = db.query(Enterprise).filter(Enterprise.id == enterprise_id).first()
     if not enterprise:
-        log_entity_not_found("Enterprise", f"id={enterprise_id}")
+        log_entity_not_found("Enterprise", "id=%s", enterprise_id)
         raise HTTPException(status_code=404, detail="Enterprise not found")
     
     name = enterprise.name  # Store name before deletion
+    remove_node(db, "enterprise", enterprise.id)
     db.delete(enterprise)
     db.commit()
-    log_endpoint_access("Enterprise", "deleted", f"name='{name}'")
+    hierarchy_tree_cache.invalidate(enterprise_id)
+    log_endpoint_access("Enterprise", "deleted", "name='%s'", name)
     return None
@@ -3,14 +3,17 @@ Router for handling Line-related operations in the MES system.
 Lines are production units within Areas, containing Cells.
 """
 
-from typing import List
+from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from schemas.enterprise import LineCreate, LineUpdate, LineOut
 from database.models.enterprise import Line, Area
 from utils.dependencies import get_db
+from utils.pagination import PageParams, paginate
+from utils.hierarchy_cache import hierarchy_tree_cache
+from utils.hierarchy_closure import add_node, enterprise_of, move_node, remove_node, under
 from utils.logging_utils import (
     log_endpoint_access,
     log_entity_not_found,
@@ -31,7 +34,7 @@ def create_line(line_in: LineCreate, db: Session = Depends(get_db)):
     # Validate parent area exists
     area = db.query(Area).filter(Area.id == line_in.parent_id).first()
     if not area:
-        log_entity_not_found("Area", f"id={line_in.parent_id}")
+        log_entity_not_found("Area", "id=%s", line_in.parent_id)
         raise HTTPException(status_code=404, detail="Parent area not found")
 
     # Check for duplicate line name within the area
@@ -40,7 +43,7 @@ def create_line(line_in: LineCreate, db: Session = Depends(get_db)):
         Line.area_id == line_in.parent_id
     ).first()
     if existing:
-        log_duplicate_entity("Line", f"name='{line_in.name}' in area_id={line_in.parent_id}")
+        log_duplicate_entity("Line", "name='%s' in area_id=%s", line_in.name, line_in.parent_id)
         raise HTTPException(status_code=400, detail="Line with this name already exists in the area")
 
     new_line = Line(
@@ -50,17 +53,35 @@ def create_line(line_in: LineCreate, db: Session = Depends(get_db)):
         timestamp=datetime.utcnow()
     )
     db.add(new_line)
+    db.flush()
+    add_node(db, "line", new_line.id, new_line.area_id)
+    enterprise_id = enterprise_of(db, "line", new_line.id)
     db.commit()
+    hierarchy_tree_cache.invalidate(enterprise_id)
     db.refresh(new_line)
-    log_endpoint_access("Line", "created", f"name='{new_line.name}' in area='{area.name}'")
+    log_endpoint_access("Line", "created", "name='%s' in area='%s'", new_line.name, area.name)
     return new_line
 
 @router.get("/", response_model=List[LineOut])
-def get_all_lines(db: Session = Depends(get_db)):
+def get_all_lines(
+    response: Response,
+    area_id: Optional[int] = None,
+    site_id: Optional[int] = None,
+    enterprise_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db)
+):
     """
-    Retrieve all production lines.
+    Retrieve production lines, one keyset page at a time, optionally filtered by area, site or enterprise.
     """
-    lines = db.query(Line).all()
+    query = db.query(Line)
+    if area_id is not None:
+        query = query.filter(Line.area_id == area_id)
+    if site_id is not None:
+        query = query.filter(under(Line.id, "line", "site", site_id))
+    if enterprise_id is not None:
+        query = query.filter(under(Line.id, "line", "enterprise", enterprise_id))
+    lines = paginate(query, Line.id, page, response)
     log_query_result("Line", len(lines))
     return lines
 
@@ -71,9 +92,9 @@ def get_line(line_id: int, db: Session = Depends(get_db)):
     """
     line = db.query(Line).filter(Line.id == line_id).first()
     if not line:
-        log_entity_not_found("Line", f"id={line_id}")
+        log_entity_not_found("Line", "id=%s", line_id)
         raise HTTPException(status_code=404, detail="Line not found")
-    log_endpoint_access("Line", "retrieved", f"name='{line.name}'")
+    log_endpoint_access("Line", "retrieved", "name='%s'", line.name)
     return line
 
 @router.put("/{line_id}", response_model=LineOut)
@@ -83,26 +104,32 @@ def update_line(line_id: int, line_upd: LineUpdate, db: Session = Depends(get_db
     """
     line = db.query(Line).filter(Line.id == line_id).first()
     if not line:
-        log_entity_not_found("Line", f"id={line_id}")
+        log_entity_not_found("Line", "id=%s", line_id)
         raise HTTPException(status_code=404, detail="Line not found")
 
     # If updating parent_id, validate new parent exists
     if line_upd.parent_id is not None:
         area = db.query(Area).filter(Area.id == line_upd.parent_id).first()
         if not area:
-            log_entity_not_found("Area", f"id={line_upd.parent_id}")
+            log_entity_not_found("Area", "id=%s", line_upd.parent_id)
             raise HTTPException(status_code=404, detail="New parent area not found")
 
     update_data = line_upd.dict(exclude_unset=True)
     if 'parent_id' in update_data:
         update_data['area_id'] = update_data.pop('parent_id')
 
+    moved = 'area_id' in update_data and update_data['area_id'] != line.area_id
     for field, value in update_data.items():
         setattr(line, field, value)
+    if moved:
+        move_node(db, "line", line.id, line.area_id)
+    enterprise_id = enterprise_of(db, "line", line.id)
     
     db.commit()
+    # A moved line may now belong to another enterprise
+    hierarchy_tree_cache.invalidate(None if moved else enterprise_id)
     db.refresh(line)
-    log_endpoint_access("Line", "updated", f"name='{line.name}'")
+    log_endpoint_access("Line", "updated", "name='%s'", line.name)
     return line
 
 @router.delete("/{line_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -112,11 +139,14 @@ def delete_line(line_id: int, db: Session = Depends(get_db)):
     """
     line = db.query(Line).filter(Line.id == line_id).first()
     if not line:
-        log_entity_not_found("Line", f"id={line_id}")
+        log_entity_not_found("Line", "id=%s", line_id)
         raise HTTPException(status_code=404, detail="Line not found")
     
     name = line.name  # Store name before deletion
+    enterprise_id = enterprise_of(db, "line", line.id)
+    remove_node(db, "line", line.id)
     db.delete(line)
     db.commit()
-    log_endpoint_access("Line", "deleted", f"name='{name}'")
+    hierarchy_tree_cache.invalidate(enterprise_id)
+    log_endpoint_access("Line", "deleted", "name='%s'", name)
     return None
@@ -1,12 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+from datetime import datetime
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from schemas.oee import OEECreate, OEEOut
+from typing import Dict, List, Optional, Set, Tuple
+from config import settings
+from schemas.oee import (
+    OEECreate, OEEOut, CountCacheStats, OEEWindowBucket, OEEWindowOut,
+    CountSeriesOut, CountRollupRefreshOut
+)
 from schemas.count_type import CountTypeCreate, CountTypeUpdate, CountTypeOut
-from schemas.count_tag import CountTagCreate, CountTagOut
-from schemas.count_history import CountHistoryCreate, CountHistoryOut
+from schemas.count_tag import CountTagCreate, CountTagUpdate, CountTagOut
+from schemas.count_history import (
+    CountHistoryCreate, CountHistoryOut,
+    CountHistoryBatchItemResult, CountHistoryBatchResult
+)
 from database.models.oee import OEE, CountType, CountTag, CountHistory
-from utils.dependencies import get_db
+from database.models.schedule_run import Run, Schedule
+from database.models.downtime import StateHistory
+from database.models.enterprise import Line
+from database.models.workorder import WorkOrder
+from utils.dependencies import get_async_db
+from utils.count_cache import CachedCountTag, count_lookup_cache
+from utils.open_runs import open_run_index
+from utils.reason_tree import reason_tree_cache
+from utils.pagination import PageParams, paginate_async
+from utils.export import export_response
+from utils.count_rollup import count_rollup_worker, query_counts
+from utils.run_metrics import RunClosedError, run_metrics_engine, is_good_count_type, ideal_rate_per_minute
+from utils.oee_window import BUCKET_SECONDS, bucket_edges, from_epoch_seconds, to_epoch_seconds, window_oee
 from utils.logging_utils import (
     log_endpoint_access,
     log_entity_not_found,
@@ -21,125 +47,590 @@ router = APIRouter(
 
 # CountType CRUD
 @router.post("/count-type/", response_model=CountTypeOut, status_code=status.HTTP_201_CREATED)
-def create_count_type(count_type_in: CountTypeCreate, db: Session = Depends(get_db)):
+async def create_count_type(count_type_in: CountTypeCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new CountType.
     """
-    existing = db.query(CountType).filter(CountType.count_type == count_type_in.count_type).first()
+    existing = (await db.execute(
+        select(CountType).where(CountType.count_type == count_type_in.count_type)
+    )).scalars().first()
     if existing:
-        log_duplicate_entity("CountType", f"type='{count_type_in.count_type}'")
+        log_duplicate_entity("CountType", "type='%s'", count_type_in.count_type)
         raise HTTPException(status_code=400, detail="CountType already exists.")
     new_count_type = CountType(**count_type_in.dict())
     db.add(new_count_type)
-    db.commit()
-    db.refresh(new_count_type)
-    log_endpoint_access("CountType", "created", f"type='{new_count_type.count_type}'")
+    await db.commit()
+    await db.refresh(new_count_type)
+    count_lookup_cache.invalidate_type(new_count_type.id)
+    log_endpoint_access("CountType", "created", "type='%s'", new_count_type.count_type)
     return new_count_type
 
 @router.get("/count-type/", response_model=List[CountTypeOut])
-def get_all_count_types(db: Session = Depends(get_db)):
+async def get_all_count_types(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_async_db)):
     """
-    Retrieve all CountTypes.
+    Retrieve CountTypes, one keyset page at a time.
     """
-    count_types = db.query(CountType).all()
+    count_types = await paginate_async(db, select(CountType), CountType.id, page, response)
     log_query_result("CountType", len(count_types))
     return count_types
 
 @router.put("/count-type/{count_type_id}", response_model=CountTypeOut)
-def update_count_type(count_type_id: int, count_type_upd: CountTypeUpdate, db: Session = Depends(get_db)):
+async def update_count_type(count_type_id: int, count_type_upd: CountTypeUpdate, db: AsyncSession = Depends(get_async_db)):
     """
     Update an existing CountType.
     """
-    count_type = db.query(CountType).get(count_type_id)
+    count_type = await db.get(CountType, count_type_id)
     if not count_type:
-        log_entity_not_found("CountType", f"id={count_type_id}")
+        log_entity_not_found("CountType", "id=%s", count_type_id)
         raise HTTPException(status_code=404, detail="CountType not found.")
     for key, value in count_type_upd.dict(exclude_unset=True).items():
         setattr(count_type, key, value)
-    db.commit()
-    db.refresh(count_type)
-    log_endpoint_access("CountType", "updated", f"id={count_type_id}")
+    await db.commit()
+    await db.refresh(count_type)
+    count_lookup_cache.invalidate_type(count_type_id)
+    log_endpoint_access("CountType", "updated", "id=%s", count_type_id)
     return count_type
 
 @router.delete("/count-type/{count_type_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_count_type(count_type_id: int, db: Session = Depends(get_db)):
+async def delete_count_type(count_type_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a CountType.
     """
-    count_type = db.query(CountType).get(count_type_id)
+    count_type = await db.get(CountType, count_type_id)
     if not count_type:
-        log_entity_not_found("CountType", f"id={count_type_id}")
+        log_entity_not_found("CountType", "id=%s", count_type_id)
         raise HTTPException(status_code=404, detail="CountType not found.")
-    db.delete(count_type)
-    db.commit()
-    log_endpoint_access("CountType", "deleted", f"id={count_type_id}")
+    await db.delete(count_type)
+    await db.commit()
+    count_lookup_cache.invalidate_type(count_type_id)
+    log_endpoint_access("CountType", "deleted", "id=%s", count_type_id)
 
 # CountTag CRUD
 @router.post("/count-tag/", response_model=CountTagOut, status_code=status.HTTP_201_CREATED)
-def create_count_tag(count_tag_in: CountTagCreate, db: Session = Depends(get_db)):
+async def create_count_tag(count_tag_in: CountTagCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new CountTag.
     """
     # Validate parent count type exists
-    count_type = db.query(CountType).filter(CountType.id == count_tag_in.parent_id).first()
+    count_type = await db.get(CountType, count_tag_in.parent_id)
     if not count_type:
-        log_entity_not_found("CountType", f"id={count_tag_in.parent_id}")
+        log_entity_not_found("CountType", "id=%s", count_tag_in.parent_id)
         raise HTTPException(status_code=404, detail="Parent count type not found")
 
     # Check for duplicate tag path
-    existing = db.query(CountTag).filter(CountTag.tag_path == count_tag_in.tag_path).first()
+    existing = (await db.execute(
+        select(CountTag).where(CountTag.tag_path == count_tag_in.tag_path)
+    )).scalars().first()
     if existing:
-        log_duplicate_entity("CountTag", f"path='{count_tag_in.tag_path}'")
+        log_duplicate_entity("CountTag", "path='%s'", count_tag_in.tag_path)
         raise HTTPException(status_code=400, detail="Count tag with this path already exists")
 
+    if count_tag_in.line_id is not None and not await db.get(Line, count_tag_in.line_id):
+        log_entity_not_found("Line", "id=%s", count_tag_in.line_id)
+        raise HTTPException(status_code=404, detail="Line not found")
+
     new_count_tag = CountTag(**count_tag_in.dict())
     db.add(new_count_tag)
-    db.commit()
-    db.refresh(new_count_tag)
-    log_endpoint_access("CountTag", "created", f"path='{new_count_tag.tag_path}'")
+    await db.commit()
+    await db.refresh(new_count_tag)
+    count_lookup_cache.invalidate_tag(new_count_tag.id)
+    log_endpoint_access("CountTag", "created", "path='%s'", new_count_tag.tag_path)
     return new_count_tag
 
 @router.get("/count-tag/", response_model=List[CountTagOut])
-def get_all_count_tags(db: Session = Depends(get_db)):
+async def get_all_count_tags(
+    response: Response,
+    parent_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Retrieve all CountTags.
+    Retrieve CountTags, one keyset page at a time, optionally filtered by CountType.
     """
-    count_tags = db.query(CountTag).all()
+    statement = select(CountTag)
+    if parent_id is not None:
+        statement = statement.where(CountTag.parent_id == parent_id)
+    count_tags = await paginate_async(db, statement, CountTag.id, page, response)
     log_query_result("CountTag", len(count_tags))
     return count_tags
 
+@router.put("/count-tag/{count_tag_id}", response_model=CountTagOut)
+async def update_count_tag(count_tag_id: int, count_tag_upd: CountTagUpdate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Update an existing CountTag.
+    """
+    count_tag = await db.get(CountTag, count_tag_id)
+    if not count_tag:
+        log_entity_not_found("CountTag", "id=%s", count_tag_id)
+        raise HTTPException(status_code=404, detail="CountTag not found.")
+
+    # If updating parent_id, validate new parent count type exists
+    if count_tag_upd.parent_id is not None:
+        count_type = await db.get(CountType, count_tag_upd.parent_id)
+        if not count_type:
+            log_entity_not_found("CountType", "id=%s", count_tag_upd.parent_id)
+            raise HTTPException(status_code=404, detail="Parent count type not found")
+
+    if count_tag_upd.line_id is not None and not await db.get(Line, count_tag_upd.line_id):
+        log_entity_not_found("Line", "id=%s", count_tag_upd.line_id)
+        raise HTTPException(status_code=404, detail="Line not found")
+
+    for key, value in count_tag_upd.dict(exclude_unset=True).items():
+        setattr(count_tag, key, value)
+    await db.commit()
+    await db.refresh(count_tag)
+    count_lookup_cache.invalidate_tag(count_tag_id)
+    log_endpoint_access("CountTag", "updated", "id=%s", count_tag_id)
+    return count_tag
+
+@router.delete("/count-tag/{count_tag_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_count_tag(count_tag_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Delete a CountTag.
+    """
+    count_tag = await db.get(CountTag, count_tag_id)
+    if not count_tag:
+        log_entity_not_found("CountTag", "id=%s", count_tag_id)
+        raise HTTPException(status_code=404, detail="CountTag not found.")
+    await db.delete(count_tag)
+    await db.commit()
+    count_lookup_cache.invalidate_tag(count_tag_id)
+    log_endpoint_access("CountTag", "deleted", "id=%s", count_tag_id)
+
+@router.get("/count-cache/stats", response_model=CountCacheStats)
+async def get_count_cache_stats():
+    """
+    Report hit/miss counters of the CountTag/CountType lookup cache.
+    """
+    return count_lookup_cache.stats()
+
 # CountHistory CRUD
+async def _open_run_of(db: AsyncSession, count_tag: CachedCountTag) -> int:
+    """Open run of the tag's line, for counts posted without a run_id."""
+    if count_tag.line_id is None:
+        raise HTTPException(status_code=400, detail="CountTag is not assigned to a line; run_id is required")
+    run_id = await db.run_sync(open_run_index.run_for_line, count_tag.line_id)
+    if run_id is None:
+        log_entity_not_found("Run", "open run of line_id=%s", count_tag.line_id)
+        raise HTTPException(status_code=404, detail="No open run on the tag's line")
+    return run_id
+
 @router.post("/count-history/", response_model=CountHistoryOut, status_code=status.HTTP_201_CREATED)
-def create_count_history(count_history_in: CountHistoryCreate, db: Session = Depends(get_db)):
+async def create_count_history(count_history_in: CountHistoryCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Record a CountHistory.
+    The tag may be given by path; count_type_id then defaults to the tag's CountType and
+    run_id to the open run of the tag's line.
     """
-    # Validate count tag exists and matches count type
-    count_tag = db.query(CountTag).filter(CountTag.id == count_history_in.tag_id).first()
-    count_type = db.query(CountType).filter(CountType.id == count_history_in.count_type_id).first()
+    # Validate count tag exists and matches count type (served from the lookup cache)
+    if count_history_in.tag_id is not None:
+        count_tag = await db.run_sync(count_lookup_cache.get_tag, count_history_in.tag_id)
+    else:
+        count_tag = await db.run_sync(count_lookup_cache.get_tag_by_path, count_history_in.tag_path)
+    count_type_id = count_history_in.count_type_id
+    if count_type_id is None and count_tag:
+        count_type_id = count_tag.parent_id
+    count_type = await db.run_sync(count_lookup_cache.get_type, count_type_id) if count_type_id is not None else None
 
     if not count_tag or not count_type:
-        log_entity_not_found("CountTag/CountType", f"tag_id={count_history_in.tag_id}, type_id={count_history_in.count_type_id}")
+        log_entity_not_found(
+            "CountTag/CountType", "tag=%s, type_id=%s",
+            count_history_in.tag_id if count_history_in.tag_id is not None else count_history_in.tag_path,
+            count_type_id
+        )
         raise HTTPException(status_code=404, detail="Invalid CountTag or CountType")
 
     # Ensure the count tag belongs to the specified count type
     if count_tag.parent_id != count_type.id:
-        log_entity_not_found("CountTag/CountType", f"Mismatch: tag.parent_id={count_tag.parent_id}, type.id={count_type.id}")
+        log_entity_not_found("CountTag/CountType", "Mismatch: tag.parent_id=%s, type.id=%s", count_tag.parent_id, count_type.id)
         raise HTTPException(status_code=400, detail="CountTag does not belong to specified CountType")
 
-    new_count_history = CountHistory(**count_history_in.dict())
-    db.add(new_count_history)
-    db.commit()
-    db.refresh(new_count_history)
-    log_endpoint_access("CountHistory", "created", 
-                       f"count={new_count_history.count}, tag='{count_tag.tag_path}', type='{count_type.count_type}'")
+    attributed = count_history_in.run_id is None
+    run_id = await _open_run_of(db, count_tag) if attributed else count_history_in.run_id
+    good = is_good_count_type(count_type.count_type)
+    while True:
+        new_count_history = CountHistory(
+            timestamp=count_history_in.timestamp,
+            count=count_history_in.count,
+            tag_id=count_tag.id,
+            count_type_id=count_type.id,
+            run_id=run_id
+        )
+        # The row is added inside record_counts once the run is known to exist and be
+        # open, so a bad run_id never reaches the INSERT
+        try:
+            await db.run_sync(
+                run_metrics_engine.record_counts, run_id,
+                good=new_count_history.count if good else 0,
+                waste=0 if good else new_count_history.count,
+                at=new_count_history.timestamp,
+                rows=[new_count_history]
+            )
+            break
+        except (RunClosedError, LookupError) as exc:
+            await db.rollback()
+            error = (409, "Run is closed") if isinstance(exc, RunClosedError) else (404, "Run not found")
+            if not attributed:
+                raise HTTPException(status_code=error[0], detail=error[1])
+        # The run was closed by another process; look the line up again once
+        open_run_index.forget(count_tag.line_id)
+        stale_run_id, run_id = run_id, await _open_run_of(db, count_tag)
+        if run_id == stale_run_id:
+            raise HTTPException(status_code=error[0], detail=error[1])
+        attributed = False
+    await db.commit()
+    await db.refresh(new_count_history)
+    log_endpoint_access(
+        "CountHistory", "created", "count=%s, tag='%s', type='%s'",
+        new_count_history.count, count_tag.tag_path, count_type.count_type
+    )
     return new_count_history
 
+@router.get("/count-history/export")
+def export_count_histories(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    run_id: Optional[int] = None,
+    line_id: Optional[int] = None,
+    start: Optional[datetime] = Query(None, description="Only counts at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only counts before this time"),
+):
+    """
+    Stream CountHistories as NDJSON or CSV straight from a server-side cursor.
+    """
+    statement = select(
+        CountHistory.id, CountHistory.timestamp, CountHistory.count,
+        CountHistory.tag_id, CountHistory.count_type_id, CountHistory.run_id
+    )
+    if run_id is not None:
+        statement = statement.where(CountHistory.run_id == run_id)
+    if line_id is not None:
+        statement = statement.join(Run, Run.id == CountHistory.run_id).join(
+            Schedule, Schedule.id == Run.schedule_id
+        ).where(Schedule.line_id == line_id)
+    if start is not None:
+        statement = statement.where(CountHistory.timestamp >= start)
+    if end is not None:
+        statement = statement.where(CountHistory.timestamp < end)
+    log_endpoint_access("CountHistory", "exported", "format=%s", format)
+    return export_response(statement.order_by(CountHistory.id), format, "count_history")
+
 @router.get("/count-history/", response_model=List[CountHistoryOut])
-def get_all_count_histories(db: Session = Depends(get_db)):
+async def get_all_count_histories(
+    response: Response,
+    run_id: Optional[int] = None,
+    line_id: Optional[int] = None,
+    tag_id: Optional[int] = None,
+    count_type_id: Optional[int] = None,
+    start: Optional[datetime] = Query(None, description="Only counts at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only counts before this time"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Retrieve all CountHistories.
+    Retrieve CountHistories, one keyset page at a time, filtered by run, line, tag, type and time range.
     """
-    count_history = db.query(CountHistory).all()
+    statement = select(CountHistory)
+    if run_id is not None:
+        statement = statement.where(CountHistory.run_id == run_id)
+    if line_id is not None:
+        statement = statement.join(Run, Run.id == CountHistory.run_id).join(
+            Schedule, Schedule.id == Run.schedule_id
+        ).where(Schedule.line_id == line_id)
+    if tag_id is not None:
+        statement = statement.where(CountHistory.tag_id == tag_id)
+    if count_type_id is not None:
+        statement = statement.where(CountHistory.count_type_id == count_type_id)
+    if start is not None:
+        statement = statement.where(CountHistory.timestamp >= start)
+    if end is not None:
+        statement = statement.where(CountHistory.timestamp < end)
+    count_history = await paginate_async(db, statement, CountHistory.id, page, response)
     log_query_result("CountHistory", len(count_history))
     return count_history
+
+def _parse_count_batch(body: bytes, content_type: str) -> List[Tuple[Optional[CountHistoryCreate], Optional[str]]]:
+    """
+    Parse a batch body (JSON array or NDJSON) into (item, error) pairs.
+    Items are validated one by one so a single bad record does not reject the batch.
+    """
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        raw_items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                raw_items.append(json.loads(line))
+            except ValueError:
+                raw_items.append(None)
+    else:
+        try:
+            raw_items = json.loads(body or b"[]")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+        if not isinstance(raw_items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of CountHistory items")
+
+    if len(raw_items) > settings.COUNT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds the maximum of {settings.COUNT_BATCH_MAX_ITEMS} items"
+        )
+
+    parsed = []
+    for raw in raw_items:
+        if not isinstance(raw, dict):
+            parsed.append((None, "Item is not a JSON object"))
+            continue
+        try:
+            parsed.append((CountHistoryCreate.parse_obj(raw), None))
+        except ValidationError as exc:
+            parsed.append((None, "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in exc.errors()
+            )))
+    return parsed
+
+def _open_runs_of_lines(db: Session, line_ids: Set[int]) -> Tuple[Dict[int, int], Dict[int, bool]]:
+    """
+    Open run per line from the open-run map, with the closed flag of each run (one query).
+    Lines whose mapped run was closed by another process are looked up again.
+    """
+    line_runs = open_run_index.runs_for_lines(db, line_ids)
+    runs_closed = dict(
+        db.query(Run.id, Run.closed).filter(Run.id.in_(set(line_runs.values()))).all()
+    ) if line_runs else {}
+    stale = {line_id for line_id, run_id in line_runs.items() if runs_closed.get(run_id, True)}
+    if stale:
+        for line_id in stale:
+            open_run_index.forget(line_id)
+            line_runs.pop(line_id)
+        fresh = open_run_index.runs_for_lines(db, stale)
+        line_runs.update(fresh)
+        runs_closed.update((run_id, False) for run_id in fresh.values())
+    return line_runs, runs_closed
+
+def _store_count_batch(
+    db: Session, parsed: List[Tuple[Optional[CountHistoryCreate], Optional[str]]]
+) -> CountHistoryBatchResult:
+    """
+    Validate all tag/type/run references (tags and types via the lookup cache, open
+    runs via the open-run map), lock the runs and write the accepted rows in a single
+    executemany INSERT. The caller commits.
+    """
+    items = [item for item, _ in parsed if item is not None]
+    tags = count_lookup_cache.get_tags(db, {item.tag_id for item in items if item.tag_id is not None})
+    tags_by_path = count_lookup_cache.get_tags_by_path(db, {item.tag_path for item in items if item.tag_id is None})
+    item_tags = [
+        None if item is None else tags.get(item.tag_id) if item.tag_id is not None else tags_by_path.get(item.tag_path)
+        for item, _ in parsed
+    ]
+    type_ids = {
+        item.count_type_id if item.count_type_id is not None else tag.parent_id
+        for (item, _), tag in zip(parsed, item_tags) if tag is not None
+    }
+    known_types = count_lookup_cache.get_types(db, type_ids - {None})
+
+    attributed_lines = {
+        tag.line_id for (item, _), tag in zip(parsed, item_tags)
+        if item is not None and item.run_id is None and tag is not None and tag.line_id is not None
+    }
+    line_runs, runs_closed = _open_runs_of_lines(db, attributed_lines) if attributed_lines else ({}, {})
+    run_ids = {item.run_id for item in items if item.run_id is not None} - runs_closed.keys()
+    if run_ids:
+        runs_closed.update(db.query(Run.id, Run.closed).filter(Run.id.in_(run_ids)).all())
+
+    results = []
+    rows = []
+    run_totals = {}
+    for index, ((item, error), tag) in enumerate(zip(parsed, item_tags)):
+        if item is not None:
+            count_type_id = item.count_type_id if item.count_type_id is not None else tag and tag.parent_id
+            run_id = item.run_id if item.run_id is not None else tag and line_runs.get(tag.line_id)
+            if tag is None or count_type_id not in known_types:
+                error = "Invalid CountTag or CountType"
+            elif tag.parent_id != count_type_id:
+                error = "CountTag does not belong to specified CountType"
+            elif item.run_id is None and tag.line_id is None:
+                error = "CountTag is not assigned to a line; run_id is required"
+            elif item.run_id is None and run_id is None:
+                error = "No open run on the tag's line"
+            elif run_id not in runs_closed:
+                error = "Run not found"
+            elif runs_closed[run_id]:
+                error = "Run is closed"
+        if error:
+            results.append(CountHistoryBatchItemResult(index=index, accepted=False, error=error))
+        else:
+            rows.append({
+                "timestamp": item.timestamp, "count": item.count,
+                "tag_id": tag.id, "count_type_id": count_type_id, "run_id": run_id
+            })
+            results.append(CountHistoryBatchItemResult(index=index, accepted=True))
+            good, waste, last_seen = run_totals.get(run_id, (0, 0, item.timestamp))
+            if is_good_count_type(known_types[count_type_id].count_type):
+                good += item.count
+            else:
+                waste += item.count
+            run_totals[run_id] = (good, waste, max(last_seen, item.timestamp))
+
+    if rows:
+        # Lock the runs (in run_id order) before inserting: the insert's foreign key share
+        # locks would otherwise be held while waiting for another batch's run locks
+        run_metrics_engine.lock_runs(db, run_totals)
+        db.execute(insert(CountHistory), rows)
+        # Fold the batch into RunMetrics with one update per run, in the same order
+        for run_id, (good, waste, last_seen) in sorted(run_totals.items()):
+            run_metrics_engine.record_counts(db, run_id, good=good, waste=waste, at=last_seen)
+
+    return CountHistoryBatchResult(
+        accepted=len(rows),
+        rejected=len(results) - len(rows),
+        results=results
+    )
+
+@router.post("/count-history/batch", response_model=CountHistoryBatchResult)
+async def create_count_history_batch(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Record many CountHistory items in one transaction.
+    Accepts a JSON array or NDJSON (application/x-ndjson) body and returns a per-item result.
+    """
+    parsed = _parse_count_batch(await request.body(), request.headers.get("content-type", ""))
+    try:
+        result = await db.run_sync(_store_count_batch, parsed)
+    except (RunClosedError, LookupError):
+        # A run in the batch was closed or removed after validation; nothing is stored
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="A run in the batch changed meanwhile, retry")
+    await db.commit()
+    log_endpoint_access("CountHistory", "batch created",
+                        "accepted=%s, rejected=%s", result.accepted, result.rejected)
+    return result
+
+# Windowed OEE
+@router.get("/line/{line_id}/window", response_model=OEEWindowOut)
+async def get_line_oee_window(
+    line_id: int,
+    start: datetime,
+    end: datetime,
+    bucket: str = Query("hour", regex="^(hour|shift|day)$"),
+    ideal_rate: Optional[float] = Query(None, gt=0, description="Ideal rate in units per minute"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Compute availability, performance, quality and OEE per bucket for a line
+    from raw CountHistory and StateHistory rows.
+    """
+    line = await db.get(Line, line_id)
+    if not line:
+        log_entity_not_found("Line", "id=%s", line_id)
+        raise HTTPException(status_code=404, detail="Line not found")
+
+    # Do not count the future as available time
+    effective_end = min(end, datetime.utcnow())
+    if effective_end <= start:
+        raise HTTPException(status_code=400, detail="Window must end after it starts and not lie in the future")
+
+    # Counts for the line's runs, pulled once as columns
+    count_rows = (await db.execute(
+        select(CountHistory.timestamp, CountHistory.count, CountHistory.count_type_id).join(
+            Run, Run.id == CountHistory.run_id
+        ).join(Schedule, Schedule.id == Run.schedule_id).where(
+            Schedule.line_id == line_id,
+            CountHistory.timestamp >= start,
+            CountHistory.timestamp < effective_end
+        )
+    )).all()
+    count_ts, count_values, count_type_ids = zip(*count_rows) if count_rows else ((), (), ())
+    count_ts = to_epoch_seconds(count_ts)
+    count_values = np.asarray(count_values, dtype=np.float64)
+    count_type_ids = np.asarray(count_type_ids, dtype=np.int64)
+    types = await db.run_sync(count_lookup_cache.get_types, np.unique(count_type_ids).tolist())
+    good_type_ids = [type_id for type_id, cached in types.items() if is_good_count_type(cached.count_type)]
+    count_is_good = np.isin(count_type_ids, good_type_ids)
+
+    # Downtime intervals overlapping the window; open intervals run until the window end.
+    # Flags are inherited through the reason tree, as in the run metrics and analytics
+    tree = await db.run_sync(reason_tree_cache.get)
+    recorded_ids, planned_ids = tree.downtime_reason_ids()
+    down_rows = (await db.execute(
+        select(StateHistory.start_datetime, StateHistory.end_datetime, StateHistory.state_reason_id).where(
+            StateHistory.line_id == line_id,
+            StateHistory.state_reason_id.in_(recorded_ids),
+            StateHistory.start_datetime < effective_end,
+            or_(StateHistory.end_datetime.is_(None), StateHistory.end_datetime > start)
+        )
+    )).all()
+    down_starts, down_ends, down_reason_ids = zip(*down_rows) if down_rows else ((), (), ())
+    down_starts = to_epoch_seconds(down_starts)
+    down_ends = to_epoch_seconds(down_ends, fill=effective_end)
+    down_planned = np.isin(np.asarray(down_reason_ids, dtype=np.int64), planned_ids)
+
+    # Without an explicit ideal rate, use the average planned rate of the line's work orders in the window
+    if ideal_rate is None:
+        rates = [
+            ideal_rate_per_minute(*row) for row in (await db.execute(
+                select(WorkOrder.target_quantity, WorkOrder.planned_start, WorkOrder.planned_end).where(
+                    WorkOrder.line_id == line_id,
+                    WorkOrder.planned_start < effective_end,
+                    WorkOrder.planned_end > start
+                )
+            )).all()
+        ]
+        rates = [rate for rate in rates if rate]
+        ideal_rate = sum(rates) / len(rates) if rates else None
+
+    edges = bucket_edges(start, effective_end, BUCKET_SECONDS[bucket])
+    metrics = window_oee(
+        edges, count_ts, count_values, count_is_good,
+        down_starts, down_ends, down_planned, ideal_rate
+    )
+
+    buckets = [
+        OEEWindowBucket(
+            bucket_start=from_epoch_seconds(edges[i]),
+            bucket_end=from_epoch_seconds(edges[i + 1]),
+            good_count=metrics["good_count"][i],
+            waste_count=metrics["total_count"][i] - metrics["good_count"][i],
+            total_count=metrics["total_count"][i],
+            planned_downtime=metrics["planned_downtime"][i],
+            unplanned_downtime=metrics["unplanned_downtime"][i],
+            availability=metrics["availability"][i],
+            performance=metrics["performance"][i],
+            quality=metrics["quality"][i],
+            oee=metrics["oee"][i]
+        )
+        for i in range(len(edges) - 1)
+    ]
+    log_query_result("OEE window bucket", len(buckets))
+    return OEEWindowOut(
+        line_id=line_id, start=start, end=end, bucket=bucket,
+        ideal_rate=ideal_rate, buckets=buckets
+    )
+
+# Count rollups
+@router.get("/line/{line_id}/counts", response_model=CountSeriesOut)
+async def get_line_counts(
+    line_id: int,
+    start: datetime,
+    end: datetime,
+    resolution: str = Query("hour", regex="^(minute|hour|shift|day)$"),
+    run_id: Optional[int] = None,
+    count_type_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Count totals per bucket for a line, read from the coarsest fitting rollup plus the unrolled tail.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Window must end after it starts")
+    source, points = await db.run_sync(query_counts, line_id, start, end, resolution, run_id, count_type_id)
+    log_query_result("Count bucket", len(points))
+    return CountSeriesOut(line_id=line_id, resolution=resolution, source=source, points=points)
+
+@router.post("/count-rollup/refresh", response_model=CountRollupRefreshOut)
+async def refresh_count_rollups():
+    """
+    Fold all pending CountHistory rows into the rollups now.
+    """
+    folded = await run_in_threadpool(count_rollup_worker.run_once)
+    log_endpoint_access("CountRollup", "refreshed", "folded=%s", folded)
+    return CountRollupRefreshOut(folded=folded)
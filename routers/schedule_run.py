@@ -1,58 +1,221 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.schedule_run import (
-    ScheduleCreate, ScheduleUpdate, ScheduleOut,
-    RunCreate, RunUpdate, RunOut
+    ScheduleCreate, ScheduleUpdate, ScheduleOut, FreeSlotsOut, AutoScheduleRequest, AutoScheduleOut,
+    RunCreate, RunUpdate, RunOut, RunClose, RunCloseOut, RunMetricsOut
 )
-from database.models.schedule_run import Schedule, Run
+from database.models.schedule_run import Schedule, Run, RunMetrics
 from database.models.enterprise import Line
-from utils.dependencies import get_db
+from utils.dependencies import get_async_db
+from utils.pagination import PageParams, paginate_async
+from utils.open_runs import open_run_index
+from utils.run_metrics import RunClosedError, run_metrics_engine
+from utils.schedule_index import schedule_index
+from utils.scheduler import auto_schedule
 
 router = APIRouter(
     prefix="/schedule-run",
     tags=["ScheduleRun"]
 )
 
+async def _reject_overlaps(db: AsyncSession, line_id: int, start: datetime, finish: datetime,
+                           exclude_id: Optional[int] = None):
+    conflicts = await db.run_sync(schedule_index.conflicts, line_id, start, finish, exclude_id)
+    if conflicts:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Schedule overlaps schedule(s) {', '.join(map(str, conflicts))} on this line"
+        )
+
+async def _commit_schedule(db: AsyncSession, line_id: int):
+    """Commit, mapping a violation of the PostgreSQL exclusion constraint to 409."""
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        # Another process booked the line; reload its windows on next use
+        schedule_index.forget(line_id)
+        raise HTTPException(status_code=409, detail="Schedule overlaps another schedule on this line")
+
+async def _close_run(db: AsyncSession, run_id: int, stop: datetime, reconcile: bool = False):
+    try:
+        run, metrics = await db.run_sync(run_metrics_engine.close_run, run_id, stop, reconcile)
+    except LookupError:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Run not found")
+    except RunClosedError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Run is already closed")
+    if run.run_start_datetime and stop < run.run_start_datetime:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Run cannot stop before it starts")
+    await db.commit()
+    open_run_index.closed(run_id)
+    return run, metrics
+
 # Schedule Routes
 @router.post("/schedule", response_model=ScheduleOut, status_code=status.HTTP_201_CREATED)
-def create_schedule(schedule_in: ScheduleCreate, db: Session = Depends(get_db)):
+async def create_schedule(schedule_in: ScheduleCreate, db: AsyncSession = Depends(get_async_db)):
     """
-    Create a new schedule.
+    Create a new schedule; its window must not overlap the line's other schedules.
     """
     # Validate line exists
-    line = db.query(Line).filter(Line.id == schedule_in.line_id).first()
+    line = await db.get(Line, schedule_in.line_id)
     if not line:
         raise HTTPException(status_code=404, detail="Production line not found")
+    if schedule_in.schedule_finish_datetime <= schedule_in.schedule_start_datetime:
+        raise HTTPException(status_code=400, detail="Schedule must finish after it starts")
 
-    new_schedule = Schedule(
-        line_id=schedule_in.line_id,
-        schedule_type=schedule_in.schedule_type,
-        schedule_start_datetime=schedule_in.schedule_start_datetime,
-        schedule_finish_datetime=schedule_in.schedule_finish_datetime,
-        note=schedule_in.note,
-        timestamp=schedule_in.schedule_start_datetime
-    )
-    db.add(new_schedule)
-    db.commit()
-    db.refresh(new_schedule)
+    async with schedule_index.lock(schedule_in.line_id):
+        await _reject_overlaps(db, schedule_in.line_id, schedule_in.schedule_start_datetime,
+                               schedule_in.schedule_finish_datetime)
+        new_schedule = Schedule(
+            line_id=schedule_in.line_id,
+            schedule_type=schedule_in.schedule_type,
+            schedule_start_datetime=schedule_in.schedule_start_datetime,
+            schedule_finish_datetime=schedule_in.schedule_finish_datetime,
+            note=schedule_in.note,
+            timestamp=schedule_in.schedule_start_datetime
+        )
+        db.add(new_schedule)
+        await _commit_schedule(db, new_schedule.line_id)
+        schedule_index.add(new_schedule.line_id, new_schedule.id,
+                           new_schedule.schedule_start_datetime, new_schedule.schedule_finish_datetime)
+    await db.refresh(new_schedule)
     return new_schedule
 
+@router.put("/schedule/{schedule_id}", response_model=ScheduleOut)
+async def update_schedule(schedule_id: int, schedule_upd: ScheduleUpdate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Update an existing schedule; a new window must not overlap the line's other schedules.
+    """
+    schedule = await db.get(Schedule, schedule_id)
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    changes = schedule_upd.dict(exclude_unset=True)
+    cleared = [key for key in ("schedule_type", "schedule_start_datetime", "schedule_finish_datetime")
+               if key in changes and changes[key] is None]
+    if cleared:
+        raise HTTPException(status_code=400, detail=f"{', '.join(cleared)} cannot be null")
+    start = changes.get("schedule_start_datetime", schedule.schedule_start_datetime)
+    finish = changes.get("schedule_finish_datetime", schedule.schedule_finish_datetime)
+    if start is None or finish is None:
+        raise HTTPException(status_code=400, detail="Schedule needs a start and a finish")
+    if finish <= start:
+        raise HTTPException(status_code=400, detail="Schedule must finish after it starts")
+
+    async with schedule_index.lock(schedule.line_id):
+        await _reject_overlaps(db, schedule.line_id, start, finish, exclude_id=schedule.id)
+        for key, value in changes.items():
+            setattr(schedule, key, value)
+        await _commit_schedule(db, schedule.line_id)
+        schedule_index.remove(schedule.line_id, schedule.id)
+        schedule_index.add(schedule.line_id, schedule.id, start, finish)
+    await db.refresh(schedule)
+    return schedule
+
+@router.post("/schedule/auto", response_model=AutoScheduleOut)
+async def auto_schedule_work_orders(
+    request_in: AutoScheduleRequest,
+    dry_run: bool = Query(False, description="Only compute the plan"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Assign unscheduled work orders to eligible lines with the finite-capacity list
+    scheduler and write the plan as Schedule rows in one batch.
+
+    The plan is drafted first to learn which lines it books, then drawn up again and
+    written while holding those lines' schedule locks (taken in line order), so it cannot
+    interleave with schedules created or moved on the same lines meanwhile.
+    """
+    start = request_in.start or datetime.utcnow()
+    result = await db.run_sync(
+        auto_schedule, start, request_in.objective, request_in.statuses,
+        request_in.work_order_ids, request_in.line_ids, True
+    )
+    if dry_run or not result["assignments"]:
+        return dict(result, dry_run=dry_run)
+
+    line_ids = sorted({assignment["line_id"] for assignment in result["assignments"]})
+    async with AsyncExitStack() as locks:
+        for line_id in line_ids:
+            await locks.enter_async_context(schedule_index.lock(line_id))
+        # Orders and windows may have changed while waiting; plan again, on the locked lines only
+        await db.rollback()
+        result = await db.run_sync(
+            auto_schedule, start, request_in.objective, request_in.statuses,
+            request_in.work_order_ids, line_ids, False
+        )
+        if result["assignments"]:
+            try:
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+                raise HTTPException(status_code=409, detail="Lines were booked while planning, retry")
+            finally:
+                # Lines that received schedules reload their windows on next use
+                for line_id in line_ids:
+                    schedule_index.forget(line_id)
+    return result
+
+@router.get("/line/{line_id}/free-slots", response_model=FreeSlotsOut)
+async def get_line_free_slots(
+    line_id: int,
+    start: datetime,
+    end: datetime,
+    min_minutes: float = Query(0.0, ge=0, description="Only gaps at least this long"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Unscheduled gaps of a line inside [start, end), from the in-memory schedule index.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Window must end after it starts")
+    if not await db.get(Line, line_id):
+        raise HTTPException(status_code=404, detail="Production line not found")
+    slots = await db.run_sync(schedule_index.free_slots, line_id, start, end, min_minutes * 60.0)
+    return FreeSlotsOut(line_id=line_id, slots=[
+        {"start": slot_start, "end": slot_end, "minutes": (slot_end - slot_start).total_seconds() / 60.0}
+        for slot_start, slot_end in slots
+    ])
+
 @router.get("/schedule", response_model=List[ScheduleOut])
-def get_all_schedules(db: Session = Depends(get_db)):
+async def get_all_schedules(
+    response: Response,
+    line_id: Optional[int] = None,
+    work_order_id: Optional[int] = None,
+    start: Optional[datetime] = Query(None, description="Only schedules starting at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only schedules starting before this time"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Retrieve all schedules.
+    Retrieve schedules, one keyset page at a time, filtered by line, work order and time range.
     """
-    return db.query(Schedule).all()
+    statement = select(Schedule)
+    if line_id is not None:
+        statement = statement.where(Schedule.line_id == line_id)
+    if work_order_id is not None:
+        statement = statement.where(Schedule.work_order_id == work_order_id)
+    if start is not None:
+        statement = statement.where(Schedule.schedule_start_datetime >= start)
+    if end is not None:
+        statement = statement.where(Schedule.schedule_start_datetime < end)
+    return await paginate_async(db, statement, Schedule.id, page, response)
 
 # Run Routes
 @router.post("/run", response_model=RunOut, status_code=status.HTTP_201_CREATED)
-def create_run(run_in: RunCreate, db: Session = Depends(get_db)):
+async def create_run(run_in: RunCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new production run.
     """
     # Validate schedule exists
-    schedule = db.query(Schedule).filter(Schedule.id == run_in.schedule_id).first()
+    schedule = await db.get(Schedule, run_in.schedule_id)
     if not schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
 
@@ -64,31 +227,91 @@ def create_run(run_in: RunCreate, db: Session = Depends(get_db)):
         estimated_finish_time=run_in.estimated_finish_time
     )
     db.add(new_run)
-    db.commit()
-    db.refresh(new_run)
+    await db.flush()
+    # Start every run with a zeroed metrics row so updates are single-row lookups
+    db.add(RunMetrics(
+        run_id=new_run.id,
+        good_count=0, waste_count=0, total_count=0,
+        availability=0.0, performance=0.0, quality=0.0, oee=0.0,
+        unplanned_downtime=0.0, planned_downtime=0.0, total_time=0.0
+    ))
+    await db.commit()
+    await db.refresh(new_run)
+    if not new_run.closed:
+        open_run_index.opened(schedule.line_id, new_run.id)
     return new_run
 
 @router.get("/run", response_model=List[RunOut])
-def get_all_runs(db: Session = Depends(get_db)):
+async def get_all_runs(
+    response: Response,
+    schedule_id: Optional[int] = None,
+    line_id: Optional[int] = None,
+    closed: Optional[bool] = None,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Retrieve all production runs.
+    Retrieve production runs, one keyset page at a time, filtered by schedule, line and state.
     """
-    return db.query(Run).all()
+    statement = select(Run)
+    if schedule_id is not None:
+        statement = statement.where(Run.schedule_id == schedule_id)
+    if line_id is not None:
+        statement = statement.join(Schedule, Schedule.id == Run.schedule_id).where(Schedule.line_id == line_id)
+    if closed is not None:
+        statement = statement.where(Run.closed == closed)
+    return await paginate_async(db, statement, Run.id, page, response)
+
+@router.get("/run/{run_id}/metrics", response_model=RunMetricsOut)
+async def get_run_metrics(run_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Retrieve the live metrics of a production run.
+    """
+    metrics = (await db.execute(
+        select(RunMetrics).where(RunMetrics.run_id == run_id)
+    )).scalars().first()
+    if not metrics:
+        raise HTTPException(status_code=404, detail="Run metrics not found")
+    return metrics
 
 @router.put("/run/{run_id}", response_model=RunOut)
-def update_run(run_id: int, run_in: RunUpdate, db: Session = Depends(get_db)):
+async def update_run(run_id: int, run_in: RunUpdate, db: AsyncSession = Depends(get_async_db)):
     """
-    Update an existing production run.
+    Update an existing production run. Setting closed=true closes it as POST /run/{run_id}/close does.
     """
-    run = db.query(Run).filter(Run.id == run_id).first()
+    run = await db.get(Run, run_id)
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
+    changes = run_in.dict(exclude_unset=True)
+    closing = changes.pop("closed", None)
+    if closing is False and run.closed:
+        raise HTTPException(status_code=400, detail="A closed run cannot be reopened")
+    if run.closed and (closing or "run_stop_datetime" in changes):
+        # Its RunMetrics were finalised against the stop time it was closed with
+        raise HTTPException(status_code=409, detail="Run is already closed")
 
-    if run_in.finish_datetime:
-        run.run_stop_datetime = run_in.finish_datetime
-    if run_in.status:
-        run.closed = (run_in.status.lower() == "completed")
-
-    db.commit()
-    db.refresh(run)
+    if closing and not run.closed:
+        stop = changes.pop("run_stop_datetime", None) or datetime.utcnow()
+        for key, value in changes.items():
+            setattr(run, key, value)
+        run, _ = await _close_run(db, run_id, stop)
+    else:
+        for key, value in changes.items():
+            setattr(run, key, value)
+        await db.commit()
+    await db.refresh(run)
     return run
+
+@router.post("/run/{run_id}/close", response_model=RunCloseOut)
+async def close_run(
+    run_id: int,
+    close_in: RunClose,
+    reconcile: bool = Query(False, description="Recompute counts and downtime from the raw rows before closing"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Close a run: set its stop time and finalise RunMetrics under row locks, so counts
+    arriving afterwards are rejected. Finalising uses the running totals (constant time).
+    """
+    run, metrics = await _close_run(db, run_id, close_in.run_stop_datetime or datetime.utcnow(), reconcile)
+    return RunCloseOut(run=RunOut.from_orm(run), metrics=RunMetricsOut.from_orm(metrics))
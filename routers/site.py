@@ -1,10 +1,13 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from datetime import datetime
 from schemas.enterprise import SiteCreate, SiteUpdate, SiteOut
 from database.models.enterprise import Site, Enterprise
 from utils.dependencies import get_db
+from utils.pagination import PageParams, paginate
+from utils.hierarchy_cache import hierarchy_tree_cache
+from utils.hierarchy_closure import add_node, move_node, remove_node
 from utils.logging_utils import (
     log_endpoint_access,
     log_entity_not_found,
@@ -25,7 +28,7 @@ def create_site(site_in: SiteCreate, db: Session = Depends(get_db)):
     # Validate parent enterprise exists
     enterprise = db.query(Enterprise).filter(Enterprise.id == site_in.parent_id).first()
     if not enterprise:
-        log_entity_not_found("Enterprise", f"id={site_in.parent_id}")
+        log_entity_not_found("Enterprise", "id=%s", site_in.parent_id)
         raise HTTPException(status_code=404, detail="Parent enterprise not found")
 
     # Check for duplicate site name within the enterprise
@@ -34,7 +37,7 @@ def create_site(site_in: SiteCreate, db: Session = Depends(get_db)):
         Site.enterprise_id == site_in.parent_id
     ).first()
     if existing:
-        log_duplicate_entity("Site", f"name='{site_in.name}' in enterprise_id={site_in.parent_id}")
+        log_duplicate_entity("Site", "name='%s' in enterprise_id=%s", site_in.name, site_in.parent_id)
         raise HTTPException(status_code=400, detail="Site with this name already exists in the enterprise")
 
     new_site = Site(
@@ -44,17 +47,28 @@ def create_site(site_in: SiteCreate, db: Session = Depends(get_db)):
         timestamp=datetime.utcnow()
     )
     db.add(new_site)
+    db.flush()
+    add_node(db, "site", new_site.id, new_site.enterprise_id)
     db.commit()
     db.refresh(new_site)
-    log_endpoint_access("Site", "created", f"name='{new_site.name}' in enterprise='{enterprise.name}'")
+    hierarchy_tree_cache.invalidate(new_site.enterprise_id)
+    log_endpoint_access("Site", "created", "name='%s' in enterprise='%s'", new_site.name, enterprise.name)
     return new_site
 
 @router.get("/", response_model=List[SiteOut])
-def get_all_sites(db: Session = Depends(get_db)):
+def get_all_sites(
+    response: Response,
+    enterprise_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db)
+):
     """
-    Retrieve all sites.
+    Retrieve sites, one keyset page at a time, optionally filtered by parent.
     """
-    sites = db.query(Site).all()
+    query = db.query(Site)
+    if enterprise_id is not None:
+        query = query.filter(Site.enterprise_id == enterprise_id)
+    sites = paginate(query, Site.id, page, response)
     log_query_result("Site", len(sites))
     return sites
 
@@ -65,9 +79,9 @@ def get_site(site_id: int, db: Session = Depends(get_db)):
     """
     site = db.query(Site).filter(Site.id == site_id).first()
     if not site:
-        log_entity_not_found("Site", f"id={site_id}")
+        log_entity_not_found("Site", "id=%s", site_id)
         raise HTTPException(status_code=404, detail="Site not found")
-    log_endpoint_access("Site", "retrieved", f"name='{site.name}'")
+    log_endpoint_access("Site", "retrieved", "name='%s'", site.name)
     return site
 
 @router.put("/{site_id}", response_model=SiteOut)
@@ -77,27 +91,31 @@ def update_site(site_id: int, site_upd: SiteUpdate, db: Session = Depends(get_db
     """
     site = db.query(Site).filter(Site.id == site_id).first()
     if not site:
-        log_entity_not_found("Site", f"id={site_id}")
+        log_entity_not_found("Site", "id=%s", site_id)
         raise HTTPException(status_code=404, detail="Site not found")
 
     # If updating parent_id, validate new parent exists
     if site_upd.parent_id is not None:
         enterprise = db.query(Enterprise).filter(Enterprise.id == site_upd.parent_id).first()
         if not enterprise:
-            log_entity_not_found("Enterprise", f"id={site_upd.parent_id}")
+            log_entity_not_found("Enterprise", "id=%s", site_upd.parent_id)
             raise HTTPException(status_code=404, detail="New parent enterprise not found")
-        site_upd.enterprise_id = site_upd.parent_id
 
     update_data = site_upd.dict(exclude_unset=True)
     if 'parent_id' in update_data:
         update_data['enterprise_id'] = update_data.pop('parent_id')
 
+    moved = 'enterprise_id' in update_data and update_data['enterprise_id'] != site.enterprise_id
     for field, value in update_data.items():
         setattr(site, field, value)
+    if moved:
+        move_node(db, "site", site.id, site_upd.parent_id)
     
     db.commit()
     db.refresh(site)
-    log_endpoint_access("Site", "updated", f"name='{site.name}'")
+    # A site moved to another enterprise changes two trees
+    hierarchy_tree_cache.invalidate(None if moved else site.enterprise_id)
+    log_endpoint_access("Site", "updated", "name='%s'", site.name)
     return site
 
 @router.delete("/{site_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -107,11 +125,13 @@ def delete_site(site_id: int, db: Session = Depends(get_db)):
     """
     site = db.query(Site).filter(Site.id == site_id).first()
     if not site:
-        log_entity_not_found("Site", f"id={site_id}")
+        log_entity_not_found("Site", "id=%s", site_id)
         raise HTTPException(status_code=404, detail="Site not found")
     
-    name = site.name  # Store name before deletion
+    name, enterprise_id = site.name, site.enterprise_id  # Store before deletion
+    remove_node(db, "site", site.id)
     db.delete(site)
     db.commit()
-    log_endpoint_access("Site", "deleted", f"name='{name}'")
+    hierarchy_tree_cache.invalidate(enterprise_id)
+    log_endpoint_access("Site", "deleted", "name='%s'", name)
     return None
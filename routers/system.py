@@ -0,0 +1,33 @@
+"""
+Router exposing operational statistics of the MES service.
+"""
+
+from typing import List
+from fastapi import APIRouter
+
+from schemas.system import LoggingStatsOut, PoolStatsOut
+from database.pool import pool_status
+from utils.logging_config import logging_stats
+
+router = APIRouter(
+    prefix="/system",
+    tags=["System"]
+)
+
+@router.get("/db-pool", response_model=List[PoolStatsOut])
+def get_db_pool_stats():
+    """
+    Occupancy and checkout wait statistics of the sync and async connection pools.
+    """
+    from database.engine import async_engine, engine
+    return [
+        pool_status("sync", engine.pool),
+        pool_status("async", async_engine.sync_engine.pool),
+    ]
+
+@router.get("/logging", response_model=LoggingStatsOut)
+def get_logging_stats():
+    """
+    Depth of the log queue and the number of records dropped because it was full.
+    """
+    return logging_stats()
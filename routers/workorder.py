@@ -1,10 +1,11 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from schemas.work_order import WorkOrderCreate, WorkOrderUpdate, WorkOrderOut
 from database.models.workorder import WorkOrder
 from database.models.enterprise import Line
 from utils.dependencies import get_db
+from utils.pagination import PageParams, paginate
 
 router = APIRouter(
     prefix="/workorder",
@@ -28,11 +29,22 @@ def create_work_order(order_in: WorkOrderCreate, db: Session = Depends(get_db)):
     return new_order
 
 @router.get("/", response_model=List[WorkOrderOut])
-def get_all_work_orders(db: Session = Depends(get_db)):
+def get_all_work_orders(
+    response: Response,
+    line_id: Optional[int] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db)
+):
     """
-    Retrieve all work orders.
+    Retrieve work orders, one keyset page at a time, filtered by line and status.
     """
-    return db.query(WorkOrder).all()
+    query = db.query(WorkOrder)
+    if line_id is not None:
+        query = query.filter(WorkOrder.line_id == line_id)
+    if status_filter is not None:
+        query = query.filter(WorkOrder.status == status_filter)
+    return paginate(query, WorkOrder.id, page, response)
 
 @router.put("/{work_order_id}", response_model=WorkOrderOut)
 def update_work_order(work_order_id: int, order_in: WorkOrderUpdate, db: Session = Depends(get_db)):
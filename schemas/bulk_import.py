@@ -0,0 +1,43 @@
+"""
+Plant definition schemas for the bulk import endpoint.
+"""
+
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+class CellImport(BaseModel):
+    name: str = Field(..., max_length=100, description="Name of the cell")
+    disabled: bool = Field(default=False, description="Indicates if the cell is disabled")
+
+class LineImport(CellImport):
+    cells: List[CellImport] = Field(default_factory=list, description="Cells of the line")
+
+class AreaImport(CellImport):
+    lines: List[LineImport] = Field(default_factory=list, description="Production lines of the area")
+
+class SiteImport(CellImport):
+    areas: List[AreaImport] = Field(default_factory=list, description="Areas of the site")
+
+class CountTagImport(BaseModel):
+    tag_path: str = Field(..., max_length=255, description="Tag path for the count signal")
+    count_type: str = Field(..., max_length=100, description="Name of the parent CountType (existing or imported)")
+    line: Optional[str] = Field(None, description="Site/Area/Line path of the tag's line (existing or imported); counts posted without a run_id go to its open run")
+
+class StateReasonImport(BaseModel):
+    reason_name: str = Field(..., max_length=100, description="Name of the downtime reason")
+    reason_code: str = Field(..., max_length=50, description="Unique code for the reason")
+    record_downtime: bool = Field(default=False, description="Indicates if downtime should be recorded")
+    planned_downtime: bool = Field(default=False, description="Indicates if this is planned downtime")
+    operator_selectable: bool = Field(default=True, description="Indicates if the operator can select this reason")
+    parent_code: Optional[str] = Field(None, max_length=50, description="Code of the parent reason (existing or imported)")
+
+class PlantImport(BaseModel):
+    sites: List[SiteImport] = Field(default_factory=list, description="Site -> Area -> Line -> Cell tree; existing nodes are matched by name")
+    count_types: List[str] = Field(default_factory=list, description="CountTypes to create when they do not exist yet")
+    count_tags: List[CountTagImport] = Field(default_factory=list, description="New CountTags")
+    state_reasons: List[StateReasonImport] = Field(default_factory=list, description="New StateReasons")
+
+class PlantImportResult(BaseModel):
+    dry_run: bool = Field(..., description="True when the plant was only validated")
+    created: Dict[str, int] = Field(..., description="Rows inserted per kind")
+    existing: Dict[str, int] = Field(..., description="Referenced rows that already existed per kind")
@@ -1,14 +1,22 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, root_validator
 from datetime import datetime
+from typing import List, Optional
 
 class CountHistoryBase(BaseModel):
     count: int = Field(..., gt=0, description="Count value")
     timestamp: datetime = Field(..., description="Timestamp of the count event")
 
 class CountHistoryCreate(CountHistoryBase):
-    tag_id: int = Field(..., description="ID of the associated CountTag")
-    count_type_id: int = Field(..., description="ID of the associated CountType")
-    run_id: int = Field(..., description="ID of the associated production run")
+    tag_id: Optional[int] = Field(None, description="ID of the associated CountTag")
+    tag_path: Optional[str] = Field(None, max_length=255, description="Path of the associated CountTag, instead of tag_id")
+    count_type_id: Optional[int] = Field(None, description="ID of the associated CountType (defaults to the tag's parent)")
+    run_id: Optional[int] = Field(None, description="ID of the associated production run (defaults to the open run of the tag's line)")
+
+    @root_validator(skip_on_failure=True)
+    def check_tag(cls, values):
+        if values.get("tag_id") is None and not values.get("tag_path"):
+            raise ValueError("Either tag_id or tag_path is required")
+        return values
 
 class CountHistoryOut(CountHistoryBase):
     id: int = Field(..., description="ID of the CountHistory")
@@ -18,3 +26,13 @@ class CountHistoryOut(CountHistoryBase):
 
     class Config:
         orm_mode = True
+
+class CountHistoryBatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the submitted batch")
+    accepted: bool = Field(..., description="Whether the item was stored")
+    error: Optional[str] = Field(None, description="Reason the item was rejected")
+
+class CountHistoryBatchResult(BaseModel):
+    accepted: int = Field(..., description="Number of items stored")
+    rejected: int = Field(..., description="Number of items rejected")
+    results: List[CountHistoryBatchItemResult] = Field(..., description="Per-item outcome, in submission order")
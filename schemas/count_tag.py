@@ -1,14 +1,22 @@
 from pydantic import BaseModel, Field
+from typing import Optional
 
 class CountTagBase(BaseModel):
     tag_path: str = Field(..., max_length=255, description="Tag path for the count signal")
 
 class CountTagCreate(CountTagBase):
     parent_id: int = Field(..., description="ID of the parent CountType")
+    line_id: Optional[int] = Field(None, description="ID of the line the signal belongs to")
+
+class CountTagUpdate(BaseModel):
+    tag_path: Optional[str] = Field(None, max_length=255)
+    parent_id: Optional[int] = Field(None, description="ID of the parent CountType")
+    line_id: Optional[int] = Field(None, description="ID of the line the signal belongs to")
 
 class CountTagOut(CountTagBase):
     id: int = Field(..., description="ID of the CountTag")
     parent_id: int = Field(..., description="ID of the parent CountType")
+    line_id: Optional[int] = Field(None, description="ID of the line the signal belongs to")
 
     class Config:
         orm_mode = True
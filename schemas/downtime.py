@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 # StateReason Schema
 class StateReasonBase(BaseModel):
@@ -12,7 +12,11 @@ class StateReasonBase(BaseModel):
     sub_reason_of: Optional[int] = Field(None, description="ID of the parent reason, if applicable")
 
 class StateReasonCreate(StateReasonBase):
-    pass
+    # parent_id is accepted as well on input; responses keep the sub_reason_of key
+    sub_reason_of: Optional[int] = Field(None, description="ID of the parent reason, if applicable", alias="parent_id")
+
+    class Config:
+        allow_population_by_field_name = True
 
 class StateReasonUpdate(BaseModel):
     reason_name: Optional[str] = Field(None, max_length=100)
@@ -20,7 +24,10 @@ class StateReasonUpdate(BaseModel):
     record_downtime: Optional[bool] = Field(None)
     planned_downtime: Optional[bool] = Field(None)
     operator_selectable: Optional[bool] = Field(None)
-    sub_reason_of: Optional[int] = Field(None)
+    sub_reason_of: Optional[int] = Field(None, alias="parent_id")
+
+    class Config:
+        allow_population_by_field_name = True
 
 class StateReasonOut(StateReasonBase):
     id: int = Field(..., description="ID of the StateReason")
@@ -28,13 +35,18 @@ class StateReasonOut(StateReasonBase):
     class Config:
         orm_mode = True
 
+class StateReasonNode(StateReasonOut):
+    effective_planned_downtime: bool = Field(..., description="Planned when the reason or any ancestor is planned")
+    effective_record_downtime: bool = Field(..., description="Recorded when the reason or any ancestor records downtime")
+    children: List["StateReasonNode"] = Field(default_factory=list, description="Sub-reasons")
+
+StateReasonNode.update_forward_refs()
+
 
 # StateHistory Schema
 class StateHistoryBase(BaseModel):
     start_datetime: datetime = Field(..., description="Start time of the state")
-    end_datetime: datetime = Field(..., description="End time of the state")
-    state_name: str = Field(..., max_length=100, description="Name of the state")
-    reason_code: str = Field(..., max_length=50, description="Reason code for the state")
+    end_datetime: Optional[datetime] = Field(None, description="End time of the state (null while open)")
 
 class StateHistoryCreate(StateHistoryBase):
     state_reason_id: int = Field(..., description="ID of the associated StateReason")
@@ -44,8 +56,58 @@ class StateHistoryCreate(StateHistoryBase):
 class StateHistoryOut(StateHistoryBase):
     id: int = Field(..., description="ID of the StateHistory")
     state_reason_id: int = Field(..., description="ID of the associated StateReason")
-    line_id: int = Field(..., description="ID of the production line")
-    run_id: int = Field(..., description="ID of the associated production run")
+    reason_name: str = Field(..., max_length=255, description="Name of the reason, copied from StateReason")
+    reason_code: str = Field(..., max_length=50, description="Reason code, copied from StateReason")
+    line_id: Optional[int] = Field(None, description="ID of the production line")
+    run_id: Optional[int] = Field(None, description="ID of the associated production run")
 
     class Config:
         orm_mode = True
+
+
+# Line state changes
+class LineStateChange(BaseModel):
+    state_reason_id: int = Field(..., description="ID of the StateReason the line is entering")
+    run_id: Optional[int] = Field(None, description="ID of the associated production run")
+    timestamp: Optional[datetime] = Field(None, description="Time of the change (defaults to now)")
+
+class LineStateOut(BaseModel):
+    line_id: int = Field(..., description="ID of the production line")
+    state_history_id: int = Field(..., description="ID of the StateHistory now open for the line")
+    state_reason_id: int = Field(..., description="ID of the current StateReason")
+    run_id: Optional[int] = Field(None, description="ID of the associated production run")
+    start_datetime: datetime = Field(..., description="Start time of the current state")
+    closed_state_history_id: Optional[int] = Field(None, description="ID of the StateHistory closed by this change")
+
+# Downtime analytics
+class DowntimeParetoItem(BaseModel):
+    state_reason_id: int = Field(..., description="ID of the StateReason")
+    reason_code: str = Field(..., description="Reason code")
+    reason_name: str = Field(..., description="Reason name")
+    planned: bool = Field(..., description="Planned downtime, inherited from ancestor reasons")
+    minutes: float = Field(..., description="Downtime minutes inside the window")
+    events: int = Field(..., description="Number of StateHistory events")
+    share: float = Field(..., description="Share of all downtime minutes (0-1)")
+    cumulative_share: float = Field(..., description="Cumulative share up to and including this reason (0-1)")
+
+class LineDowntimeStats(BaseModel):
+    line_id: int = Field(..., description="ID of the production line")
+    planned_minutes: float = Field(..., description="Planned downtime minutes")
+    unplanned_minutes: float = Field(..., description="Unplanned downtime minutes")
+    events: int = Field(..., description="Number of downtime events")
+    failures: int = Field(..., description="Number of unplanned downtime events")
+    mtbf_minutes: Optional[float] = Field(None, description="Mean time between failures")
+    mttr_minutes: Optional[float] = Field(None, description="Mean time to repair")
+
+class DowntimeAnalytics(BaseModel):
+    start: datetime = Field(..., description="Window start")
+    end: datetime = Field(..., description="Window end")
+    window_minutes: float = Field(..., description="Window length per line")
+    planned_minutes: float = Field(..., description="Planned downtime minutes over all lines")
+    unplanned_minutes: float = Field(..., description="Unplanned downtime minutes over all lines")
+    events: int = Field(..., description="Number of downtime events")
+    failures: int = Field(..., description="Number of unplanned downtime events")
+    mtbf_minutes: Optional[float] = Field(None, description="Mean time between failures over all lines")
+    mttr_minutes: Optional[float] = Field(None, description="Mean time to repair over all lines")
+    pareto: List[DowntimeParetoItem] = Field(..., description="Reasons by downtime minutes, largest first")
+    lines: List[LineDowntimeStats] = Field(..., description="Statistics per line in scope")
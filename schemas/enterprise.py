@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 # Enterprise Schema
 class EnterpriseBase(BaseModel):
@@ -122,3 +122,22 @@ class CellOut(CellBase):
     class Config:
         orm_mode = True
         allow_population_by_field_name = True
+
+
+# Hierarchy tree schemas
+class HierarchyNode(BaseModel):
+    id: int = Field(..., description="ID of the node")
+    name: str = Field(..., description="Name of the node")
+    disabled: bool = Field(..., description="Indicates if the node is disabled")
+
+class LineNode(HierarchyNode):
+    cells: List[HierarchyNode] = Field(default_factory=list, description="Cells of the line")
+
+class AreaNode(HierarchyNode):
+    lines: List[LineNode] = Field(default_factory=list, description="Production lines of the area")
+
+class SiteNode(HierarchyNode):
+    areas: List[AreaNode] = Field(default_factory=list, description="Areas of the site")
+
+class EnterpriseTree(HierarchyNode):
+    sites: List[SiteNode] = Field(default_factory=list, description="Sites of the enterprise")
@@ -1,4 +1,6 @@
 from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
 
 class OEEBase(BaseModel):
     availability: float = Field(..., ge=0, le=1, description="Availability metric")
@@ -15,3 +17,50 @@ class OEEOut(OEEBase):
 
     class Config:
         orm_mode = True
+
+
+class CountCacheStats(BaseModel):
+    hits: int = Field(..., description="Lookups served from the cache")
+    misses: int = Field(..., description="Lookups that required a database query")
+    hit_ratio: float = Field(..., description="hits / (hits + misses)")
+    tag_entries: int = Field(..., description="Number of cached CountTags")
+    tag_path_entries: int = Field(..., description="Number of cached CountTag path lookups")
+    type_entries: int = Field(..., description="Number of cached CountTypes")
+    ttl_seconds: float = Field(..., description="Lifetime of a cache entry")
+
+
+class OEEWindowBucket(BaseModel):
+    bucket_start: datetime = Field(..., description="Start of the bucket (inclusive)")
+    bucket_end: datetime = Field(..., description="End of the bucket (exclusive)")
+    good_count: float = Field(..., description="Good units counted in the bucket")
+    waste_count: float = Field(..., description="Rejected units counted in the bucket")
+    total_count: float = Field(..., description="All units counted in the bucket")
+    planned_downtime: float = Field(..., description="Planned downtime in minutes")
+    unplanned_downtime: float = Field(..., description="Unplanned downtime in minutes")
+    availability: float = Field(..., description="Availability metric")
+    performance: float = Field(..., description="Performance metric")
+    quality: float = Field(..., description="Quality metric")
+    oee: float = Field(..., description="Calculated OEE value")
+
+class OEEWindowOut(BaseModel):
+    line_id: int = Field(..., description="ID of the production line")
+    start: datetime = Field(..., description="Requested window start")
+    end: datetime = Field(..., description="Requested window end")
+    bucket: str = Field(..., description="Bucket size (hour, shift or day)")
+    ideal_rate: Optional[float] = Field(None, description="Ideal rate in units per minute used for performance")
+    buckets: List[OEEWindowBucket] = Field(..., description="Per-bucket OEE, in time order")
+
+
+class CountSeriesPoint(BaseModel):
+    bucket_start: datetime = Field(..., description="Start of the bucket")
+    count_type_id: int = Field(..., description="ID of the CountType")
+    count: int = Field(..., description="Sum of counts in the bucket")
+
+class CountSeriesOut(BaseModel):
+    line_id: int = Field(..., description="ID of the production line")
+    resolution: str = Field(..., description="Requested bucket size")
+    source: Optional[str] = Field(None, description="Rollup used to answer the query; null when read from raw rows")
+    points: List[CountSeriesPoint] = Field(..., description="Counts per bucket and type, in time order")
+
+class CountRollupRefreshOut(BaseModel):
+    folded: int = Field(..., description="Raw CountHistory rows folded into the rollups")
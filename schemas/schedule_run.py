@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 # Schedule Schema
 class ScheduleBase(BaseModel):
@@ -25,6 +25,39 @@ class ScheduleOut(ScheduleBase):
     class Config:
         orm_mode = True
 
+class FreeSlot(BaseModel):
+    start: datetime = Field(..., description="Start of the unscheduled gap")
+    end: datetime = Field(..., description="End of the unscheduled gap")
+    minutes: float = Field(..., description="Length of the gap in minutes")
+
+class FreeSlotsOut(BaseModel):
+    line_id: int = Field(..., description="ID of the production line")
+    slots: List[FreeSlot] = Field(..., description="Unscheduled gaps in time order")
+
+class AutoScheduleRequest(BaseModel):
+    objective: str = Field("edd", regex="^(edd|spt|fifo)$", description="Queue order: earliest due date, shortest processing time or first in")
+    start: Optional[datetime] = Field(None, description="Horizon start (defaults to now)")
+    statuses: List[str] = Field(default_factory=lambda: ["Planned"], description="Work order statuses to schedule")
+    work_order_ids: Optional[List[int]] = Field(None, description="Only schedule these work orders")
+    line_ids: Optional[List[int]] = Field(None, description="Only use these lines")
+
+class ScheduledOrder(BaseModel):
+    work_order_id: int = Field(..., description="ID of the work order")
+    line_id: int = Field(..., description="Line the order was assigned to")
+    start: datetime = Field(..., description="Scheduled start time")
+    finish: datetime = Field(..., description="Scheduled finish time")
+    due: datetime = Field(..., description="Planned end of the work order")
+
+class AutoScheduleOut(BaseModel):
+    objective: str = Field(..., description="Objective used")
+    dry_run: bool = Field(..., description="True when the plan was not written")
+    scheduled: int = Field(..., description="Number of work orders scheduled")
+    late: int = Field(..., description="Number of orders finishing after their planned end")
+    total_tardiness_minutes: float = Field(..., description="Sum of lateness over late orders")
+    makespan_end: Optional[datetime] = Field(None, description="Finish of the last scheduled order")
+    unscheduled: List[int] = Field(..., description="Work orders without an eligible line or with no duration")
+    assignments: List[ScheduledOrder] = Field(..., description="Schedule per work order")
+
 
 # Run Schema
 class RunBase(BaseModel):
@@ -32,7 +65,7 @@ class RunBase(BaseModel):
     run_start_datetime: datetime = Field(..., description="Actual start time of the run")
     run_stop_datetime: Optional[datetime] = Field(None, description="Actual finish time of the run")
     closed: bool = Field(default=False, description="Whether the run is closed")
-    estimated_finish_time: Optional[datetime] = Field(None, description="Estimated finish time of the run")
+    estimated_finish_time: Optional[datetime] = Field(None, description="Estimated finish time of the run, kept current from its recent production rate")
 
 class RunCreate(RunBase):
     pass
@@ -40,10 +73,34 @@ class RunCreate(RunBase):
 class RunUpdate(BaseModel):
     run_stop_datetime: Optional[datetime] = Field(None)
     closed: Optional[bool] = Field(None)
-    estimated_finish_time: Optional[datetime] = Field(None)
 
 class RunOut(RunBase):
     id: int = Field(..., description="ID of the run")
 
     class Config:
         orm_mode = True
+
+class RunClose(BaseModel):
+    run_stop_datetime: Optional[datetime] = Field(None, description="Actual finish time of the run (defaults to now)")
+
+
+# RunMetrics Schema
+class RunMetricsOut(BaseModel):
+    run_id: int = Field(..., description="ID of the run")
+    good_count: int = Field(..., description="Good units produced")
+    waste_count: int = Field(..., description="Rejected units produced")
+    total_count: int = Field(..., description="All units produced")
+    availability: float = Field(..., description="Availability ratio")
+    performance: float = Field(..., description="Performance ratio")
+    quality: float = Field(..., description="Quality ratio")
+    oee: float = Field(..., description="Availability x Performance x Quality")
+    unplanned_downtime: float = Field(..., description="Unplanned downtime in minutes")
+    planned_downtime: float = Field(..., description="Planned downtime in minutes")
+    total_time: float = Field(..., description="Elapsed run time in minutes")
+
+    class Config:
+        orm_mode = True
+
+class RunCloseOut(BaseModel):
+    run: RunOut = Field(..., description="The closed run")
+    metrics: RunMetricsOut = Field(..., description="Final metrics of the run")
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class PoolStatsOut(BaseModel):
+    name: str = Field(..., description="Engine the pool belongs to (sync or async)")
+    pool_class: str = Field(..., description="Connection pool implementation")
+    size: Optional[int] = Field(None, description="Configured number of persistent connections")
+    checked_in: Optional[int] = Field(None, description="Idle connections in the pool")
+    checked_out: Optional[int] = Field(None, description="Connections currently in use")
+    overflow: Optional[int] = Field(None, description="Connections opened beyond the pool size")
+    max_overflow: Optional[int] = Field(None, description="Upper bound on overflow connections")
+    timeout_seconds: Optional[float] = Field(None, description="Seconds a checkout waits before failing")
+    checkouts: int = Field(0, description="Successful checkouts since startup")
+    timeouts: int = Field(0, description="Checkouts that failed with a pool timeout")
+    wait_seconds_total: float = Field(0.0, description="Total time spent waiting for a connection")
+    wait_seconds_avg: float = Field(0.0, description="Average wait per checkout attempt")
+    wait_seconds_max: float = Field(0.0, description="Longest wait for a connection")
+
+class LoggingStatsOut(BaseModel):
+    queue_size: int = Field(..., description="Records waiting to be written")
+    queue_capacity: int = Field(..., description="Maximum number of buffered records")
+    dropped: int = Field(..., description="Records dropped because the queue was full")
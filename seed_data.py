@@ -6,11 +6,12 @@ Creates realistic sample data for all tables in the correct order to maintain re
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from database.engine import SessionLocal, engine
-from database.models.enterprise import Enterprise, Site, Area, Line, Cell
+from database.models.enterprise import Enterprise, Site, Area, Line, Cell, HierarchyClosure
 from database.models.workorder import WorkOrder, ProductCode, ProductCodeLine
 from database.models.schedule_run import Schedule, Run
 from database.models.oee import CountType, CountTag, CountHistory
 from database.models.downtime import StateHistory, StateReason
+from utils.hierarchy_closure import rebuild_closure
 
 def seed_data():
     db = SessionLocal()
@@ -376,6 +377,10 @@ def seed_data():
             )
         ]
         db.add_all(state_histories)
+
+        # 16. Build the hierarchy closure for the seeded enterprise tree
+        db.flush()
+        rebuild_closure(db)
         
         # Commit all changes
         db.commit()
@@ -405,6 +410,7 @@ def clear_existing_data(db: Session):
     db.query(Area).delete()
     db.query(Site).delete()
     db.query(Enterprise).delete()
+    db.query(HierarchyClosure).delete()
     db.commit()
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+"""
+In-process read-through cache for CountTag and CountType lookups.
+
+Count ingestion validates every event against its tag and type. Both tables
+change rarely, so entries are cached for a TTL and invalidated by the
+count-type / count-tag CRUD handlers. Tags can also be looked up by path, for
+gateways that only send the tag path.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from database.models.oee import CountTag, CountType
+
+class CachedCountTag(NamedTuple):
+    id: int
+    tag_path: str
+    parent_id: Optional[int]
+    line_id: Optional[int]
+
+class CachedCountType(NamedTuple):
+    id: int
+    count_type: str
+
+class CountLookupCache:
+    """
+    TTL cache keyed by id for CountTag and CountType rows.
+    Only plain tuples are stored so entries never hold on to a Session.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._tags: Dict[int, tuple] = {}
+        self._paths: Dict[str, tuple] = {}
+        self._types: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, store: Dict[int, tuple], key: int):
+        entry = store.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def get_tags(self, db: Session, tag_ids: Iterable[int]) -> Dict[int, CachedCountTag]:
+        """
+        Return cached tags for the given ids, loading all misses with one query.
+        Unknown ids are absent from the result.
+        """
+        found = {}
+        missing = set()
+        with self._lock:
+            for tag_id in set(tag_ids):
+                cached = self._lookup(self._tags, tag_id)
+                if cached is None:
+                    missing.add(tag_id)
+                else:
+                    found[tag_id] = cached
+        if missing:
+            for tag in self._load_tags(db, CountTag.id.in_(missing)):
+                found[tag.id] = tag
+        return found
+
+    def get_tags_by_path(self, db: Session, tag_paths: Iterable[str]) -> Dict[str, CachedCountTag]:
+        """
+        Return cached tags for the given paths, loading all misses with one query.
+        Unknown paths are absent from the result.
+        """
+        found = {}
+        missing = set()
+        with self._lock:
+            for tag_path in set(tag_paths):
+                cached = self._lookup(self._paths, tag_path)
+                if cached is None:
+                    missing.add(tag_path)
+                else:
+                    found[tag_path] = cached
+        if missing:
+            for tag in self._load_tags(db, CountTag.tag_path.in_(missing)):
+                found[tag.tag_path] = tag
+        return found
+
+    def _load_tags(self, db: Session, condition) -> List[CachedCountTag]:
+        rows = db.query(CountTag.id, CountTag.tag_path, CountTag.parent_id, CountTag.line_id).filter(condition).all()
+        tags = [CachedCountTag(row.id, row.tag_path, row.parent_id, row.line_id) for row in rows]
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for tag in tags:
+                self._tags[tag.id] = (tag, expires_at)
+                self._paths[tag.tag_path] = (tag, expires_at)
+        return tags
+
+    def get_types(self, db: Session, type_ids: Iterable[int]) -> Dict[int, CachedCountType]:
+        """
+        Return cached count types for the given ids, loading all misses with one query.
+        Unknown ids are absent from the result.
+        """
+        found = {}
+        missing = set()
+        with self._lock:
+            for type_id in set(type_ids):
+                cached = self._lookup(self._types, type_id)
+                if cached is None:
+                    missing.add(type_id)
+                else:
+                    found[type_id] = cached
+        if missing:
+            rows = db.query(CountType.id, CountType.count_type).filter(
+                CountType.id.in_(missing)
+            ).all()
+            expires_at = time.monotonic() + self.ttl_seconds
+            with self._lock:
+                for row in rows:
+                    count_type = CachedCountType(row.id, row.count_type)
+                    self._types[count_type.id] = (count_type, expires_at)
+                    found[count_type.id] = count_type
+        return found
+
+    def get_tag(self, db: Session, tag_id: int) -> Optional[CachedCountTag]:
+        return self.get_tags(db, [tag_id]).get(tag_id)
+
+    def get_tag_by_path(self, db: Session, tag_path: str) -> Optional[CachedCountTag]:
+        return self.get_tags_by_path(db, [tag_path]).get(tag_path)
+
+    def get_type(self, db: Session, type_id: int) -> Optional[CachedCountType]:
+        return self.get_types(db, [type_id]).get(type_id)
+
+    def invalidate_tag(self, tag_id: Optional[int] = None):
+        """Drop one tag entry, or every tag entry when no id is given."""
+        with self._lock:
+            if tag_id is None:
+                self._tags.clear()
+                self._paths.clear()
+            else:
+                self._tags.pop(tag_id, None)
+                # Path entries of the tag, including one under a previous path
+                for tag_path in [path for path, entry in self._paths.items() if entry[0].id == tag_id]:
+                    del self._paths[tag_path]
+
+    def invalidate_type(self, type_id: Optional[int] = None):
+        """Drop one count type entry, or every count type entry when no id is given."""
+        with self._lock:
+            if type_id is None:
+                self._types.clear()
+            else:
+                self._types.pop(type_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "tag_entries": len(self._tags),
+                "tag_path_entries": len(self._paths),
+                "type_entries": len(self._types),
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+count_lookup_cache = CountLookupCache(ttl_seconds=settings.COUNT_CACHE_TTL_SECONDS)
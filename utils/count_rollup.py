@@ -0,0 +1,259 @@
+"""
+Count rollups at minute, hour and shift granularity.
+
+A worker folds new CountHistory rows (id above the watermark) into
+count_rollup with one upsert per fold, advancing the watermark in the same
+transaction. Queries read the coarsest rollup that lines up with the
+requested window and resolution, and only read raw rows for the unrolled tail
+above the watermark; they are read again if a fold moved the watermark
+meanwhile, so no row is counted both rolled up and raw.
+Folding by id rather than by timestamp means late-arriving events are still
+picked up. Ids are not committed in order, so the watermark only advances over
+a contiguous run of ids: a gap may be a transaction that has not committed
+yet, and rows above it stay in the raw tail until the gap fills. A gap still
+open after COUNT_ROLLUP_GAP_GRACE_SECONDS is taken to be a rolled-back insert
+or a skipped sequence value and is stepped over.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from config import settings
+from database.models.oee import CountHistory, CountRollup, CountRollupWatermark
+from database.models.schedule_run import Run, Schedule
+from utils.logging_config import logger
+
+EPOCH = datetime(1970, 1, 1)
+
+# Stored rollups, finest first
+ROLLUP_SECONDS = {
+    "minute": 60,
+    "hour": 3600,
+    "shift": settings.SHIFT_LENGTH_HOURS * 3600,
+}
+
+# Resolutions a client may ask for
+RESOLUTION_SECONDS = dict(ROLLUP_SECONDS, day=86400)
+
+def floor_bucket(timestamp: datetime, seconds: int) -> datetime:
+    """Start of the epoch-aligned bucket of `seconds` containing `timestamp`."""
+    return EPOCH + ((timestamp - EPOCH) // timedelta(seconds=seconds)) * timedelta(seconds=seconds)
+
+def _is_aligned(timestamp: datetime, seconds: int) -> bool:
+    return floor_bucket(timestamp, seconds) == timestamp
+
+def _watermark(db: Session, lock: bool = False) -> CountRollupWatermark:
+    query = db.query(CountRollupWatermark).filter(CountRollupWatermark.id == 1)
+    if lock:
+        query = query.with_for_update()
+    watermark = query.first()
+    if watermark is None:
+        watermark = CountRollupWatermark(id=1, last_count_history_id=0)
+        db.add(watermark)
+        db.flush()
+    return watermark
+
+def _upsert(db: Session, rows: List[dict]):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = dialect_insert(CountRollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=["resolution", "line_id", "bucket_start", "run_id", "count_type_id"],
+        set_={
+            "count": CountRollup.count + statement.excluded["count"],
+            "events": CountRollup.events + statement.excluded.events,
+        }
+    )
+    db.execute(statement, rows)
+
+# First id of each open gap above the watermark -> when it was first seen
+_pending_gaps: Dict[int, float] = {}
+_pending_gaps_lock = threading.Lock()
+
+def _settled_prefix(rows: list, after_id: int) -> list:
+    """Leading rows whose ids follow `after_id` without a gap younger than the grace period."""
+    now = time.monotonic()
+    expected = after_id + 1
+    with _pending_gaps_lock:
+        for position, row in enumerate(rows):
+            if row.id != expected:
+                first_seen = _pending_gaps.setdefault(expected, now)
+                if now - first_seen < settings.COUNT_ROLLUP_GAP_GRACE_SECONDS:
+                    return rows[:position]
+                _pending_gaps.pop(expected)
+                logger.warning("Count rollup skipped CountHistory ids %s-%s", expected, row.id - 1)
+            expected = row.id + 1
+    return rows
+
+def fold_new_counts(db: Session, batch_size: Optional[int] = None) -> int:
+    """
+    Fold up to `batch_size` raw rows above the watermark into every rollup,
+    stopping at the first unsettled id gap.
+    Returns the number of raw rows consumed; the caller commits.
+    """
+    batch_size = batch_size or settings.COUNT_ROLLUP_BATCH_SIZE
+    watermark = _watermark(db, lock=True)
+    rows = db.query(
+        CountHistory.id, CountHistory.timestamp, CountHistory.count,
+        CountHistory.run_id, CountHistory.count_type_id, Schedule.line_id
+    ).outerjoin(Run, Run.id == CountHistory.run_id).outerjoin(
+        Schedule, Schedule.id == Run.schedule_id
+    ).filter(
+        CountHistory.id > watermark.last_count_history_id
+    ).order_by(CountHistory.id).limit(batch_size).all()
+    rows = _settled_prefix(rows, watermark.last_count_history_id)
+    if not rows:
+        return 0
+
+    totals: Dict[Tuple, List[int]] = defaultdict(lambda: [0, 0])
+    for row in rows:
+        # Counts without a run cannot be attributed to a line
+        if row.line_id is None:
+            continue
+        for resolution, seconds in ROLLUP_SECONDS.items():
+            key = (resolution, row.line_id, floor_bucket(row.timestamp, seconds), row.run_id, row.count_type_id)
+            totals[key][0] += row.count
+            totals[key][1] += 1
+
+    if totals:
+        _upsert(db, [
+            {
+                "resolution": resolution, "line_id": line_id, "bucket_start": bucket_start,
+                "run_id": run_id, "count_type_id": count_type_id, "count": count, "events": events,
+            }
+            for (resolution, line_id, bucket_start, run_id, count_type_id), (count, events) in totals.items()
+        ])
+    watermark.last_count_history_id = rows[-1].id
+    watermark.updated_at = datetime.utcnow()
+    db.flush()
+    return len(rows)
+
+def choose_rollup(start: datetime, end: datetime, resolution: str) -> Optional[str]:
+    """
+    Coarsest stored rollup whose buckets tile both the requested resolution
+    and the window boundaries, or None when only raw rows can answer exactly.
+    """
+    wanted = RESOLUTION_SECONDS[resolution]
+    for name, seconds in sorted(ROLLUP_SECONDS.items(), key=lambda item: -item[1]):
+        if wanted % seconds == 0 and _is_aligned(start, seconds) and _is_aligned(end, seconds):
+            return name
+    return None
+
+def _watermark_id(db: Session) -> int:
+    # A column read, so a watermark object already in the session does not hide a newer value
+    return db.query(CountRollupWatermark.last_count_history_id).filter(CountRollupWatermark.id == 1).scalar() or 0
+
+def _read_counts(db: Session, line_id: int, start: datetime, end: datetime, seconds: int, source: Optional[str],
+                 run_id: Optional[int], count_type_id: Optional[int]) -> Optional[Dict[Tuple[datetime, int], int]]:
+    """
+    Rollup plus raw-tail totals, or None when a fold committed while they were read: the
+    rows it moved would be counted in both, so the caller reads again.
+    """
+    totals: Dict[Tuple[datetime, int], int] = defaultdict(int)
+    raw_floor = 0
+    if source is not None:
+        raw_floor = _watermark_id(db)
+        query = db.query(
+            CountRollup.bucket_start, CountRollup.count_type_id, func.sum(CountRollup.count)
+        ).filter(
+            CountRollup.resolution == source,
+            CountRollup.line_id == line_id,
+            CountRollup.bucket_start >= start,
+            CountRollup.bucket_start < end
+        )
+        if run_id is not None:
+            query = query.filter(CountRollup.run_id == run_id)
+        if count_type_id is not None:
+            query = query.filter(CountRollup.count_type_id == count_type_id)
+        for bucket_start, type_id, count in query.group_by(CountRollup.bucket_start, CountRollup.count_type_id):
+            totals[(floor_bucket(bucket_start, seconds), type_id)] += count
+
+    # Raw rows not yet folded (or all of them when no rollup fits)
+    query = db.query(CountHistory.timestamp, CountHistory.count_type_id, CountHistory.count).join(
+        Run, Run.id == CountHistory.run_id
+    ).join(Schedule, Schedule.id == Run.schedule_id).filter(
+        Schedule.line_id == line_id,
+        CountHistory.id > raw_floor,
+        CountHistory.timestamp >= start,
+        CountHistory.timestamp < end
+    )
+    if run_id is not None:
+        query = query.filter(CountHistory.run_id == run_id)
+    if count_type_id is not None:
+        query = query.filter(CountHistory.count_type_id == count_type_id)
+    for timestamp, type_id, count in query:
+        totals[(floor_bucket(timestamp, seconds), type_id)] += count
+
+    if source is not None and _watermark_id(db) != raw_floor:
+        return None
+    return totals
+
+def query_counts(db: Session, line_id: int, start: datetime, end: datetime, resolution: str,
+                 run_id: Optional[int] = None, count_type_id: Optional[int] = None) -> Tuple[Optional[str], list]:
+    """
+    Count totals per (bucket_start, count_type_id) for a line in [start, end).
+    Returns the rollup used (None for raw only) and the points in time order.
+    """
+    seconds = RESOLUTION_SECONDS[resolution]
+    source = choose_rollup(start, end, resolution)
+    totals = None
+    while totals is None:
+        totals = _read_counts(db, line_id, start, end, seconds, source, run_id, count_type_id)
+
+    points = [
+        {"bucket_start": bucket_start, "count_type_id": type_id, "count": count}
+        for (bucket_start, type_id), count in sorted(totals.items())
+    ]
+    return source, points
+
+class CountRollupWorker:
+    """Background thread that periodically folds new counts into the rollups."""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        from database.engine import SessionLocal
+
+        folded = 0
+        db = SessionLocal()
+        try:
+            while True:
+                consumed = fold_new_counts(db)
+                db.commit()
+                folded += consumed
+                if consumed < settings.COUNT_ROLLUP_BATCH_SIZE:
+                    return folded
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Count rollup fold failed")
+
+    def start(self):
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="count-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+count_rollup_worker = CountRollupWorker(settings.COUNT_ROLLUP_INTERVAL_SECONDS)
@@ -1,8 +1,8 @@
 """
-Database session dependency for FastAPI endpoints.
+Database session dependencies for FastAPI endpoints.
 """
 
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 def get_db() -> Generator:
     """
@@ -14,4 +14,13 @@ def get_db() -> Generator:
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db() -> AsyncGenerator:
+    """
+    Get an async database session for dependency injection.
+    Yields a SQLAlchemy AsyncSession that is automatically closed after use.
+    """
+    from database.engine import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,148 @@
+"""
+Downtime Pareto and MTBF/MTTR over a time window, aggregated in the database.
+
+StateHistory rows are clipped to the window (open rows run until the window
+end, so callers must not pass a window ending in the future) and summed with
+GROUP BY; the Pareto
+cumulative shares come from window functions over the per-reason totals.
+Which rows count as downtime, and which of those are planned, is decided by
+the inherited flags of the cached reason tree and passed in as id lists, so
+only a few hundred aggregate rows ever reach Python.
+
+MTBF is the line's run time (window minus all downtime) per unplanned event;
+MTTR is unplanned minutes per unplanned event. Both are None without failures.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, case, func, literal, select
+from sqlalchemy.orm import Session
+
+from database.models.downtime import StateHistory
+from database.models.enterprise import Line
+from utils.hierarchy_closure import under
+from utils.reason_tree import reason_tree_cache
+
+def seconds_between(dialect_name: str, later, earlier):
+    """SQL expression for `later - earlier` in seconds (PostgreSQL, otherwise SQLite)."""
+    if dialect_name == "postgresql":
+        return func.extract("epoch", later - earlier)
+    return (func.julianday(later) - func.julianday(earlier)) * 86400.0
+
+def _ratio(numerator: float, denominator: float) -> Optional[float]:
+    return numerator / denominator if denominator else None
+
+def downtime_analytics(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    line_id: Optional[int] = None,
+    ancestors: Sequence[Tuple[str, int]] = (),
+    top: int = 20,
+) -> dict:
+    """
+    Pareto by reason plus per-line and overall downtime statistics for
+    [start, end). `ancestors` are (level, id) pairs the lines must sit under.
+    """
+    tree = reason_tree_cache.get(db)
+    recorded_ids, planned_ids = tree.downtime_reason_ids()
+
+    window_start = literal(start, DateTime)
+    window_end = literal(end, DateTime)
+    row_end = func.coalesce(StateHistory.end_datetime, window_end)
+    clipped_start = case((StateHistory.start_datetime < window_start, window_start), else_=StateHistory.start_datetime)
+    clipped_end = case((row_end > window_end, window_end), else_=row_end)
+    minutes = seconds_between(db.get_bind().dialect.name, clipped_end, clipped_start) / 60.0
+    planned = StateHistory.state_reason_id.in_(planned_ids)
+
+    line_filters = []
+    if line_id is not None:
+        line_filters.append(Line.id == line_id)
+    line_filters.extend(under(Line.id, "line", level, node_id) for level, node_id in ancestors)
+    line_ids = db.execute(select(Line.id).where(*line_filters).order_by(Line.id)).scalars().all()
+
+    filters = [
+        StateHistory.state_reason_id.in_(recorded_ids),
+        StateHistory.start_datetime < window_end,
+        row_end > window_start,
+        StateHistory.line_id.is_not(None),
+    ]
+    if line_id is not None:
+        filters.append(StateHistory.line_id == line_id)
+    filters.extend(under(StateHistory.line_id, "line", level, node_id) for level, node_id in ancestors)
+
+    by_reason = select(
+        StateHistory.state_reason_id.label("state_reason_id"),
+        func.max(StateHistory.reason_code).label("reason_code"),
+        func.max(StateHistory.reason_name).label("reason_name"),
+        func.sum(minutes).label("minutes"),
+        func.count().label("events"),
+    ).where(*filters).group_by(StateHistory.state_reason_id).subquery()
+    ranking = (by_reason.c.minutes.desc(), by_reason.c.state_reason_id)
+    pareto_rows = db.execute(
+        select(
+            by_reason,
+            func.sum(by_reason.c.minutes).over().label("total_minutes"),
+            func.sum(by_reason.c.minutes).over(order_by=ranking, rows=(None, 0)).label("cumulative_minutes"),
+        ).order_by(*ranking).limit(top)
+    ).all()
+
+    line_rows = {
+        row.line_id: row for row in db.execute(
+            select(
+                StateHistory.line_id,
+                func.sum(case((planned, minutes), else_=0.0)).label("planned_minutes"),
+                func.sum(case((planned, 0.0), else_=minutes)).label("unplanned_minutes"),
+                func.count().label("events"),
+                func.sum(case((planned, 0), else_=1)).label("failures"),
+            ).where(*filters).group_by(StateHistory.line_id)
+        ).all()
+    }
+
+    window_minutes = (end - start).total_seconds() / 60.0
+    lines = []
+    for current_line_id in line_ids:
+        row = line_rows.get(current_line_id)
+        planned_minutes = float(row.planned_minutes or 0.0) if row else 0.0
+        unplanned_minutes = float(row.unplanned_minutes or 0.0) if row else 0.0
+        failures = int(row.failures or 0) if row else 0
+        lines.append({
+            "line_id": current_line_id,
+            "planned_minutes": planned_minutes,
+            "unplanned_minutes": unplanned_minutes,
+            "events": row.events if row else 0,
+            "failures": failures,
+            "mtbf_minutes": _ratio(window_minutes - planned_minutes - unplanned_minutes, failures),
+            "mttr_minutes": _ratio(unplanned_minutes, failures),
+        })
+
+    planned_total = sum(line["planned_minutes"] for line in lines)
+    unplanned_total = sum(line["unplanned_minutes"] for line in lines)
+    failures_total = sum(line["failures"] for line in lines)
+    pareto: List[dict] = [
+        {
+            "state_reason_id": row.state_reason_id,
+            "reason_code": row.reason_code,
+            "reason_name": row.reason_name,
+            "planned": row.state_reason_id in tree.reasons and tree.is_planned(row.state_reason_id),
+            "minutes": float(row.minutes),
+            "events": row.events,
+            "share": _ratio(float(row.minutes), float(row.total_minutes)) or 0.0,
+            "cumulative_share": _ratio(float(row.cumulative_minutes), float(row.total_minutes)) or 0.0,
+        }
+        for row in pareto_rows
+    ]
+    return {
+        "start": start,
+        "end": end,
+        "window_minutes": window_minutes,
+        "planned_minutes": planned_total,
+        "unplanned_minutes": unplanned_total,
+        "events": sum(line["events"] for line in lines),
+        "failures": failures_total,
+        "mtbf_minutes": _ratio(window_minutes * len(lines) - planned_total - unplanned_total, failures_total),
+        "mttr_minutes": _ratio(unplanned_total, failures_total),
+        "pareto": pareto,
+        "lines": lines,
+    }
@@ -0,0 +1,63 @@
+"""
+Streaming NDJSON/CSV export of large history tables.
+
+Rows are read through a server-side cursor (stream_results + yield_per) and
+serialised one partition at a time, so memory stays flat regardless of how
+many rows are exported. The generator owns its session: it must outlive the
+request handler, which returns as soon as the StreamingResponse is built.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+from config import settings
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def stream_rows(statement: Select, fmt: str, chunk_size: int = None) -> Iterator[str]:
+    """Yield the rows of a Core select as NDJSON lines or CSV, one chunk at a time."""
+    from database.engine import SessionLocal
+
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(stream_results=True, yield_per=chunk_size))
+        columns = list(result.keys())
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue()
+        for partition in result.partitions():
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows([[_plain(value) for value in row] for row in partition])
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(columns, (_plain(value) for value in row)))) + "\n"
+                    for row in partition
+                )
+    finally:
+        db.close()
+
+def export_response(statement: Select, fmt: str, filename: str) -> StreamingResponse:
+    """Wrap stream_rows in a StreamingResponse with a download filename."""
+    return StreamingResponse(
+        stream_rows(statement, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
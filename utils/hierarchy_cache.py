@@ -0,0 +1,82 @@
+"""
+In-process cache of materialised Enterprise -> Site -> Area -> Line -> Cell trees.
+
+A tree is loaded with one selectinload query per level (five in total, however
+large the plant) and stored as a plain nested dict keyed by enterprise id. The
+hierarchy CRUD handlers invalidate it; entries also expire after a TTL.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session, selectinload
+
+from config import settings
+from database.models.enterprise import Enterprise, Site, Area, Line
+
+def _node(row, **children) -> dict:
+    return {"id": row.id, "name": row.name, "disabled": bool(row.disabled), **children}
+
+def load_enterprise_tree(db: Session, enterprise_id: int) -> Optional[dict]:
+    """Materialise the full tree of one enterprise, children ordered by id."""
+    enterprise = db.query(Enterprise).options(
+        selectinload(Enterprise.sites)
+        .selectinload(Site.areas)
+        .selectinload(Area.lines)
+        .selectinload(Line.cells)
+    ).filter(Enterprise.id == enterprise_id).first()
+    if enterprise is None:
+        return None
+
+    def by_id(rows):
+        return sorted(rows, key=lambda row: row.id)
+
+    return _node(enterprise, sites=[
+        _node(site, areas=[
+            _node(area, lines=[
+                _node(line, cells=[_node(cell) for cell in by_id(line.cells)])
+                for line in by_id(area.lines)
+            ])
+            for area in by_id(site.areas)
+        ])
+        for site in by_id(enterprise.sites)
+    ])
+
+class HierarchyTreeCache:
+    """
+    TTL cache of enterprise trees.
+    A generation counter keeps a load that raced with an invalidation from being stored.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._trees: Dict[int, tuple] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, enterprise_id: int) -> Optional[dict]:
+        """Return the cached tree of `enterprise_id`, loading it on a miss."""
+        with self._lock:
+            entry = self._trees.get(enterprise_id)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            generation = self._generation
+
+        tree = load_enterprise_tree(db, enterprise_id)
+        if tree is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._trees[enterprise_id] = (tree, time.monotonic() + self.ttl_seconds)
+        return tree
+
+    def invalidate(self, enterprise_id: Optional[int] = None):
+        """Drop one enterprise's tree, or every tree when no id is given."""
+        with self._lock:
+            self._generation += 1
+            if enterprise_id is None:
+                self._trees.clear()
+            else:
+                self._trees.pop(enterprise_id, None)
+
+hierarchy_tree_cache = HierarchyTreeCache(ttl_seconds=settings.HIERARCHY_CACHE_TTL_SECONDS)
@@ -0,0 +1,204 @@
+"""
+Maintenance and lookups for the hierarchy_closure table.
+
+The hierarchy routers call add_node / move_node / remove_node inside their own
+transaction; nothing here commits. `under` turns "descendants of node X" into
+a subquery on the closure primary key, so roll-ups at any level filter with
+a single IN / join instead of walking parent foreign keys.
+
+Run `python -m utils.hierarchy_closure` to rebuild the table from the parent
+foreign keys.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from database.models.enterprise import Enterprise, Site, Area, Line, Cell, HierarchyClosure
+
+LEVELS = ("enterprise", "site", "area", "line", "cell")
+
+# Model and parent foreign key column of each level
+LEVEL_MODELS = {
+    "enterprise": (Enterprise, None),
+    "site": (Site, Site.enterprise_id),
+    "area": (Area, Area.site_id),
+    "line": (Line, Line.area_id),
+    "cell": (Cell, Cell.line_id),
+}
+
+def parent_level(level: str) -> Optional[str]:
+    index = LEVELS.index(level)
+    return LEVELS[index - 1] if index else None
+
+def _ancestors(db: Session, level: str, node_id: int) -> List[Tuple[str, int, int]]:
+    """(level, id, depth) of every ancestor of a node, the node itself included."""
+    return db.execute(
+        select(HierarchyClosure.ancestor_level, HierarchyClosure.ancestor_id, HierarchyClosure.depth).where(
+            HierarchyClosure.descendant_level == level,
+            HierarchyClosure.descendant_id == node_id
+        )
+    ).all()
+
+def _subtree(db: Session, level: str, node_id: int) -> List[Tuple[str, int, int]]:
+    """(level, id, depth) of every descendant of a node, the node itself included."""
+    return db.execute(
+        select(HierarchyClosure.descendant_level, HierarchyClosure.descendant_id, HierarchyClosure.depth).where(
+            HierarchyClosure.ancestor_level == level,
+            HierarchyClosure.ancestor_id == node_id
+        )
+    ).all()
+
+def _delete_descendant_rows(db: Session, nodes: List[Tuple[str, int, int]], above_level: Optional[str] = None):
+    by_level: Dict[str, List[int]] = {}
+    for level, node_id, _ in nodes:
+        by_level.setdefault(level, []).append(node_id)
+    for level, ids in by_level.items():
+        statement = delete(HierarchyClosure).where(
+            HierarchyClosure.descendant_level == level,
+            HierarchyClosure.descendant_id.in_(ids)
+        )
+        if above_level is not None:
+            statement = statement.where(
+                HierarchyClosure.ancestor_level.in_(LEVELS[:LEVELS.index(above_level)])
+            )
+        db.execute(statement)
+
+def add_node(db: Session, level: str, node_id: int, parent_id: Optional[int] = None):
+    """Insert the closure rows of a new leaf node under `parent_id`."""
+    db.execute(insert(HierarchyClosure).values(
+        ancestor_level=level, ancestor_id=node_id,
+        descendant_level=level, descendant_id=node_id, depth=0
+    ))
+    if parent_id is not None:
+        db.execute(insert(HierarchyClosure).from_select(
+            ["ancestor_level", "ancestor_id", "descendant_level", "descendant_id", "depth"],
+            select(
+                HierarchyClosure.ancestor_level, HierarchyClosure.ancestor_id,
+                literal(level), literal(node_id), HierarchyClosure.depth + 1
+            ).where(
+                HierarchyClosure.descendant_level == parent_level(level),
+                HierarchyClosure.descendant_id == parent_id
+            )
+        ))
+
+def _restore_subtree(db: Session, level: str, node_id: int) -> List[Tuple[str, int, int]]:
+    """
+    Recreate the closure rows inside the subtree of a node that has none, walking
+    the parent foreign keys down from it, and return the subtree as _subtree does.
+    """
+    parents = {(level, node_id): None}
+    current = [node_id]
+    for child_level in LEVELS[LEVELS.index(level) + 1:]:
+        if not current:
+            break
+        model, parent_fk = LEVEL_MODELS[child_level]
+        children = db.execute(select(model.id, parent_fk).where(parent_fk.in_(current))).all()
+        parents.update(((child_level, child_id), (parent_level(child_level), parent_id))
+                       for child_id, parent_id in children)
+        current = [child_id for child_id, _ in children]
+
+    rows = []
+    for node in parents:
+        ancestor, depth = node, 0
+        while ancestor is not None:
+            rows.append({
+                "ancestor_level": ancestor[0], "ancestor_id": ancestor[1],
+                "descendant_level": node[0], "descendant_id": node[1], "depth": depth,
+            })
+            ancestor, depth = parents[ancestor], depth + 1
+    db.execute(insert(HierarchyClosure), rows)
+    return [(row["descendant_level"], row["descendant_id"], row["depth"])
+            for row in rows if row["ancestor_level"] == level]
+
+def move_node(db: Session, level: str, node_id: int, new_parent_id: int):
+    """Re-attach a node and its whole subtree under `new_parent_id`."""
+    # A node orphaned before remove_node kept surviving subtrees has no closure rows
+    subtree = _subtree(db, level, node_id) or _restore_subtree(db, level, node_id)
+    # Drop the links from the old ancestors; links inside the subtree stay
+    _delete_descendant_rows(db, subtree, above_level=level)
+    rows = [
+        {
+            "ancestor_level": ancestor_level, "ancestor_id": ancestor_id,
+            "descendant_level": descendant_level, "descendant_id": descendant_id,
+            "depth": ancestor_depth + descendant_depth + 1,
+        }
+        for ancestor_level, ancestor_id, ancestor_depth in _ancestors(db, parent_level(level), new_parent_id)
+        for descendant_level, descendant_id, descendant_depth in subtree
+    ]
+    if rows:
+        db.execute(insert(HierarchyClosure), rows)
+
+def remove_node(db: Session, level: str, node_id: int):
+    """
+    Delete the closure rows of a node that is being deleted. Its children survive
+    with a NULL parent key, so their subtrees keep their own rows and only lose
+    the links to the node and the ancestors above it.
+    """
+    subtree = _subtree(db, level, node_id)
+    _delete_descendant_rows(db, [(level, node_id, 0)])
+    descendants = [node for node in subtree if node[2] > 0]
+    if descendants:
+        # Links from the node's level and above; those inside the surviving subtrees stay
+        _delete_descendant_rows(db, descendants, above_level=LEVELS[LEVELS.index(level) + 1])
+
+def under(column, level: str, ancestor_level: str, ancestor_id: int):
+    """
+    SQL condition restricting `column` (an id of `level`) to descendants of the
+    given ancestor, e.g. under(Line.id, "line", "site", 3).
+    """
+    return column.in_(
+        select(HierarchyClosure.descendant_id).where(
+            HierarchyClosure.ancestor_level == ancestor_level,
+            HierarchyClosure.ancestor_id == ancestor_id,
+            HierarchyClosure.descendant_level == level
+        )
+    )
+
+def enterprise_of(db: Session, level: str, node_id: int) -> Optional[int]:
+    """Enterprise id a node belongs to, or None when it is not attached."""
+    return db.execute(
+        select(HierarchyClosure.ancestor_id).where(
+            HierarchyClosure.descendant_level == level,
+            HierarchyClosure.descendant_id == node_id,
+            HierarchyClosure.ancestor_level == "enterprise"
+        )
+    ).scalar()
+
+def rebuild_closure(db: Session):
+    """Recreate every closure row from the parent foreign keys (one INSERT ... SELECT per level pair)."""
+    db.execute(delete(HierarchyClosure))
+    for start, ancestor_level in enumerate(LEVELS):
+        for depth, descendant_level in enumerate(LEVELS[start:]):
+            model, _ = LEVEL_MODELS[descendant_level]
+            statement_joins = []
+            ancestor_column = model.id
+            level = descendant_level
+            # Walk up the parent keys, joining each intermediate level
+            while level != ancestor_level:
+                level_model, parent_fk = LEVEL_MODELS[level]
+                if level_model is not model:
+                    statement_joins.append((level_model, level_model.id == ancestor_column))
+                ancestor_column = parent_fk
+                level = parent_level(level)
+
+            statement = select(
+                literal(ancestor_level), ancestor_column, literal(descendant_level), model.id, literal(depth)
+            ).select_from(model)
+            for level_model, condition in statement_joins:
+                statement = statement.join(level_model, condition)
+            if depth:
+                statement = statement.where(ancestor_column.is_not(None))
+            db.execute(insert(HierarchyClosure).from_select(
+                ["ancestor_level", "ancestor_id", "descendant_level", "descendant_id", "depth"], statement
+            ))
+
+if __name__ == "__main__":
+    from database.engine import SessionLocal
+    session = SessionLocal()
+    try:
+        rebuild_closure(session)
+        session.commit()
+    finally:
+        session.close()
@@ -0,0 +1,142 @@
+"""
+Server-side line state machine.
+
+Each line has at most one open StateHistory row (end_datetime NULL). The
+tracker keeps that row per line in memory, so a state change is one guarded
+UPDATE closing the open row plus one INSERT opening the next, with no lookup
+query. The open row is read from the database only the first time a line is
+seen, or when the guarded UPDATE shows that another process moved the line on;
+re-sending the current state only runs the guard.
+
+Callers serialise changes per line with `lock(line_id)`, run `transition`
+inside their transaction and call `remember` once it has committed.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from database.models.downtime import StateHistory
+from database.models.enterprise import Line
+from utils.reason_tree import reason_tree_cache
+from utils.run_metrics import run_metrics_engine
+
+class OpenState(NamedTuple):
+    id: int
+    start_datetime: datetime
+    state_reason_id: int
+    run_id: Optional[int]
+
+class LineStateError(Exception):
+    """Raised when a state change cannot be applied; `status_code` suits the HTTP response."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class LineStateTracker:
+    """Open state per line; None means the line is known and has no open state."""
+
+    def __init__(self):
+        self._open: Dict[int, Optional[OpenState]] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    def lock(self, line_id: int) -> asyncio.Lock:
+        return self._locks.setdefault(line_id, asyncio.Lock())
+
+    def remember(self, line_id: int, state: Optional[OpenState]):
+        self._open[line_id] = state
+
+    def forget(self, line_id: Optional[int] = None):
+        """Drop one line's open state, or every line's, so it is reloaded on next use."""
+        if line_id is None:
+            self._open.clear()
+        else:
+            self._open.pop(line_id, None)
+
+    def _load(self, db: Session, line_id: int) -> Optional[OpenState]:
+        if db.get(Line, line_id) is None:
+            raise LineStateError(404, "Line not found")
+        row = db.execute(
+            select(StateHistory.id, StateHistory.start_datetime, StateHistory.state_reason_id, StateHistory.run_id)
+            .where(StateHistory.line_id == line_id, StateHistory.end_datetime.is_(None))
+            .order_by(StateHistory.start_datetime.desc(), StateHistory.id.desc())
+            .limit(1)
+        ).first()
+        return OpenState(*row) if row else None
+
+    def _close(self, db: Session, current: OpenState, end_datetime: Optional[datetime]) -> bool:
+        """Guarded UPDATE of the open row; False when it is no longer open. None only confirms it."""
+        result = db.execute(
+            update(StateHistory)
+            .where(StateHistory.id == current.id, StateHistory.end_datetime.is_(None))
+            .values(end_datetime=end_datetime)
+        )
+        return result.rowcount == 1
+
+    def _open_downtime(self, db: Session, tree, state: OpenState, at: datetime):
+        """An open downtime state (new or re-sent) keeps pushing out its run's estimated finish."""
+        if state.run_id and state.state_reason_id in tree.reasons and tree.records_downtime(state.state_reason_id):
+            run_metrics_engine.record_open_downtime(db, state.run_id, max(at, state.start_datetime))
+
+    def transition(self, db: Session, line_id: int, state_reason_id: int,
+                   run_id: Optional[int], at: datetime) -> Tuple[Optional[int], OpenState]:
+        """
+        Close the line's open state at `at` and open `state_reason_id`.
+        Returns (closed StateHistory id, new open state). Re-sending the current
+        state is a no-op that returns (None, current state). The caller commits.
+        """
+        tree = reason_tree_cache.get(db)
+        reason = tree.reasons.get(state_reason_id)
+        if reason is None:
+            raise LineStateError(400, "Invalid StateReason.")
+
+        current = self._open[line_id] if line_id in self._open else self._load(db, line_id)
+        closed = None
+        # A failed guard means another process changed the line: reload once and retry
+        for _ in range(2):
+            if current is None:
+                break
+            if current.state_reason_id == state_reason_id and current.run_id == run_id:
+                if self._close(db, current, None):
+                    self._open_downtime(db, tree, current, at)
+                    return None, current
+            else:
+                if at < current.start_datetime:
+                    raise LineStateError(409, "State change is older than the line's current state")
+                if self._close(db, current, at):
+                    closed = current
+                    break
+            current = self._load(db, line_id)
+        else:
+            raise LineStateError(409, "Line state changed concurrently, retry")
+
+        if closed is not None:
+            # A closed downtime event is folded into the run's metrics, as in POST /state-history/,
+            # with the flags inherited through the reason tree
+            if closed.run_id and closed.state_reason_id in tree.reasons and tree.records_downtime(closed.state_reason_id):
+                minutes = (at - closed.start_datetime).total_seconds() / 60.0
+                run_metrics_engine.record_downtime(
+                    db, closed.run_id, max(minutes, 0.0),
+                    planned=tree.is_planned(closed.state_reason_id), at=at
+                )
+
+        opened = StateHistory(
+            start_datetime=at,
+            state_reason_id=state_reason_id,
+            reason_name=reason["reason_name"],
+            reason_code=reason["reason_code"],
+            line_id=line_id,
+            run_id=run_id
+        )
+        db.add(opened)
+        db.flush()
+        opened_state = OpenState(opened.id, opened.start_datetime, state_reason_id, run_id)
+        self._open_downtime(db, tree, opened_state, at)
+        return closed.id if closed else None, opened_state
+
+line_state_tracker = LineStateTracker()
@@ -1,49 +1,140 @@
 """
 Logging configuration for the MES application.
+
+Loggers only enqueue records: a QueueHandler puts each record on a bounded
+in-memory queue and a QueueListener thread formats and writes it to the
+console and the rotating log file. When the queue is full the record is
+dropped and counted instead of blocking the request.
 """
 
+import atexit
+import json
 import logging
-from logging.config import dictConfig
+import logging.handlers
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from config import settings
+
+# Attributes every LogRecord has; anything else on a record came in through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any structured `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks: records are dropped and counted when the queue is full.
+    Formatting is left to the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener whose stop waits for room for its sentinel. The stock listener
+    enqueues it with put_nowait, which raises queue.Full on a bounded queue exactly
+    when logging is overloaded; the listener thread keeps draining, so this returns.
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+_queue_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[DrainingQueueListener] = None
+
+def _file_handler() -> logging.Handler:
+    if settings.LOG_ROTATION == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            settings.LOG_FILE, when=settings.LOG_ROTATE_WHEN, backupCount=settings.LOG_BACKUP_COUNT, utc=True
+        )
+    if settings.LOG_ROTATION == "size":
+        return logging.handlers.RotatingFileHandler(
+            settings.LOG_FILE, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT
+        )
+    return logging.FileHandler(settings.LOG_FILE)
 
 def configure_logging():
     """Configure logging for the application."""
-    logging_config = {
-        "version": 1,
-        "disable_existing_loggers": False,
-        "formatters": {
-            "default": {
-                "format": "%(levelname)s: %(message)s"
-            },
-            "detailed": {
-                "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            }
-        },
-        "handlers": {
-            "console": {
-                "class": "logging.StreamHandler",
-                "formatter": "default",
-                "level": "INFO"
-            },
-            "file": {
-                "class": "logging.FileHandler",
-                "filename": "mes.log",
-                "formatter": "detailed",
-                "level": "DEBUG"
-            }
-        },
-        "loggers": {
-            "mes": {
-                "handlers": ["console", "file"],
-                "level": "INFO",
-                "propagate": False
-            },
-            "sqlalchemy.engine": {
-                "handlers": ["file"],
-                "level": "INFO",
-                "propagate": False
-            }
-        }
+    global _queue_handler, _listener
+    stop_logging()
+
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+    # SQLAlchemy's engine logger only goes to the file
+    console.addFilter(logging.Filter("mes"))
+
+    file = _file_handler()
+    file.setLevel(logging.DEBUG)
+    file.setFormatter(
+        JsonFormatter() if settings.LOG_JSON
+        else logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    _listener = DrainingQueueListener(_queue_handler.queue, console, file, respect_handler_level=True)
+
+    mes_logger = logging.getLogger("mes")
+    mes_logger.handlers = [_queue_handler]
+    mes_logger.setLevel(logging.INFO)
+    mes_logger.propagate = False
+
+    # Statement logging comes from utils.query_logging (mes.sql); SQLAlchemy's
+    # own engine logger only reports warnings unless SQL_ECHO is enabled
+    engine_logger = logging.getLogger("sqlalchemy.engine")
+    engine_logger.handlers = [_queue_handler]
+    engine_logger.setLevel(logging.INFO if settings.SQL_ECHO else logging.WARNING)
+    engine_logger.propagate = False
+
+    _listener.start()
+
+def stop_logging():
+    """Flush queued records, stop the listener thread and close its handlers."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def logging_stats() -> dict:
+    """Queue depth and number of records dropped because the queue was full."""
+    return {
+        "queue_size": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "queue_capacity": settings.LOG_QUEUE_SIZE,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
     }
-    dictConfig(logging_config)
+
+atexit.register(stop_logging)
 
 logger = logging.getLogger("mes")
@@ -1,48 +1,70 @@
 """
 Logging utilities for consistent logging across routers.
+
+Each helper emits one structured event: the message is a %-style format
+string whose arguments are only merged when a handler actually writes the
+record, and `event`/`entity` (plus `action` or `count`) are attached as
+extra fields for JSON output. Helpers return before building anything when
+their level is disabled, so callers should pass values as arguments rather
+than pre-formatted strings.
 """
 
+import logging
+
 from utils.logging_config import logger
 
-def log_endpoint_access(entity_type: str, action: str, details: str = None, success: bool = True):
+def log_endpoint_access(entity_type: str, action: str, details: str = None, *args, success: bool = True):
     """
     Log endpoint access with consistent formatting.
     
     Args:
         entity_type: Type of entity (e.g., 'Enterprise', 'Site', etc.)
         action: Action being performed (e.g., 'created', 'updated', etc.)
-        details: Additional details about the action
+        details: Optional %-style format string with additional details
+        *args: Arguments merged into `details` when the record is written
         success: Whether the action was successful
     """
-    if not details:
-        details = ""
-    else:
-        details = f" - {details}"
-
+    level = logging.INFO if success else logging.WARNING
+    if not logger.isEnabledFor(level):
+        return
+    extra = {"event": "endpoint_access", "entity": entity_type, "action": action, "success": success}
+    suffix = f" - {details}" if details else ""
     if success:
-        logger.info(f"{entity_type} {action} successfully{details}")
+        logger.info("%s %s successfully" + suffix, entity_type, action, *args, extra=extra)
     else:
-        logger.warning(f"Failed to {action} {entity_type}{details}")
+        logger.warning("Failed to %s %s" + suffix, action, entity_type, *args, extra=extra)
 
-def log_entity_not_found(entity_type: str, identifier: str):
+def log_entity_not_found(entity_type: str, identifier: str, *args):
     """
     Log entity not found error with consistent formatting.
     
     Args:
         entity_type: Type of entity (e.g., 'Enterprise', 'Site', etc.)
-        identifier: Identifier used to look up the entity
+        identifier: %-style format string of the identifier used to look up the entity
+        *args: Arguments merged into `identifier` when the record is written
     """
-    logger.warning(f"{entity_type} not found - {identifier}")
+    if not logger.isEnabledFor(logging.WARNING):
+        return
+    logger.warning(
+        "%s not found - " + identifier, entity_type, *args,
+        extra={"event": "entity_not_found", "entity": entity_type}
+    )
 
-def log_duplicate_entity(entity_type: str, identifier: str):
+def log_duplicate_entity(entity_type: str, identifier: str, *args):
     """
     Log duplicate entity error with consistent formatting.
     
     Args:
         entity_type: Type of entity (e.g., 'Enterprise', 'Site', etc.)
-        identifier: Identifier that caused the duplicate
+        identifier: %-style format string of the identifier that caused the duplicate
+        *args: Arguments merged into `identifier` when the record is written
     """
-    logger.warning(f"{entity_type} already exists - {identifier}")
+    if not logger.isEnabledFor(logging.WARNING):
+        return
+    logger.warning(
+        "%s already exists - " + identifier, entity_type, *args,
+        extra={"event": "duplicate_entity", "entity": entity_type}
+    )
 
 def log_query_result(entity_type: str, count: int):
     """
@@ -52,4 +74,9 @@ def log_query_result(entity_type: str, count: int):
         entity_type: Type of entity (e.g., 'Enterprise', 'Site', etc.)
         count: Number of entities retrieved
     """
-    logger.info(f"Retrieved {count} {entity_type}(s)")
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    logger.info(
+        "Retrieved %s %s(s)", count, entity_type,
+        extra={"event": "query_result", "entity": entity_type, "count": count}
+    )
@@ -0,0 +1,103 @@
+"""
+Vectorised OEE over arbitrary time windows.
+
+Raw counts and downtime intervals are passed in as NumPy arrays (epoch
+seconds) and bucketed without per-row Python loops:
+- counts are summed per bucket with np.bincount
+- downtime per bucket is the difference of the cumulative covered time
+  evaluated at the bucket edges, using sorted starts/ends and prefix sums
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from config import settings
+
+BUCKET_SECONDS = {
+    "hour": 3600,
+    "shift": settings.SHIFT_LENGTH_HOURS * 3600,
+    "day": 86400,
+}
+
+def to_epoch_seconds(values: Sequence[Optional[datetime]], fill: Optional[datetime] = None) -> np.ndarray:
+    """Convert naive UTC datetimes to float epoch seconds; None becomes `fill`."""
+    stamps = np.asarray(values, dtype="datetime64[us]")
+    if fill is not None:
+        stamps = np.where(np.isnat(stamps), np.datetime64(fill, "us"), stamps)
+    return stamps.astype(np.int64) / 1e6
+
+def from_epoch_seconds(value: float) -> datetime:
+    return datetime.fromtimestamp(float(value), tz=timezone.utc).replace(tzinfo=None)
+
+def bucket_edges(start: datetime, end: datetime, bucket_seconds: int) -> np.ndarray:
+    """
+    Bucket boundaries covering [start, end), aligned to multiples of the bucket
+    length since the epoch (so shifts and days start at midnight UTC).
+    The first and last buckets are clipped to the window.
+    """
+    start_s, end_s = to_epoch_seconds([start, end])
+    first = np.floor(start_s / bucket_seconds) * bucket_seconds
+    n_buckets = int(np.ceil((end_s - first) / bucket_seconds))
+    aligned = first + bucket_seconds * np.arange(n_buckets + 1)
+    return np.unique(np.clip(aligned, start_s, end_s))
+
+def covered_seconds(starts: np.ndarray, ends: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """
+    Total time covered by the intervals [starts, ends) before each point:
+    sum over s < t of (t - s) minus sum over e < t of (t - e).
+    """
+    if len(starts) == 0:
+        return np.zeros(len(points))
+    starts = np.sort(starts)
+    ends = np.sort(ends)
+    start_prefix = np.concatenate(([0.0], np.cumsum(starts)))
+    end_prefix = np.concatenate(([0.0], np.cumsum(ends)))
+    n_started = np.searchsorted(starts, points, side="left")
+    n_ended = np.searchsorted(ends, points, side="left")
+    return (n_started * points - start_prefix[n_started]) - (n_ended * points - end_prefix[n_ended])
+
+def window_oee(edges: np.ndarray, count_ts: np.ndarray, count_values: np.ndarray,
+               count_is_good: np.ndarray, down_starts: np.ndarray, down_ends: np.ndarray,
+               down_planned: np.ndarray, ideal_rate: Optional[float]) -> Dict[str, np.ndarray]:
+    """
+    Compute per-bucket counts, downtime (minutes) and OEE ratios.
+    ideal_rate is in units per minute.
+    """
+    n_buckets = len(edges) - 1
+    idx = np.searchsorted(edges, count_ts, side="right") - 1
+    in_range = (idx >= 0) & (idx < n_buckets)
+    idx = idx[in_range]
+    values = count_values[in_range].astype(np.float64)
+    good_mask = count_is_good[in_range]
+
+    total = np.bincount(idx, weights=values, minlength=n_buckets)
+    good = np.bincount(idx[good_mask], weights=values[good_mask], minlength=n_buckets)
+
+    planned_mask = down_planned.astype(bool)
+    planned = np.diff(covered_seconds(down_starts[planned_mask], down_ends[planned_mask], edges)) / 60.0
+    unplanned = np.diff(covered_seconds(down_starts[~planned_mask], down_ends[~planned_mask], edges)) / 60.0
+
+    bucket_minutes = np.diff(edges) / 60.0
+    planned_time = np.clip(bucket_minutes - planned, 0.0, None)
+    run_time = np.clip(planned_time - unplanned, 0.0, None)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        availability = np.where(planned_time > 0, run_time / planned_time, 0.0)
+        if ideal_rate:
+            performance = np.where(run_time > 0, total / (ideal_rate * run_time), 0.0)
+        else:
+            performance = np.zeros(n_buckets)
+        quality = np.where(total > 0, good / total, 0.0)
+
+    return {
+        "good_count": good,
+        "total_count": total,
+        "planned_downtime": planned,
+        "unplanned_downtime": unplanned,
+        "availability": availability,
+        "performance": performance,
+        "quality": quality,
+        "oee": availability * performance * quality,
+    }
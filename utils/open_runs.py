@@ -0,0 +1,87 @@
+"""
+Line -> open run map used to attribute counts that arrive without a run_id.
+
+Gateways only know a tag path. The tag gives the line (CountTag.line_id, via
+the count lookup cache) and this map gives the line's open run, so attribution
+costs no query once a line has been looked up. A line is loaded on first use
+with one query served by the partial index ix_run_open; the run routes keep
+the map in step when runs are opened and closed.
+
+Runs opened or closed by another process are caught by the closed check of
+RunMetricsEngine.record_counts: callers `forget` the line and look it up again.
+Lines without an open run are not remembered, so a run opened elsewhere is
+found on the next count.
+"""
+
+import threading
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.models.schedule_run import Run, Schedule
+
+class OpenRunIndex:
+    """Open run id per line, loaded line by line on first use."""
+
+    def __init__(self):
+        self._runs: Dict[int, int] = {}
+        self._lines: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, db: Session, line_id: int) -> Optional[int]:
+        # With several open runs on a line, the latest started one takes the counts
+        return db.execute(
+            select(Run.id).join(Schedule, Schedule.id == Run.schedule_id).where(
+                Run.closed == False,  # '=', not IS, so the ix_run_open predicate applies
+                Schedule.line_id == line_id
+            ).order_by(Run.run_start_datetime.desc(), Run.id.desc()).limit(1)
+        ).scalar()
+
+    def run_for_line(self, db: Session, line_id: int) -> Optional[int]:
+        """Open run of a line, or None when it has none."""
+        with self._lock:
+            run_id = self._runs.get(line_id)
+        if run_id is None:
+            run_id = self._load(db, line_id)
+            if run_id is not None:
+                self.opened(line_id, run_id)
+        return run_id
+
+    def runs_for_lines(self, db: Session, line_ids: Iterable[int]) -> Dict[int, int]:
+        """Open run per line; lines without an open run are absent from the result."""
+        found = {}
+        for line_id in set(line_ids):
+            run_id = self.run_for_line(db, line_id)
+            if run_id is not None:
+                found[line_id] = run_id
+        return found
+
+    def opened(self, line_id: int, run_id: int):
+        """Record a committed open run as the line's current run."""
+        with self._lock:
+            previous = self._runs.get(line_id)
+            if previous is not None:
+                self._lines.pop(previous, None)
+            self._runs[line_id] = run_id
+            self._lines[run_id] = line_id
+
+    def closed(self, run_id: int):
+        """Drop a committed closed run; its line is looked up again on next use."""
+        with self._lock:
+            line_id = self._lines.pop(run_id, None)
+            if line_id is not None:
+                self._runs.pop(line_id, None)
+
+    def forget(self, line_id: Optional[int] = None):
+        """Drop one line's run, or every line's, so they are reloaded on next use."""
+        with self._lock:
+            if line_id is None:
+                self._runs.clear()
+                self._lines.clear()
+            else:
+                run_id = self._runs.pop(line_id, None)
+                if run_id is not None:
+                    self._lines.pop(run_id, None)
+
+open_run_index = OpenRunIndex()
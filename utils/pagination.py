@@ -0,0 +1,55 @@
+"""
+Keyset pagination shared by the list endpoints.
+
+Clients page with `after_id` (the last id they received) and `limit`. Rows
+are returned in id order, so each page is an index range scan on the primary
+key no matter how deep the client has paged. When a page is full, the
+cursor for the next page is returned in the X-Next-After-Id header.
+"""
+
+from typing import Optional
+
+from fastapi import Query, Response
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query as OrmQuery
+
+from config import settings
+
+class PageParams:
+    """Dependency collecting the keyset pagination query parameters."""
+
+    def __init__(
+        self,
+        after_id: Optional[int] = Query(None, ge=0, description="Return rows with an id greater than this cursor"),
+        limit: int = Query(
+            settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX,
+            description="Maximum number of rows to return"
+        )
+    ):
+        self.after_id = after_id
+        self.limit = limit
+
+def paginate(query: OrmQuery, id_column, page: PageParams, response: Response) -> list:
+    """
+    Apply the keyset cursor and limit to `query` and return the page of rows.
+    """
+    if page.after_id is not None:
+        query = query.filter(id_column > page.after_id)
+    rows = query.order_by(id_column).limit(page.limit).all()
+    if len(rows) == page.limit:
+        response.headers["X-Next-After-Id"] = str(rows[-1].id)
+    return rows
+
+async def paginate_async(
+    db: AsyncSession, statement: Select, id_column, page: PageParams, response: Response
+) -> list:
+    """
+    Async counterpart of `paginate` for a `select()` statement over one entity.
+    """
+    if page.after_id is not None:
+        statement = statement.where(id_column > page.after_id)
+    rows = (await db.execute(statement.order_by(id_column).limit(page.limit))).scalars().all()
+    if len(rows) == page.limit:
+        response.headers["X-Next-After-Id"] = str(rows[-1].id)
+    return rows
@@ -0,0 +1,117 @@
+"""
+Monthly range-partition management for count_history (PostgreSQL only).
+
+Migration 5d2e8b6c1a73 turns count_history into a table partitioned by
+RANGE (timestamp) with one partition per calendar month named
+count_history_yYYYYmMM, plus a default partition as a safety net.
+This module creates partitions ahead of time and applies retention by
+detaching (and optionally dropping) partitions that have aged out, which is
+a metadata operation instead of a large DELETE.
+
+Run periodically, e.g. from cron:
+    python -m utils.partitions
+"""
+
+import re
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from config import settings
+from utils.logging_config import logger
+
+PARENT_TABLE = "count_history"
+DEFAULT_PARTITION = "count_history_default"
+PARTITION_NAME = re.compile(r"^count_history_y(\d{4})m(\d{2})$")
+
+def month_start(day: date, offset: int = 0) -> date:
+    """First day of the month `offset` months after the month containing `day`."""
+    index = day.year * 12 + (day.month - 1) + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+def is_partitioned(conn: Connection) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :name)"
+    ), {"name": PARENT_TABLE}).scalar()
+
+def list_partitions(conn: Connection) -> List[str]:
+    return conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :name ORDER BY c.relname"
+    ), {"name": PARENT_TABLE}).scalars().all()
+
+def create_partition(conn: Connection, month: date) -> str:
+    """
+    Create the partition holding `month` if it does not exist yet.
+    Rows of that month already in the default partition (backfilled or future-dated
+    counts) would make CREATE ... PARTITION OF fail, so the table is created on its
+    own, those rows are moved into it and it is attached, all in the caller's transaction.
+    """
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar():
+        return name
+    start, end = month.isoformat(), month_start(month, 1).isoformat()
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end "
+        f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": start, "end": end}).rowcount
+    conn.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+    if moved:
+        logger.info("Moved %s rows from %s into %s", moved, DEFAULT_PARTITION, name)
+    return name
+
+def ensure_partitions(conn: Connection, months_ahead: int, today: Optional[date] = None) -> List[str]:
+    """Create partitions for the current month and the next `months_ahead` months."""
+    today = today or datetime.utcnow().date()
+    return [create_partition(conn, month_start(today, offset)) for offset in range(months_ahead + 1)]
+
+def apply_retention(conn: Connection, keep_months: int, drop: bool,
+                    today: Optional[date] = None) -> List[str]:
+    """
+    Detach partitions that end before the retention horizon; drop them too when `drop` is set.
+    The current month plus `keep_months - 1` previous months are kept.
+    """
+    today = today or datetime.utcnow().date()
+    horizon = month_start(today, -(keep_months - 1))
+    expired = []
+    for name in list_partitions(conn):
+        match = PARTITION_NAME.match(name)
+        if not match:
+            continue
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if month < horizon:
+            conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            if drop:
+                conn.execute(text(f"DROP TABLE {name}"))
+            expired.append(name)
+    return expired
+
+def maintain_count_history_partitions(engine: Engine) -> None:
+    """Create upcoming partitions and apply retention according to Settings."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return
+        created = ensure_partitions(conn, settings.COUNT_HISTORY_PARTITION_MONTHS_AHEAD)
+        expired = []
+        if settings.COUNT_HISTORY_RETENTION_MONTHS > 0:
+            expired = apply_retention(
+                conn, settings.COUNT_HISTORY_RETENTION_MONTHS, settings.COUNT_HISTORY_RETENTION_DROP
+            )
+    logger.info("count_history partitions ensured=%s expired=%s", created, expired)
+
+if __name__ == "__main__":
+    from database.engine import engine
+    maintain_count_history_partitions(engine)
@@ -0,0 +1,368 @@
+"""
+Bulk import of a plant definition: hierarchy, count types/tags and state reasons.
+
+The whole definition is validated in memory first. References are then resolved
+with one set-based SELECT per table, and everything is inserted level by level
+with executemany INSERT ... RETURNING in the caller's transaction. Hierarchy
+nodes that already exist (same name under the same parent) are reused, so a
+plant can be extended by importing it again with new nodes. Count tags and
+state reasons must be new.
+
+CSV files carry one row per entity with the columns
+kind,path,name,code,parent,disabled,record_downtime,planned_downtime,operator_selectable,line:
+    site,North Plant            (path = Site)
+    line,North Plant/Assembly/Line 1   (path = Site/Area/Line; missing parents are implied)
+    count_type,,Good
+    count_tag,North/Line1/Infeed/Good,,,Good,,,,,North Plant/Assembly/Line 1   (parent = CountType name, line = Site/Area/Line)
+    state_reason,,Mechanical Failure,EF-001-01,EF-001,,true,false,true   (parent = reason code)
+"""
+
+import csv
+import io
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from database.models.enterprise import Site, Area, Line, Cell, HierarchyClosure
+from database.models.oee import CountType, CountTag
+from database.models.downtime import StateReason
+from schemas.bulk_import import PlantImport
+
+HIERARCHY_LEVELS = ("site", "area", "line", "cell")
+LEVEL_MODELS = {"site": Site, "area": Area, "line": Line, "cell": Cell}
+PARENT_COLUMNS = {"site": "enterprise_id", "area": "site_id", "line": "area_id", "cell": "line_id"}
+CHILDREN = {"site": "areas", "area": "lines", "line": "cells", "cell": None}
+
+class PlantImportError(Exception):
+    """Raised with every validation problem found in a plant definition."""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors[:5]))
+        self.errors = errors
+
+class _Node:
+    __slots__ = ("level", "name", "disabled", "parent", "id", "chain")
+
+    def __init__(self, level: str, name: str, disabled: bool, parent: Optional["_Node"]):
+        self.level = level
+        self.name = name
+        self.disabled = disabled
+        self.parent = parent
+        self.id: Optional[int] = None
+        # (level, id) of every ancestor, the enterprise first; filled in once ids are known
+        self.chain: List[Tuple[str, int]] = []
+
+    @property
+    def path(self) -> str:
+        names = []
+        node = self
+        while node is not None:
+            names.append(node.name)
+            node = node.parent
+        return "/".join(reversed(names))
+
+def _flag(value: Optional[str], default: bool) -> bool:
+    value = (value or "").strip().lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "y")
+
+def plant_size(plant: PlantImport) -> int:
+    """Number of entities in a plant definition."""
+    def count(items, level_index: int) -> int:
+        child = CHILDREN[HIERARCHY_LEVELS[level_index]]
+        return sum(1 + (count(getattr(item, child), level_index + 1) if child else 0) for item in items)
+    return count(plant.sites, 0) + len(plant.count_types) + len(plant.count_tags) + len(plant.state_reasons)
+
+def parse_plant_csv(text: str) -> PlantImport:
+    """Build a PlantImport from the path-based CSV layout described in the module docstring."""
+    errors = []
+    sites: Dict[str, dict] = {}
+    count_types, count_tags, state_reasons = [], [], []
+
+    for row_number, row in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+        kind = (row.get("kind") or "").strip().lower()
+        if kind in HIERARCHY_LEVELS:
+            names = [part.strip() for part in (row.get("path") or "").split("/")]
+            if len(names) != HIERARCHY_LEVELS.index(kind) + 1 or not all(names):
+                errors.append(f"row {row_number}: a {kind} path needs {HIERARCHY_LEVELS.index(kind) + 1} non-empty segments")
+                continue
+            children = sites
+            for depth, name in enumerate(names):
+                node = children.setdefault(name, {"name": name, "disabled": False, "children": {}})
+                if depth == len(names) - 1:
+                    node["disabled"] = _flag(row.get("disabled"), False)
+                children = node["children"]
+        elif kind == "count_type":
+            count_types.append((row.get("name") or "").strip())
+        elif kind == "count_tag":
+            count_tags.append({
+                "tag_path": (row.get("path") or "").strip(),
+                "count_type": (row.get("parent") or "").strip(),
+                "line": (row.get("line") or "").strip() or None,
+            })
+        elif kind == "state_reason":
+            state_reasons.append({
+                "reason_name": (row.get("name") or "").strip(),
+                "reason_code": (row.get("code") or "").strip(),
+                "parent_code": (row.get("parent") or "").strip() or None,
+                "record_downtime": _flag(row.get("record_downtime"), False),
+                "planned_downtime": _flag(row.get("planned_downtime"), False),
+                "operator_selectable": _flag(row.get("operator_selectable"), True),
+            })
+        else:
+            errors.append(f"row {row_number}: unknown kind '{kind}'")
+
+    def nested(nodes: Dict[str, dict], level_index: int) -> List[dict]:
+        child = CHILDREN[HIERARCHY_LEVELS[level_index]]
+        result = []
+        for node in nodes.values():
+            item = {"name": node["name"], "disabled": node["disabled"]}
+            if child:
+                item[child] = nested(node["children"], level_index + 1)
+            result.append(item)
+        return result
+
+    if errors:
+        raise PlantImportError(errors)
+    try:
+        return PlantImport.parse_obj({
+            "sites": nested(sites, 0),
+            "count_types": count_types,
+            "count_tags": count_tags,
+            "state_reasons": state_reasons,
+        })
+    except ValidationError as exc:
+        raise PlantImportError([
+            f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in exc.errors()
+        ])
+
+def _flatten(plant: PlantImport, errors: List[str]) -> Dict[str, List[_Node]]:
+    """Plan nodes per level; sibling names must be unique within the import."""
+    levels: Dict[str, List[_Node]] = {level: [] for level in HIERARCHY_LEVELS}
+
+    def walk(items, level_index: int, parent: Optional[_Node]):
+        level = HIERARCHY_LEVELS[level_index]
+        seen = set()
+        for item in items:
+            node = _Node(level, item.name, item.disabled, parent)
+            if item.name in seen:
+                errors.append(f"{level} '{node.path}' appears more than once")
+                continue
+            seen.add(item.name)
+            levels[level].append(node)
+            child = CHILDREN[level]
+            if child:
+                walk(getattr(item, child), level_index + 1, node)
+
+    walk(plant.sites, 0, None)
+    return levels
+
+def _reason_depths(plant: PlantImport, errors: List[str]) -> Dict[str, int]:
+    """Depth of each imported reason below the nearest reason that is not imported."""
+    parents = {reason.reason_code: reason.parent_code for reason in plant.state_reasons}
+    depths: Dict[str, int] = {}
+    for code in parents:
+        chain = []
+        current = code
+        while current in parents and current not in depths:
+            if current in chain:
+                errors.append(f"state reason '{code}' has a cyclic parent chain")
+                break
+            chain.append(current)
+            current = parents[current]
+        else:
+            base = depths.get(current, -1) if current in parents else -1
+            for offset, member in enumerate(reversed(chain), start=1):
+                depths[member] = base + offset
+    return depths
+
+def _line_id(names: Optional[Tuple[str, ...]], line_nodes: Dict[str, _Node],
+             existing_lines: Dict[Tuple[str, ...], int]) -> Optional[int]:
+    """Id of a tag's line, imported or existing; imported lines only have one once inserted."""
+    if names is None:
+        return None
+    node = line_nodes.get("/".join(names))
+    return node.id if node is not None else existing_lines[names]
+
+def import_plant(db: Session, enterprise_id: int, plant: PlantImport, dry_run: bool = False) -> dict:
+    """
+    Validate and insert a plant under `enterprise_id`. Raises PlantImportError with
+    every problem found; nothing is written in that case. The caller commits.
+    """
+    errors: List[str] = []
+    levels = _flatten(plant, errors)
+
+    tag_paths = [tag.tag_path for tag in plant.count_tags]
+    if len(set(tag_paths)) != len(tag_paths):
+        errors.append("count tag paths must be unique within the import")
+    reason_codes = [reason.reason_code for reason in plant.state_reasons]
+    if len(set(reason_codes)) != len(reason_codes):
+        errors.append("state reason codes must be unique within the import")
+    reason_depths = _reason_depths(plant, errors)
+    parents_in_import = set(reason_codes)
+
+    # Hierarchy: one query per level for the nodes that already exist under matched parents
+    existing_counts = {level: 0 for level in HIERARCHY_LEVELS}
+    site_names = [node.name for node in levels["site"]]
+    existing_sites = {
+        row.name: row for row in db.execute(
+            select(Site.id, Site.name, Site.enterprise_id).where(Site.name.in_(site_names))
+        ).all()
+    } if site_names else {}
+    for node in levels["site"]:
+        row = existing_sites.get(node.name)
+        if row is None:
+            continue
+        if row.enterprise_id != enterprise_id:
+            errors.append(f"site '{node.name}' already belongs to enterprise {row.enterprise_id}")
+        else:
+            node.id = row.id
+            existing_counts["site"] += 1
+
+    for parent_level, level in zip(HIERARCHY_LEVELS, HIERARCHY_LEVELS[1:]):
+        model = LEVEL_MODELS[level]
+        parent_column = getattr(model, PARENT_COLUMNS[level])
+        parent_ids = {node.parent.id for node in levels[level] if node.parent.id is not None}
+        if not parent_ids:
+            continue
+        existing = {
+            (row.parent_id, row.name): row.id for row in db.execute(
+                select(model.id, model.name, parent_column.label("parent_id")).where(parent_column.in_(parent_ids))
+            ).all()
+        }
+        for node in levels[level]:
+            if node.parent.id is not None and (node.parent.id, node.name) in existing:
+                node.id = existing[(node.parent.id, node.name)]
+                existing_counts[level] += 1
+
+    # Count types: referenced by name, created when listed and missing
+    referenced_types = set(plant.count_types) | {tag.count_type for tag in plant.count_tags}
+    count_type_ids = dict(db.execute(
+        select(CountType.count_type, CountType.id).where(CountType.count_type.in_(referenced_types))
+    ).all()) if referenced_types else {}
+    new_types = [name for name in dict.fromkeys(plant.count_types) if name not in count_type_ids]
+    for tag in plant.count_tags:
+        if tag.count_type not in count_type_ids and tag.count_type not in new_types:
+            errors.append(f"count tag '{tag.tag_path}' references unknown count type '{tag.count_type}'")
+
+    # Tag lines: imported lines by path, the others looked up under the enterprise in one query
+    line_nodes = {node.path: node for node in levels["line"]}
+    tag_lines: Dict[str, Tuple[str, ...]] = {}
+    for tag in plant.count_tags:
+        if tag.line is None:
+            continue
+        names = tuple(part.strip() for part in tag.line.split("/"))
+        if len(names) != 3 or not all(names):
+            errors.append(f"count tag '{tag.tag_path}' line '{tag.line}' is not a Site/Area/Line path")
+        else:
+            tag_lines[tag.tag_path] = names
+    wanted = {names for names in tag_lines.values() if "/".join(names) not in line_nodes}
+    existing_lines = {
+        (row.site_name, row.area_name, row.line_name): row.id for row in db.execute(
+            select(Line.id, Site.name.label("site_name"), Area.name.label("area_name"), Line.name.label("line_name")).join(
+                Area, Area.id == Line.area_id
+            ).join(Site, Site.id == Area.site_id).where(
+                Site.enterprise_id == enterprise_id, Line.name.in_({names[2] for names in wanted})
+            )
+        ).all()
+    } if wanted else {}
+    for tag_path, names in tag_lines.items():
+        if names in wanted and names not in existing_lines:
+            errors.append(f"count tag '{tag_path}' references unknown line '{'/'.join(names)}'")
+
+    if tag_paths:
+        for (tag_path,) in db.execute(select(CountTag.tag_path).where(CountTag.tag_path.in_(tag_paths))).all():
+            errors.append(f"count tag '{tag_path}' already exists")
+
+    # State reasons: new codes must not exist, parents may be existing or imported
+    referenced_codes = set(reason_codes) | {r.parent_code for r in plant.state_reasons if r.parent_code}
+    reason_ids = dict(db.execute(
+        select(StateReason.reason_code, StateReason.id).where(StateReason.reason_code.in_(referenced_codes))
+    ).all()) if referenced_codes else {}
+    for reason in plant.state_reasons:
+        if reason.reason_code in reason_ids:
+            errors.append(f"state reason '{reason.reason_code}' already exists")
+        if reason.parent_code and reason.parent_code not in reason_ids and reason.parent_code not in parents_in_import:
+            errors.append(f"state reason '{reason.reason_code}' references unknown parent '{reason.parent_code}'")
+
+    if errors:
+        raise PlantImportError(errors)
+
+    created = {level: len(levels[level]) - existing_counts[level] for level in HIERARCHY_LEVELS}
+    created.update(count_type=len(new_types), count_tag=len(plant.count_tags), state_reason=len(plant.state_reasons))
+    existing_counts["count_type"] = len(referenced_types) - len(new_types)
+    if dry_run:
+        return {"dry_run": True, "created": created, "existing": existing_counts}
+
+    # Hierarchy inserts, one executemany per level; closure rows follow from each node's chain
+    now = datetime.utcnow()
+    closure_rows = []
+    for level in HIERARCHY_LEVELS:
+        for node in levels[level]:
+            node.chain = (node.parent.chain if node.parent else [("enterprise", enterprise_id)])[:]
+        new_nodes = [node for node in levels[level] if node.id is None]
+        if new_nodes:
+            model = LEVEL_MODELS[level]
+            ids = db.execute(
+                insert(model).returning(model.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "name": node.name, "disabled": node.disabled, "timestamp": now,
+                        PARENT_COLUMNS[level]: node.parent.id if node.parent else enterprise_id,
+                    }
+                    for node in new_nodes
+                ]
+            ).scalars().all()
+            for node, node_id in zip(new_nodes, ids):
+                node.id = node_id
+                depth = len(node.chain)
+                closure_rows.extend(
+                    {
+                        "ancestor_level": ancestor_level, "ancestor_id": ancestor_id,
+                        "descendant_level": level, "descendant_id": node_id,
+                        "depth": depth - position,
+                    }
+                    for position, (ancestor_level, ancestor_id) in enumerate(node.chain + [(level, node_id)])
+                )
+        for node in levels[level]:
+            node.chain.append((level, node.id))
+    if closure_rows:
+        db.execute(insert(HierarchyClosure), closure_rows)
+
+    if new_types:
+        ids = db.execute(
+            insert(CountType).returning(CountType.id, sort_by_parameter_order=True),
+            [{"count_type": name} for name in new_types]
+        ).scalars().all()
+        count_type_ids.update(zip(new_types, ids))
+    if plant.count_tags:
+        db.execute(insert(CountTag), [
+            {
+                "tag_path": tag.tag_path, "parent_id": count_type_ids[tag.count_type],
+                "line_id": _line_id(tag_lines.get(tag.tag_path), line_nodes, existing_lines),
+            }
+            for tag in plant.count_tags
+        ])
+
+    # Reasons are inserted parents first so every parent id is known
+    for depth in sorted(set(reason_depths.values())):
+        batch = [reason for reason in plant.state_reasons if reason_depths[reason.reason_code] == depth]
+        ids = db.execute(
+            insert(StateReason).returning(StateReason.id, sort_by_parameter_order=True),
+            [
+                {
+                    "reason_name": reason.reason_name, "reason_code": reason.reason_code,
+                    "record_downtime": reason.record_downtime, "planned_downtime": reason.planned_downtime,
+                    "operator_selectable": reason.operator_selectable,
+                    "parent_id": reason_ids.get(reason.parent_code) if reason.parent_code else None,
+                }
+                for reason in batch
+            ]
+        ).scalars().all()
+        reason_ids.update(zip((reason.reason_code for reason in batch), ids))
+
+    return {"dry_run": False, "created": created, "existing": existing_counts}
@@ -0,0 +1,73 @@
+"""
+Slow and sampled SQL statement logging.
+
+Replaces per-statement echo. Every statement is timed with two cursor events;
+only statements slower than SQL_SLOW_QUERY_MS (logged as warnings) and a
+random SQL_LOG_SAMPLE_RATE fraction of the rest (logged at info) are
+formatted. Records carry duration_ms, rowcount and a fingerprint of the
+statement with literals stripped, so the same query groups together in the log.
+"""
+
+import hashlib
+import logging
+import random
+import re
+import time
+from functools import lru_cache
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+
+query_logger = logging.getLogger("mes.sql")
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    """Short hash of `statement` with literals and whitespace normalized."""
+    normalized = _WHITESPACE.sub(" ", _LITERALS.sub("?", statement)).strip().lower()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+# The start time lives on the statement's execution context, so a statement that
+# fails (and never reaches after_cursor_execute) leaves nothing behind on the pooled connection
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._mes_query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_mes_query_started", None)
+    if started is None:
+        return
+    duration_ms = (time.perf_counter() - started) * 1000.0
+    if 0 < settings.SQL_SLOW_QUERY_MS <= duration_ms:
+        level = logging.WARNING
+    elif settings.SQL_LOG_SAMPLE_RATE and random.random() < settings.SQL_LOG_SAMPLE_RATE:
+        level = logging.INFO
+    else:
+        return
+    if not query_logger.isEnabledFor(level):
+        return
+    digest = fingerprint(statement)
+    query_logger.log(
+        level,
+        "%s query %s took %.1f ms (rows=%s): %s",
+        "Slow" if level == logging.WARNING else "Sampled", digest, duration_ms, cursor.rowcount,
+        _WHITESPACE.sub(" ", statement)[:500],
+        extra={
+            "duration_ms": round(duration_ms, 3),
+            "rowcount": cursor.rowcount,
+            "fingerprint": digest,
+            "executemany": executemany,
+        }
+    )
+
+def install_query_logging(engine: Engine):
+    """Attach the timing events to `engine` (use AsyncEngine.sync_engine for async engines)."""
+    if settings.SQL_SLOW_QUERY_MS <= 0 and not settings.SQL_LOG_SAMPLE_RATE:
+        return
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,140 @@
+"""
+In-process index of the StateReason hierarchy.
+
+Every reason is loaded with a single query and linked in memory, so ancestor
+chains, subtrees and the inherited planned/record flags are dictionary lookups
+instead of one parent_id round trip per level. The state reason CRUD handlers
+and the plant import invalidate it; it also expires after a TTL.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from config import settings
+from database.models.downtime import StateReason
+
+class ReasonTree:
+    """
+    Immutable snapshot of the reason hierarchy.
+    A reason counts as planned (or recorded) when it or any of its ancestors is.
+    """
+
+    def __init__(self, rows):
+        self.reasons: Dict[int, dict] = {row.id: dict(row._mapping) for row in rows}
+        self.children: Dict[Optional[int], List[int]] = {}
+        self._ancestors: Dict[int, Tuple[int, ...]] = {}
+        for reason_id in sorted(self.reasons):
+            self.children.setdefault(self._parent(reason_id), []).append(reason_id)
+        for reason_id in self.reasons:
+            self.ancestors(reason_id)
+
+    def _parent(self, reason_id: int) -> Optional[int]:
+        """Parent id, or None for roots and for parents that no longer exist."""
+        parent_id = self.reasons[reason_id]["parent_id"]
+        return parent_id if parent_id in self.reasons else None
+
+    def ancestors(self, reason_id: int) -> Tuple[int, ...]:
+        """Ids from the root down to the parent of `reason_id`."""
+        cached = self._ancestors.get(reason_id)
+        if cached is not None:
+            return cached
+        chain = [reason_id]
+        current = self._parent(reason_id)
+        while current is not None and current not in self._ancestors and current not in chain:
+            chain.append(current)
+            current = self._parent(current)
+        # A parent_id cycle is cut where it closes
+        base = self._ancestors[current] + (current,) if current in self._ancestors else ()
+        for node in reversed(chain):
+            self._ancestors[node] = base
+            base = base + (node,)
+        return self._ancestors[reason_id]
+
+    def descendants(self, reason_id: int) -> List[int]:
+        """Ids of every reason below `reason_id`, depth first."""
+        result, seen = [], {reason_id}
+        stack = list(reversed(self.children.get(reason_id, [])))
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            result.append(node)
+            stack.extend(reversed(self.children.get(node, [])))
+        return result
+
+    def is_planned(self, reason_id: int) -> bool:
+        return any(self.reasons[node]["planned_downtime"] for node in self.ancestors(reason_id) + (reason_id,))
+
+    def records_downtime(self, reason_id: int) -> bool:
+        return any(self.reasons[node]["record_downtime"] for node in self.ancestors(reason_id) + (reason_id,))
+
+    def downtime_reason_ids(self) -> Tuple[List[int], List[int]]:
+        """Ids of the reasons that record downtime, and the planned ones among them (inherited flags)."""
+        recorded = [reason_id for reason_id in self.reasons if self.records_downtime(reason_id)]
+        return recorded, [reason_id for reason_id in recorded if self.is_planned(reason_id)]
+
+    def root_of(self, reason_id: int) -> int:
+        """Top-level category a reason rolls up to."""
+        chain = self.ancestors(reason_id)
+        return chain[0] if chain else reason_id
+
+    def as_tree(self) -> List[dict]:
+        """Nested nodes with the inherited flags, children ordered by id."""
+        def node(reason_id: int, seen: frozenset) -> dict:
+            return {
+                **self.reasons[reason_id],
+                "sub_reason_of": self.reasons[reason_id]["parent_id"],
+                "effective_planned_downtime": self.is_planned(reason_id),
+                "effective_record_downtime": self.records_downtime(reason_id),
+                "children": [
+                    node(child, seen | {child})
+                    for child in self.children.get(reason_id, []) if child not in seen
+                ],
+            }
+        return [node(root, frozenset((root,))) for root in self.children.get(None, [])]
+
+def load_reason_tree(db: Session) -> ReasonTree:
+    return ReasonTree(db.execute(
+        select(
+            StateReason.id, StateReason.parent_id, StateReason.reason_name, StateReason.reason_code,
+            StateReason.record_downtime, StateReason.planned_downtime, StateReason.operator_selectable
+        )
+    ).all())
+
+class ReasonTreeCache:
+    """
+    TTL cache of the ReasonTree.
+    A generation counter keeps a load that raced with an invalidation from being stored.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._tree: Optional[ReasonTree] = None
+        self._expires = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> ReasonTree:
+        """Return the cached tree, loading it on a miss."""
+        with self._lock:
+            if self._tree is not None and self._expires > time.monotonic():
+                return self._tree
+            generation = self._generation
+
+        tree = load_reason_tree(db)
+        with self._lock:
+            if generation == self._generation:
+                self._tree, self._expires = tree, time.monotonic() + self.ttl_seconds
+        return tree
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._tree = None
+
+reason_tree_cache = ReasonTreeCache(ttl_seconds=settings.REASON_TREE_CACHE_TTL_SECONDS)
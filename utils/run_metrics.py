@@ -0,0 +1,283 @@
+"""
+Incremental maintenance of RunMetrics.
+
+Each new count and each closed downtime event is folded into the run's
+RunMetrics row in constant time; history is never rescanned. Ratios are
+recomputed from the running totals on every update so the row always holds
+the current OEE for the run. Times (total_time, downtime) are in minutes.
+Every update is also passed on to utils.run_rate, which keeps the run's
+estimated_finish_time current.
+
+Every update locks the Run row (reading its closed flag) before the RunMetrics
+row, the same order `close_run` uses, so a count racing `close_run` either
+lands before the close or is rejected with RunClosedError. Count rows must be
+inserted only once their run is locked (`record_counts(rows=...)`, or
+`lock_runs` for a batch): the foreign key's share lock taken by the insert
+would otherwise wait against another transaction's run lock and deadlock.
+
+Closing finalises from the running totals in constant time; `reconcile=True`
+recomputes the totals with one aggregate query per table.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from database.models.downtime import StateHistory
+from database.models.oee import CountHistory, CountType
+from database.models.schedule_run import Run, RunMetrics, Schedule
+from database.models.workorder import WorkOrder
+from utils.downtime_analytics import seconds_between
+from utils.reason_tree import reason_tree_cache
+from utils.run_rate import run_rate_tracker
+
+def is_good_count_type(count_type_name: str) -> bool:
+    """Count types named 'Good...' count as good product; everything else is waste."""
+    return (count_type_name or "").strip().lower().startswith("good")
+
+def ideal_rate_per_minute(target_quantity: Optional[int], planned_start: Optional[datetime],
+                          planned_end: Optional[datetime]) -> Optional[float]:
+    """Ideal production rate implied by a work order's plan, in units per minute."""
+    if not target_quantity or not planned_start or not planned_end:
+        return None
+    planned_minutes = (planned_end - planned_start).total_seconds() / 60.0
+    if planned_minutes <= 0:
+        return None
+    return target_quantity / planned_minutes
+
+def compute_oee(good_count: int, total_count: int, total_time: float, planned_downtime: float,
+                unplanned_downtime: float, ideal_rate: Optional[float]) -> Tuple[float, float, float, float]:
+    """
+    Return (availability, performance, quality, oee) from running totals.
+
+    planned production time = total_time - planned_downtime
+    run time               = planned production time - unplanned_downtime
+    """
+    planned_time = max(total_time - planned_downtime, 0.0)
+    run_time = max(planned_time - unplanned_downtime, 0.0)
+
+    availability = run_time / planned_time if planned_time > 0 else 0.0
+    performance = total_count / (ideal_rate * run_time) if ideal_rate and run_time > 0 else 0.0
+    quality = good_count / total_count if total_count > 0 else 0.0
+    return availability, performance, quality, availability * performance * quality
+
+class RunClosedError(Exception):
+    """Raised when counts arrive for, or a close is requested on, a closed run."""
+
+class RunContext(NamedTuple):
+    run_start: Optional[datetime]
+    ideal_rate: Optional[float]
+    target_quantity: Optional[int] = None
+
+def _remaining(metrics: RunMetrics, context: RunContext) -> Optional[int]:
+    if not context.target_quantity:
+        return None
+    return context.target_quantity - (metrics.good_count or 0)
+
+class RunMetricsEngine:
+    """
+    Folds count and downtime events into RunMetrics rows.
+    Per-run context (start time, ideal rate) is loaded once and kept in memory.
+    Callers own the transaction: the engine flushes but never commits.
+    """
+
+    def __init__(self):
+        self._contexts: Dict[int, RunContext] = {}
+        self._lock = threading.Lock()
+
+    def _context(self, db: Session, run_id: int) -> RunContext:
+        with self._lock:
+            context = self._contexts.get(run_id)
+        if context is not None:
+            return context
+
+        row = db.query(
+            Run.run_start_datetime,
+            WorkOrder.target_quantity,
+            WorkOrder.planned_start,
+            WorkOrder.planned_end
+        ).join(Schedule, Schedule.id == Run.schedule_id).outerjoin(
+            WorkOrder, WorkOrder.id == Schedule.work_order_id
+        ).filter(Run.id == run_id).first()
+        if row is None:
+            return RunContext(None, None)
+
+        context = RunContext(
+            row.run_start_datetime,
+            ideal_rate_per_minute(row.target_quantity, row.planned_start, row.planned_end),
+            row.target_quantity
+        )
+        with self._lock:
+            self._contexts[run_id] = context
+        return context
+
+    def _locked_metrics(self, db: Session, run_id: int) -> Tuple[RunMetrics, bool]:
+        """
+        Lock the run row, then its metrics row, and return the metrics with the run's closed flag.
+        Every path takes the locks in this order (Run before RunMetrics) so they cannot deadlock.
+        Raises LookupError when the run does not exist.
+        """
+        run = db.query(Run.closed).filter(Run.id == run_id).with_for_update().first()
+        if run is None:
+            raise LookupError(f"Run {run_id} not found")
+        metrics = db.query(RunMetrics).filter(RunMetrics.run_id == run_id).with_for_update().first()
+        if metrics is None:
+            metrics = RunMetrics(
+                run_id=run_id,
+                good_count=0, waste_count=0, total_count=0,
+                availability=0.0, performance=0.0, quality=0.0, oee=0.0,
+                unplanned_downtime=0.0, planned_downtime=0.0, total_time=0.0
+            )
+            db.add(metrics)
+        return metrics, bool(run.closed)
+
+    def _refresh(self, metrics: RunMetrics, context: RunContext, at: Optional[datetime]):
+        if context.run_start and at:
+            elapsed = (at - context.run_start).total_seconds() / 60.0
+            metrics.total_time = max(metrics.total_time or 0.0, elapsed)
+        metrics.availability, metrics.performance, metrics.quality, metrics.oee = compute_oee(
+            metrics.good_count or 0,
+            metrics.total_count or 0,
+            metrics.total_time or 0.0,
+            metrics.planned_downtime or 0.0,
+            metrics.unplanned_downtime or 0.0,
+            context.ideal_rate
+        )
+
+    def lock_runs(self, db: Session, run_ids: Iterable[int]):
+        """
+        Lock several runs in id order before rows referencing them are inserted, and check
+        none of them is closed. Raises RunClosedError or LookupError like `record_counts`.
+        """
+        run_ids = sorted(set(run_ids))
+        closed = dict(
+            db.query(Run.id, Run.closed).filter(Run.id.in_(run_ids)).order_by(Run.id).with_for_update().all()
+        )
+        for run_id in run_ids:
+            if run_id not in closed:
+                raise LookupError(f"Run {run_id} not found")
+            if closed[run_id]:
+                raise RunClosedError(f"Run {run_id} is closed")
+
+    def record_counts(self, db: Session, run_id: int, good: int, waste: int,
+                      at: Optional[datetime] = None, rows: Sequence[CountHistory] = ()) -> RunMetrics:
+        """
+        Add good/waste counts observed up to `at` to the run's metrics.
+        Closed runs raise RunClosedError and unknown runs LookupError. `rows` (the
+        CountHistory objects being recorded) are only added once the run has checked out.
+        """
+        context = self._context(db, run_id)
+        metrics, closed = self._locked_metrics(db, run_id)
+        if closed:
+            raise RunClosedError(f"Run {run_id} is closed")
+        db.add_all(rows)
+        metrics.good_count = (metrics.good_count or 0) + good
+        metrics.waste_count = (metrics.waste_count or 0) + waste
+        metrics.total_count = (metrics.total_count or 0) + good + waste
+        self._refresh(metrics, context, at)
+        db.flush()
+        run_rate_tracker.record_counts(db, run_id, context.run_start, good, at, _remaining(metrics, context))
+        return metrics
+
+    def record_downtime(self, db: Session, run_id: int, minutes: float, planned: bool,
+                        at: Optional[datetime] = None) -> Optional[RunMetrics]:
+        """
+        Add a closed downtime interval of `minutes` ending at `at` to the run's metrics.
+        Downtime that ends after the run was closed, or for an unknown run, is left out.
+        """
+        context = self._context(db, run_id)
+        try:
+            metrics, closed = self._locked_metrics(db, run_id)
+        except LookupError:
+            return None
+        if closed:
+            return metrics
+        if planned:
+            metrics.planned_downtime = (metrics.planned_downtime or 0.0) + minutes
+        else:
+            metrics.unplanned_downtime = (metrics.unplanned_downtime or 0.0) + minutes
+        self._refresh(metrics, context, at)
+        db.flush()
+        if at is not None:
+            run_rate_tracker.record_downtime(
+                db, run_id, context.run_start, at - timedelta(minutes=minutes), at, _remaining(metrics, context)
+            )
+        return metrics
+
+    def record_open_downtime(self, db: Session, run_id: int, at: datetime):
+        """Let an open run's finish estimate account for a downtime still open at `at`."""
+        context = self._context(db, run_id)
+        row = db.query(RunMetrics.good_count, Run.closed).join(Run, Run.id == RunMetrics.run_id).filter(
+            RunMetrics.run_id == run_id
+        ).first()
+        if row is None or row.closed:
+            return
+        remaining = context.target_quantity - (row.good_count or 0) if context.target_quantity else None
+        run_rate_tracker.record_open_downtime(db, run_id, context.run_start, at, remaining)
+
+    def _reconcile(self, db: Session, run_id: int, metrics: RunMetrics):
+        """Recompute counts and downtime from the raw rows, one aggregate query per table."""
+        good = func.lower(func.trim(CountType.count_type)).like("good%")
+        good_count, waste_count = db.execute(
+            select(
+                func.coalesce(func.sum(case((good, CountHistory.count), else_=0)), 0),
+                func.coalesce(func.sum(case((good, 0), else_=CountHistory.count)), 0)
+            ).select_from(CountHistory).join(CountType, CountType.id == CountHistory.count_type_id).where(CountHistory.run_id == run_id)
+        ).one()
+        minutes = seconds_between(
+            db.get_bind().dialect.name, StateHistory.end_datetime, StateHistory.start_datetime
+        ) / 60.0
+        # Flags are inherited through the reason tree, as in the downtime analytics
+        recorded_ids, planned_ids = reason_tree_cache.get(db).downtime_reason_ids()
+        planned = StateHistory.state_reason_id.in_(planned_ids)
+        planned_downtime, unplanned_downtime = db.execute(
+            select(
+                func.coalesce(func.sum(case((planned, minutes), else_=0.0)), 0.0),
+                func.coalesce(func.sum(case((planned, 0.0), else_=minutes)), 0.0)
+            ).where(
+                StateHistory.run_id == run_id,
+                StateHistory.end_datetime.is_not(None),
+                StateHistory.state_reason_id.in_(recorded_ids)
+            )
+        ).one()
+        metrics.good_count, metrics.waste_count = int(good_count), int(waste_count)
+        metrics.total_count = metrics.good_count + metrics.waste_count
+        metrics.planned_downtime, metrics.unplanned_downtime = float(planned_downtime), float(unplanned_downtime)
+
+    def close_run(self, db: Session, run_id: int, stop: datetime, reconcile: bool = False) -> Tuple[Run, RunMetrics]:
+        """
+        Close a run at `stop` and finalise its metrics under the run and metrics row locks.
+        Raises RunClosedError when the run is already closed; the caller commits.
+        """
+        run = db.query(Run).filter(Run.id == run_id).with_for_update().first()
+        if run is None:
+            raise LookupError(f"Run {run_id} not found")
+        context = self._context(db, run_id)
+        metrics, closed = self._locked_metrics(db, run_id)
+        if closed:
+            raise RunClosedError(f"Run {run_id} is already closed")
+        if reconcile:
+            self._reconcile(db, run_id, metrics)
+
+        run.run_stop_datetime = stop
+        run.closed = True
+        if context.run_start:
+            metrics.total_time = max((stop - context.run_start).total_seconds() / 60.0, 0.0)
+        self._refresh(metrics, context, None)
+        db.flush()
+        self.forget(run_id)
+        run_rate_tracker.forget(run_id)
+        return run, metrics
+
+    def forget(self, run_id: Optional[int] = None):
+        """Drop cached context for one run, or for all runs when no id is given."""
+        with self._lock:
+            if run_id is None:
+                self._contexts.clear()
+            else:
+                self._contexts.pop(run_id, None)
+
+run_metrics_engine = RunMetricsEngine()
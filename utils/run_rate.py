@@ -0,0 +1,212 @@
+"""
+Server-side estimated_finish_time for open runs.
+
+Each open run keeps a sliding window of its recent good counts and closed
+downtime in memory. The production rate is the good units in the window
+divided by the window's running time (its length minus the downtime inside
+it), so a stoppage does not read as a slow line once it has been recorded.
+The estimate is the time of the latest observation plus the remaining
+quantity of the linked WorkOrder at that rate. While the run's line sits in a
+downtime that is still open, production is assumed to resume no earlier than
+the latest time the line was seen down (utils.line_state reports it when the
+downtime starts and on every re-sent state).
+
+Updates are O(1) amortised: expired samples leave the deques from the left
+and running sums are adjusted, nothing is rescanned. A run seen for the first
+time is seeded from its CountHistory/StateHistory rows inside the window.
+Run.estimated_finish_time is only rewritten when the estimate moves by more
+than RUN_RATE_PERSIST_DELTA_SECONDS.
+"""
+
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from config import settings
+from database.models.downtime import StateHistory
+from database.models.oee import CountHistory, CountType
+from database.models.schedule_run import Run
+from utils.reason_tree import reason_tree_cache
+
+class RunRateEstimator:
+    """Sliding window of good counts and downtime for one run."""
+
+    def __init__(self, window: timedelta, run_start: Optional[datetime]):
+        self.window = window
+        self.run_start = run_start
+        self._counts = deque()
+        self._units = 0
+        self._downtime = deque()
+        self._down_seconds = 0.0
+        self.last_seen: Optional[datetime] = None
+        self.persisted: Optional[datetime] = None
+        # Latest time the run was seen in a downtime that is still open
+        self.down_until: Optional[datetime] = None
+
+    def _expire(self, now: datetime):
+        horizon = now - self.window
+        while self._counts and self._counts[0][0] <= horizon:
+            self._units -= self._counts.popleft()[1]
+        while self._downtime and self._downtime[0][1] <= horizon:
+            start, end = self._downtime.popleft()
+            self._down_seconds -= (end - start).total_seconds()
+
+    def observe(self, at: datetime):
+        """Move the window to `at` without adding a sample."""
+        self.last_seen = max(self.last_seen or at, at)
+        self._expire(self.last_seen)
+
+    def add_count(self, at: datetime, units: int):
+        if self.last_seen is not None and at < self.last_seen:
+            # The deque stays sorted: a late sample still inside the window is filed under last_seen
+            if at <= self.last_seen - self.window:
+                return
+            at = self.last_seen
+        self._counts.append((at, units))
+        self._units += units
+        self.observe(at)
+
+    def add_downtime(self, start: datetime, end: datetime):
+        if self.last_seen is not None and end < self.last_seen:
+            if end <= self.last_seen - self.window:
+                return
+            # Keep the intervals ordered by end; late ones are rare, so the linear insert is cheap
+            position = len(self._downtime)
+            while position and self._downtime[position - 1][1] > end:
+                position -= 1
+            self._downtime.insert(position, (start, end))
+        else:
+            self._downtime.append((start, end))
+        self._down_seconds += (end - start).total_seconds()
+        self.down_until = None
+        self.observe(end)
+
+    def rate_per_second(self) -> Optional[float]:
+        """Good units per running second over the window, or None without data."""
+        if self.last_seen is None or not self._units:
+            return None
+        window_start = self.last_seen - self.window
+        if self.run_start and self.run_start > window_start:
+            window_start = self.run_start
+        down = self._down_seconds
+        if self._downtime and self._downtime[0][0] < window_start:
+            # Only the oldest interval can straddle the window start
+            down -= (window_start - self._downtime[0][0]).total_seconds()
+        running = (self.last_seen - window_start).total_seconds() - down
+        return self._units / running if running > 0 else None
+
+    def estimate(self, remaining: Optional[int]) -> Optional[datetime]:
+        if remaining is None or self.last_seen is None:
+            return None
+        if remaining <= 0:
+            return self.last_seen
+        rate = self.rate_per_second()
+        # While a downtime is open nothing is produced, so production resumes no earlier than now
+        resume = max(self.last_seen, self.down_until or self.last_seen)
+        return resume + timedelta(seconds=remaining / rate) if rate else None
+
+class RunRateTracker:
+    """Estimators per open run, fed by RunMetricsEngine; callers own the transaction."""
+
+    def __init__(self, window_minutes: float, persist_delta_seconds: float):
+        self.window = timedelta(minutes=window_minutes)
+        self.persist_delta = timedelta(seconds=persist_delta_seconds)
+        self._estimators: Dict[int, RunRateEstimator] = {}
+        self._lock = threading.Lock()
+
+    def _seed(self, db: Session, run_id: int, run_start: Optional[datetime], at: datetime) -> RunRateEstimator:
+        """Rebuild a run's window from the database; the rows include the observation being recorded."""
+        estimator = RunRateEstimator(self.window, run_start)
+        horizon = at - self.window
+        for timestamp, count in db.execute(
+            select(CountHistory.timestamp, CountHistory.count)
+            .join(CountType, CountType.id == CountHistory.count_type_id)
+            .where(
+                CountHistory.run_id == run_id, CountHistory.timestamp > horizon, CountHistory.timestamp <= at,
+                # utils.run_metrics.is_good_count_type, in SQL
+                func.lower(func.trim(CountType.count_type)).like("good%")
+            ).order_by(CountHistory.timestamp)
+        ).all():
+            estimator.add_count(timestamp, count)
+        recorded_ids, _ = reason_tree_cache.get(db).downtime_reason_ids()
+        for start, end in db.execute(
+            select(StateHistory.start_datetime, StateHistory.end_datetime)
+            .where(
+                StateHistory.run_id == run_id, StateHistory.state_reason_id.in_(recorded_ids),
+                StateHistory.end_datetime > horizon, StateHistory.end_datetime <= at
+            ).order_by(StateHistory.end_datetime)
+        ).all():
+            estimator.add_downtime(start, end)
+        estimator.persisted = db.execute(select(Run.estimated_finish_time).where(Run.id == run_id)).scalar()
+        return estimator
+
+    def _estimator(self, db: Session, run_id: int, run_start: Optional[datetime], at: datetime):
+        """(estimator, seeded) where seeded means the current observation is already included."""
+        with self._lock:
+            estimator = self._estimators.get(run_id)
+        if estimator is not None:
+            return estimator, False
+        estimator = self._seed(db, run_id, run_start, at)
+        with self._lock:
+            self._estimators[run_id] = estimator
+        return estimator, True
+
+    def _persist(self, db: Session, run_id: int, estimator: RunRateEstimator, remaining: Optional[int]):
+        estimate = estimator.estimate(remaining)
+        if estimate is None:
+            return
+        if estimator.persisted is not None and abs(estimate - estimator.persisted) < self.persist_delta:
+            return
+        db.execute(update(Run).where(Run.id == run_id).values(estimated_finish_time=estimate))
+        estimator.persisted = estimate
+
+    def record_counts(self, db: Session, run_id: int, run_start: Optional[datetime], good: int,
+                      at: Optional[datetime], remaining: Optional[int]):
+        """Fold good units observed at `at` and refresh the run's estimate."""
+        if at is None:
+            return
+        estimator, seeded = self._estimator(db, run_id, run_start, at)
+        if not seeded and good:
+            estimator.add_count(at, good)
+        elif not seeded:
+            estimator.observe(at)
+        self._persist(db, run_id, estimator, remaining)
+
+    def record_downtime(self, db: Session, run_id: int, run_start: Optional[datetime], start: datetime,
+                        end: datetime, remaining: Optional[int]):
+        """Fold a closed downtime interval and refresh the run's estimate."""
+        estimator, seeded = self._estimator(db, run_id, run_start, end)
+        if not seeded:
+            estimator.add_downtime(start, end)
+        self._persist(db, run_id, estimator, remaining)
+
+    def record_open_downtime(self, db: Session, run_id: int, run_start: Optional[datetime],
+                             at: datetime, remaining: Optional[int]):
+        """Note that the run is still in an open downtime at `at` and push its estimate out accordingly."""
+        estimator, _ = self._estimator(db, run_id, run_start, at)
+        # The open interval is not in the window yet, so last_seen stays put and the rate is unchanged
+        estimator.down_until = max(estimator.down_until or at, at)
+        self._persist(db, run_id, estimator, remaining)
+
+    def rate_per_minute(self, run_id: int) -> Optional[float]:
+        with self._lock:
+            estimator = self._estimators.get(run_id)
+        rate = estimator.rate_per_second() if estimator else None
+        return rate * 60.0 if rate is not None else None
+
+    def forget(self, run_id: Optional[int] = None):
+        """Drop one run's estimator (e.g. when it closes), or all of them."""
+        with self._lock:
+            if run_id is None:
+                self._estimators.clear()
+            else:
+                self._estimators.pop(run_id, None)
+
+run_rate_tracker = RunRateTracker(
+    window_minutes=settings.RUN_RATE_WINDOW_MINUTES,
+    persist_delta_seconds=settings.RUN_RATE_PERSIST_DELTA_SECONDS
+)
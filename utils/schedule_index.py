@@ -0,0 +1,151 @@
+"""
+Per-line index of scheduled windows for overlap checks and free-slot search.
+
+Each line's schedules are loaded once (one query) into parallel lists sorted
+by start, together with a running maximum of the finish times. Because that
+running maximum never decreases, the schedules that can overlap [start, finish)
+are found with two bisections: those starting before `finish` whose running
+maximum finish lies after `start`. Conflict checks and gap searches are
+O(log n + k) for k candidate windows; adding or removing a schedule shifts the
+lists (a memmove, like bisect.insort).
+
+The PostgreSQL exclusion constraint on schedule (see the alembic revision
+c4e8a2d6f913) stays the authority across processes; callers serialise changes
+per line with `lock(line_id)` and keep the index in step after each commit.
+"""
+
+import asyncio
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.models.schedule_run import Schedule
+
+class LineSchedules:
+    """Sorted windows of one line."""
+
+    def __init__(self, rows=()):
+        rows = sorted(rows, key=lambda row: (row[1], row[0]))
+        self.ids: List[int] = [row[0] for row in rows]
+        self.starts: List[datetime] = [row[1] for row in rows]
+        self.finishes: List[datetime] = [row[2] for row in rows]
+        self.max_finish: List[datetime] = []
+        self._refresh_from(0)
+
+    def _refresh_from(self, position: int):
+        del self.max_finish[position:]
+        running = self.max_finish[-1] if self.max_finish else None
+        for finish in self.finishes[position:]:
+            running = finish if running is None or finish > running else running
+            self.max_finish.append(running)
+
+    def _candidates(self, start: datetime, finish: datetime) -> range:
+        # Windows starting before `finish`, from the first whose running maximum passes `start`
+        return range(bisect_right(self.max_finish, start), bisect_left(self.starts, finish))
+
+    def conflicts(self, start: datetime, finish: datetime, exclude_id: Optional[int] = None) -> List[int]:
+        """Ids of the windows overlapping [start, finish)."""
+        return [
+            self.ids[position] for position in self._candidates(start, finish)
+            if self.finishes[position] > start and self.ids[position] != exclude_id
+        ]
+
+    def earliest_start(self, start: datetime, duration: timedelta) -> datetime:
+        """First start at or after `start` where a window of `duration` overlaps nothing."""
+        while True:
+            finishes = [
+                self.finishes[position] for position in self._candidates(start, start + duration)
+                if self.finishes[position] > start
+            ]
+            if not finishes:
+                return start
+            start = max(finishes)
+
+    def add(self, schedule_id: int, start: datetime, finish: datetime):
+        position = bisect_right(self.starts, start)
+        self.ids.insert(position, schedule_id)
+        self.starts.insert(position, start)
+        self.finishes.insert(position, finish)
+        self._refresh_from(position)
+
+    def remove(self, schedule_id: int):
+        if schedule_id not in self.ids:
+            return
+        position = self.ids.index(schedule_id)
+        del self.ids[position], self.starts[position], self.finishes[position]
+        self._refresh_from(position)
+
+    def free_slots(self, start: datetime, end: datetime, min_seconds: float = 0.0) -> List[Tuple[datetime, datetime]]:
+        """Gaps of at least `min_seconds` inside [start, end) not covered by any window."""
+        slots = []
+        cursor = start
+        for position in self._candidates(start, end):
+            if self.starts[position] > cursor:
+                slots.append((cursor, self.starts[position]))
+            if self.finishes[position] > cursor:
+                cursor = self.finishes[position]
+        if cursor < end:
+            slots.append((cursor, end))
+        return [(slot_start, slot_end) for slot_start, slot_end in slots
+                if (slot_end - slot_start).total_seconds() >= min_seconds]
+
+class ScheduleIndex:
+    """LineSchedules per line, loaded on first use."""
+
+    def __init__(self):
+        self._lines: Dict[int, LineSchedules] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._mutex = threading.Lock()
+
+    def lock(self, line_id: int) -> asyncio.Lock:
+        return self._locks.setdefault(line_id, asyncio.Lock())
+
+    def line(self, db: Session, line_id: int) -> LineSchedules:
+        with self._mutex:
+            schedules = self._lines.get(line_id)
+        if schedules is None:
+            schedules = LineSchedules(db.execute(
+                select(Schedule.id, Schedule.schedule_start_datetime, Schedule.schedule_finish_datetime).where(
+                    Schedule.line_id == line_id,
+                    Schedule.schedule_start_datetime.is_not(None),
+                    Schedule.schedule_finish_datetime.is_not(None)
+                )
+            ).all())
+            with self._mutex:
+                schedules = self._lines.setdefault(line_id, schedules)
+        return schedules
+
+    def conflicts(self, db: Session, line_id: int, start: datetime, finish: datetime,
+                  exclude_id: Optional[int] = None) -> List[int]:
+        return self.line(db, line_id).conflicts(start, finish, exclude_id)
+
+    def free_slots(self, db: Session, line_id: int, start: datetime, end: datetime,
+                   min_seconds: float = 0.0) -> List[Tuple[datetime, datetime]]:
+        return self.line(db, line_id).free_slots(start, end, min_seconds)
+
+    def add(self, line_id: int, schedule_id: int, start: Optional[datetime], finish: Optional[datetime]):
+        """Record a committed schedule; lines not loaded yet pick it up when they are."""
+        with self._mutex:
+            schedules = self._lines.get(line_id)
+            if schedules is not None and start is not None and finish is not None:
+                schedules.add(schedule_id, start, finish)
+
+    def remove(self, line_id: int, schedule_id: int):
+        with self._mutex:
+            schedules = self._lines.get(line_id)
+            if schedules is not None:
+                schedules.remove(schedule_id)
+
+    def forget(self, line_id: Optional[int] = None):
+        """Drop one line's windows, or every line's, so they are reloaded on next use."""
+        with self._mutex:
+            if line_id is None:
+                self._lines.clear()
+            else:
+                self._lines.pop(line_id, None)
+
+schedule_index = ScheduleIndex()
@@ -0,0 +1,168 @@
+"""
+Finite-capacity list scheduler that turns open WorkOrders into Schedule rows.
+
+Orders leave a priority queue in the order given by the objective; each is
+placed on whichever eligible line can finish it first, no earlier than its
+release time (the later of the horizon start and its planned_start) and
+never over a window already booked on that line. Eligible lines are the
+ProductCodeLine rows of the order's product, or the order's own line when the
+product has none. Processing time is the order's planned duration.
+
+The engine (`schedule_orders`) is pure; `auto_schedule` loads the order book
+with a handful of set queries and writes the plan with one executemany.
+"""
+
+import heapq
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from database.models.schedule_run import Schedule
+from database.models.workorder import ProductCodeLine, WorkOrder
+from utils.schedule_index import LineSchedules
+
+class Order(NamedTuple):
+    id: int
+    release: datetime
+    due: datetime
+    duration: timedelta
+    lines: Tuple[int, ...]
+    sequence: int
+
+class Assignment(NamedTuple):
+    work_order_id: int
+    line_id: int
+    start: datetime
+    finish: datetime
+    due: datetime
+
+# Queue order of each objective; ties fall back to the order id
+OBJECTIVES: Dict[str, Callable[[Order], tuple]] = {
+    "edd": lambda order: (order.due, order.id),
+    "spt": lambda order: (order.duration, order.due, order.id),
+    "fifo": lambda order: (order.sequence, order.id),
+}
+
+def schedule_orders(orders: Sequence[Order], booked: Dict[int, LineSchedules], start: datetime,
+                    objective: str = "edd") -> Tuple[List[Assignment], List[int]]:
+    """
+    Return (assignments, ids of orders that could not be placed).
+    `booked` holds the existing windows per line, which are left untouched.
+    """
+    key = OBJECTIVES[objective]
+    queue = [(key(order), position) for position, order in enumerate(orders)]
+    heapq.heapify(queue)
+
+    frontier: Dict[int, datetime] = defaultdict(lambda: start)
+    assignments, unscheduled = [], []
+    while queue:
+        _, position = heapq.heappop(queue)
+        order = orders[position]
+        if not order.lines or order.duration <= timedelta(0):
+            unscheduled.append(order.id)
+            continue
+        best = None
+        for line_id in order.lines:
+            line_start = max(frontier[line_id], order.release)
+            if line_id in booked:
+                line_start = booked[line_id].earliest_start(line_start, order.duration)
+            if best is None or (line_start + order.duration, line_id) < (best[1] + order.duration, best[0]):
+                best = (line_id, line_start)
+        line_id, line_start = best
+        frontier[line_id] = line_start + order.duration
+        assignments.append(Assignment(order.id, line_id, line_start, line_start + order.duration, order.due))
+    return assignments, unscheduled
+
+def plan_summary(assignments: Sequence[Assignment]) -> dict:
+    late = [assignment for assignment in assignments if assignment.finish > assignment.due]
+    return {
+        "scheduled": len(assignments),
+        "late": len(late),
+        "total_tardiness_minutes": sum((a.finish - a.due).total_seconds() for a in late) / 60.0,
+        "makespan_end": max((assignment.finish for assignment in assignments), default=None),
+    }
+
+def load_order_book(db: Session, start: datetime, statuses: Sequence[str],
+                    work_order_ids: Optional[Sequence[int]] = None,
+                    line_ids: Optional[Sequence[int]] = None) -> Tuple[List[Order], Dict[int, LineSchedules]]:
+    """Unscheduled orders in `statuses` and the booked windows of every line they may use."""
+    scheduled = select(Schedule.work_order_id).where(Schedule.work_order_id.is_not(None))
+    statement = select(
+        WorkOrder.id, WorkOrder.line_id, WorkOrder.product_code_id,
+        WorkOrder.planned_start, WorkOrder.planned_end
+    ).where(WorkOrder.status.in_(statuses), WorkOrder.id.not_in(scheduled)).order_by(WorkOrder.id)
+    if work_order_ids is not None:
+        statement = statement.where(WorkOrder.id.in_(work_order_ids))
+    rows = db.execute(statement).all()
+
+    product_lines: Dict[int, List[int]] = defaultdict(list)
+    for product_code_id, line_id in db.execute(
+        select(ProductCodeLine.product_code_id, ProductCodeLine.line_id).order_by(ProductCodeLine.line_id)
+    ).all():
+        product_lines[product_code_id].append(line_id)
+
+    allowed = set(line_ids) if line_ids is not None else None
+    orders = []
+    for sequence, row in enumerate(rows):
+        lines = product_lines.get(row.product_code_id) or [row.line_id]
+        orders.append(Order(
+            id=row.id,
+            release=max(start, row.planned_start),
+            due=row.planned_end,
+            duration=row.planned_end - row.planned_start,
+            lines=tuple(dict.fromkeys(line for line in lines if allowed is None or line in allowed)),
+            sequence=sequence,
+        ))
+
+    used_lines = {line_id for order in orders for line_id in order.lines}
+    windows = defaultdict(list)
+    if used_lines:
+        for schedule_id, line_id, window_start, window_finish in db.execute(
+            select(Schedule.id, Schedule.line_id, Schedule.schedule_start_datetime, Schedule.schedule_finish_datetime).where(
+                Schedule.line_id.in_(used_lines),
+                Schedule.schedule_finish_datetime > start,
+                Schedule.schedule_start_datetime.is_not(None)
+            )
+        ).all():
+            windows[line_id].append((schedule_id, window_start, window_finish))
+    return orders, {line_id: LineSchedules(rows) for line_id, rows in windows.items()}
+
+def write_plan(db: Session, assignments: Sequence[Assignment], objective: str):
+    """Insert one Schedule per assignment and move each order to its line; the caller commits."""
+    if not assignments:
+        return
+    now = datetime.utcnow()
+    db.execute(insert(Schedule), [
+        {
+            "line_id": assignment.line_id,
+            "work_order_id": assignment.work_order_id,
+            "schedule_type": "Production",
+            "schedule_start_datetime": assignment.start,
+            "schedule_finish_datetime": assignment.finish,
+            "note": f"Auto-scheduled ({objective})",
+            "timestamp": now,
+        }
+        for assignment in assignments
+    ])
+    db.execute(update(WorkOrder), [
+        {"id": assignment.work_order_id, "line_id": assignment.line_id, "updated_at": now}
+        for assignment in assignments
+    ])
+
+def auto_schedule(db: Session, start: datetime, objective: str, statuses: Sequence[str],
+                  work_order_ids: Optional[Sequence[int]] = None, line_ids: Optional[Sequence[int]] = None,
+                  dry_run: bool = False) -> dict:
+    orders, booked = load_order_book(db, start, statuses, work_order_ids, line_ids)
+    assignments, unscheduled = schedule_orders(orders, booked, start, objective)
+    if not dry_run:
+        write_plan(db, assignments, objective)
+    return dict(
+        plan_summary(assignments),
+        objective=objective,
+        dry_run=dry_run,
+        unscheduled=unscheduled,
+        assignments=[assignment._asdict() for assignment in assignments],
+    )